@@ -0,0 +1,41 @@
+from pygpu import gpuarray
+
+from .common import get_context, unsupported
+
+
+class Gemm(object):
+    params = [[64, 512], ['float32', 'float64']]
+    param_names = ['n', 'dtype']
+
+    @unsupported
+    def setup(self, n, dtype):
+        from pygpu import blas
+        self.gemm = blas.gemm
+        ctx = get_context()
+        self.A = gpuarray.zeros((n, n), dtype=dtype, context=ctx)
+        self.B = gpuarray.zeros((n, n), dtype=dtype, context=ctx)
+        self.C = gpuarray.zeros((n, n), dtype=dtype, context=ctx)
+        self.time_gemm(n, dtype)
+
+    def time_gemm(self, n, dtype):
+        self.gemm(1.0, self.A, self.B, 0.0, self.C, overwrite_c=True)
+        self.C.sync()
+
+
+class Gemv(object):
+    params = [[1024, 4096], ['float32', 'float64']]
+    param_names = ['n', 'dtype']
+
+    @unsupported
+    def setup(self, n, dtype):
+        from pygpu import blas
+        self.gemv = blas.gemv
+        ctx = get_context()
+        self.A = gpuarray.zeros((n, n), dtype=dtype, context=ctx)
+        self.X = gpuarray.zeros((n,), dtype=dtype, context=ctx)
+        self.Y = gpuarray.zeros((n,), dtype=dtype, context=ctx)
+        self.time_gemv(n, dtype)
+
+    def time_gemv(self, n, dtype):
+        self.gemv(1.0, self.A, self.X, 0.0, self.Y, overwrite_y=True)
+        self.Y.sync()
@@ -0,0 +1,39 @@
+import itertools
+import os
+
+from pygpu import gpuarray
+
+from .common import get_context
+
+SRC = """
+KERNEL void k(GLOBAL_MEM float *a, ga_size n) {
+  for (ga_size i = LID_0 + GID_0 * LDIM_0; i < n; i += LDIM_0 * GDIM_0)
+    a[i] = a[i] * 2 + 1;
+}
+"""
+
+# Different in each process and for each call
+_salt = itertools.count()
+
+
+class Compile(object):
+    """
+    Kernel compilation.  `cold` changes the source for every call so
+    that no cache can help, `cached` compiles the same source again.
+    """
+    number = 1
+    repeat = 5
+
+    def setup(self):
+        self.ctx = get_context()
+        self.time_cached()
+
+    def _compile(self, src):
+        gpuarray.GpuKernel(src, "k", [gpuarray.GpuArray, gpuarray.SIZE],
+                           context=self.ctx)
+
+    def time_cold(self):
+        self._compile(SRC + "// %d %d\n" % (os.getpid(), next(_salt)))
+
+    def time_cached(self):
+        self._compile(SRC)
@@ -0,0 +1,34 @@
+from pygpu import gpuarray, concatenate
+
+from .common import get_context
+
+
+class Copy(object):
+    """
+    Copies on the device: plain, strided (extcopy), with a type
+    conversion and concatenation.
+    """
+    params = [10 ** 4, 10 ** 6]
+    param_names = ['n']
+
+    def setup(self, n):
+        ctx = get_context()
+        self.a = gpuarray.zeros((n,), dtype='float32', context=ctx)
+        self.s = gpuarray.zeros((2 * n,), dtype='float32', context=ctx)[::2]
+        self.parts = [gpuarray.zeros((n // 4,), dtype='float32',
+                                     context=ctx) for _ in range(4)]
+        self.time_strided(n)
+        self.time_astype(n)
+        self.time_concatenate(n)
+
+    def time_contiguous(self, n):
+        self.a.copy().sync()
+
+    def time_strided(self, n):
+        self.s.copy().sync()
+
+    def time_astype(self, n):
+        self.a.astype('float64').sync()
+
+    def time_concatenate(self, n):
+        concatenate(self.parts).sync()
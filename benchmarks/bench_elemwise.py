@@ -0,0 +1,69 @@
+import numpy
+
+from pygpu import gpuarray
+from pygpu.elemwise import ElemwiseKernel
+
+from .common import get_context
+
+
+class ElemwiseDispatch(object):
+    """
+    Overhead of an elemwise call on arrays so small that the kernel
+    itself costs nothing.
+    """
+    params = [1, 16, 256]
+    param_names = ['n']
+
+    def setup(self, n):
+        ctx = get_context()
+        self.a = gpuarray.zeros((n,), dtype='float32', context=ctx)
+        self.b = gpuarray.zeros((n,), dtype='float32', context=ctx)
+        self.c = gpuarray.empty((n,), dtype='float32', context=ctx)
+        self.k = ElemwiseKernel(ctx, "float *a, float *b, float *c",
+                                "c[i] = a[i] + b[i]")
+        self.k(self.a, self.b, self.c)
+        self.c.sync()
+
+    def time_call(self, n):
+        self.k(self.a, self.b, self.c)
+        self.c.sync()
+
+    def time_call_contig(self, n):
+        self.k.call_contig(self.a, self.b, self.c)
+        self.c.sync()
+
+
+class ElemwiseThroughput(object):
+    """
+    Elemwise addition on contiguous, strided and broadcast inputs.
+    """
+    params = [['contiguous', 'strided', 'broadcast'], [10 ** 4, 10 ** 6]]
+    param_names = ['layout', 'n']
+
+    def setup(self, layout, n):
+        ctx = get_context()
+        cols = 1000 if n >= 1000 else n
+        rows = n // cols
+        if layout == 'contiguous':
+            self.a = gpuarray.zeros((rows, cols), dtype='float32',
+                                    context=ctx)
+            self.b = gpuarray.zeros((rows, cols), dtype='float32',
+                                    context=ctx)
+        elif layout == 'strided':
+            self.a = gpuarray.zeros((rows, 2 * cols), dtype='float32',
+                                    context=ctx)[:, ::2]
+            self.b = gpuarray.zeros((2 * rows, cols), dtype='float32',
+                                    context=ctx)[::2]
+        else:
+            self.a = gpuarray.zeros((rows, cols), dtype='float32',
+                                    context=ctx)
+            self.b = gpuarray.zeros((1, cols), dtype='float32', context=ctx)
+        self.c = gpuarray.empty((rows, cols), dtype='float32', context=ctx)
+        self.broadcast = layout == 'broadcast'
+        self.k = ElemwiseKernel(ctx, "float *a, float *b, float *c",
+                                "c[i] = a[i] + b[i]")
+        self.time_add(layout, n)
+
+    def time_add(self, layout, n):
+        self.k(self.a, self.b, self.c, broadcast=self.broadcast)
+        self.c.sync()
@@ -0,0 +1,35 @@
+from pygpu import gpuarray
+
+from .common import get_context
+
+
+def _kernel(ctx, nargs):
+    nbuf = (nargs + 1) // 2
+    params = ["GLOBAL_MEM float *a%d" % i for i in range(nbuf)]
+    params += ["ga_uint s%d" % i for i in range(nargs - nbuf)]
+    src = "KERNEL void k(%s) {}\n" % ", ".join(params)
+    types = [gpuarray.GpuArray] * nbuf + ['uint32'] * (nargs - nbuf)
+    k = gpuarray.GpuKernel(src, "k", types, context=ctx)
+    a = gpuarray.empty((1,), dtype='float32', context=ctx)
+    return k, tuple([a] * nbuf + [1] * (nargs - nbuf))
+
+
+class Launch(object):
+    """
+    Host cost of launching an empty kernel, by number of arguments.
+    Use the 'null' device to only measure the cost in pygpu.
+    """
+    params = [1, 20]
+    param_names = ['nargs']
+
+    def setup(self, nargs):
+        self.k, self.args = _kernel(get_context(), nargs)
+
+    def time_call_n(self, nargs):
+        self.k(*self.args, n=1)
+
+    def time_call_ls_gs(self, nargs):
+        self.k(*self.args, ls=1, gs=1)
+
+    def time_launch_raw(self, nargs):
+        self.k.launch_raw(self.args, 1, 1)
@@ -0,0 +1,23 @@
+from pygpu import gpuarray
+from pygpu.reduction import reduce
+
+from .common import get_context
+
+
+class Reduction(object):
+    """
+    Sum of a 1000x1000 array over each axis and over all of it.
+    """
+    params = [[None, 0, 1], ['float32', 'float64']]
+    param_names = ['axis', 'dtype']
+
+    def setup(self, axis, dtype):
+        ctx = get_context()
+        self.a = gpuarray.zeros((1000, 1000), dtype=dtype, context=ctx)
+        self.time_sum(axis, dtype)
+
+    def time_sum(self, axis, dtype):
+        reduce(self.a, 'sum', axis=axis).sync()
+
+    def time_max(self, axis, dtype):
+        reduce(self.a, 'max', axis=axis).sync()
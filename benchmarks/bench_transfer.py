@@ -0,0 +1,34 @@
+import numpy
+
+from pygpu import gpuarray
+
+from .common import get_context
+
+
+class Transfer(object):
+    """
+    Copies between the host and the device, from pageable and pinned
+    host memory.
+    """
+    params = [['pageable', 'pinned'], [2 ** 10, 2 ** 20, 2 ** 26]]
+    param_names = ['host', 'nbytes']
+
+    def setup(self, host, nbytes):
+        ctx = get_context()
+        n = nbytes // 4
+        if host == 'pinned':
+            try:
+                self.h = gpuarray.pinned_empty((n,), dtype='float32',
+                                               context=ctx)
+            except gpuarray.GpuArrayException as e:
+                raise NotImplementedError(str(e))
+        else:
+            self.h = numpy.empty((n,), dtype='float32')
+        self.h[...] = 0
+        self.d = gpuarray.empty((n,), dtype='float32', context=ctx)
+
+    def time_host_to_device(self, host, nbytes):
+        self.d.write_async(self.h).wait()
+
+    def time_device_to_host(self, host, nbytes):
+        self.d.read_async(self.h).wait()
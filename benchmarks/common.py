@@ -0,0 +1,37 @@
+import os
+
+from pygpu import gpuarray
+
+_context = None
+
+
+def get_device():
+    for name in ['GPUARRAY_BENCH_DEVICE', 'DEVICE']:
+        if name in os.environ:
+            return os.environ[name]
+    return "opencl0:0"
+
+
+def get_context():
+    """
+    Return the context to run the benchmarks on, created on first use
+    from the GPUARRAY_BENCH_DEVICE (or DEVICE) environment variable.
+    """
+    global _context
+    if _context is None:
+        _context = gpuarray.init(get_device())
+    return _context
+
+
+def unsupported(f):
+    """
+    Turn UnsupportedException into NotImplementedError, which marks
+    the benchmark as skipped.
+    """
+    def wrapper(*args, **kwargs):
+        try:
+            return f(*args, **kwargs)
+        except gpuarray.UnsupportedException as e:
+            raise NotImplementedError(str(e))
+    wrapper.__name__ = f.__name__
+    return wrapper
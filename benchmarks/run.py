@@ -0,0 +1,195 @@
+"""
+Run the benchmarks and save the results as JSON.
+
+    python -m benchmarks.run [-d DEVICE] [-o out.json] [-c base.json] [filter ...]
+
+The benchmark modules follow the layout of airspeed velocity (asv):
+classes with optional `params`, `param_names`, `setup(*params)` and
+`teardown(*params)`, and `time_*` methods that are timed for each
+combination of the parameters.  A `setup` that raises
+NotImplementedError skips the combination.  `number` and `repeat`
+attributes on a class override the automatic calibration.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import sys
+from timeit import default_timer
+
+MODULES = ['bench_launch', 'bench_elemwise', 'bench_reduction', 'bench_copy',
+           'bench_transfer', 'bench_blas', 'bench_compile']
+
+
+def _params(cls):
+    params = getattr(cls, 'params', [])
+    names = getattr(cls, 'param_names', [])
+    if not params:
+        return names, [()]
+    # A single list of values is a single parameter
+    if not isinstance(params[0], (list, tuple)):
+        params = [params]
+    return names, list(itertools.product(*params))
+
+
+def benchmarks(filters=()):
+    """
+    Yield `(name, cls, method, names, values)` for every benchmark
+    whose name matches one of `filters` (all of them if empty).
+    """
+    for modname in MODULES:
+        mod = __import__('benchmarks.' + modname, fromlist=[modname])
+        for clsname, cls in sorted(vars(mod).items()):
+            if not inspect.isclass(cls) or cls.__module__ != mod.__name__:
+                continue
+            for meth in sorted(m for m in dir(cls) if m.startswith('time_')):
+                names, combos = _params(cls)
+                for values in combos:
+                    name = "%s.%s.%s" % (modname, clsname, meth)
+                    if values:
+                        name += "(%s)" % ", ".join(
+                            "%s=%s" % (n, v) for n, v in zip(names, values))
+                    if filters and not any(re.search(f, name)
+                                           for f in filters):
+                        continue
+                    yield name, cls, meth, values
+
+
+def _run(fn, number):
+    t0 = default_timer()
+    for _ in range(number):
+        fn()
+    return (default_timer() - t0) / number
+
+
+def measure(fn, number=None, repeat=None, min_time=0.1):
+    """
+    Time `fn` and return a dict with the `min` and `median` time per
+    call over `repeat` samples of `number` calls.
+
+    If not given, `number` grows until a sample takes at least
+    `min_time` seconds and `repeat` is picked to keep the total under a
+    few seconds.
+    """
+    if number is None:
+        number = 1
+        while True:
+            t = _run(fn, number) * number
+            if t >= min_time or number >= 10 ** 6:
+                break
+            number *= 10 if t < min_time / 10 else 2
+    else:
+        t = _run(fn, number) * number
+    if repeat is None:
+        repeat = max(3, min(10, int(2.0 / max(t, 1e-9))))
+    samples = sorted(_run(fn, number) for _ in range(repeat))
+    return dict(min=samples[0], median=samples[len(samples) // 2],
+                number=number, repeat=repeat)
+
+
+def run(filters=(), verbose=True):
+    """
+    Run the benchmarks that match `filters` and return a dict that
+    maps their names to their results (None when skipped).
+    """
+    results = {}
+    for name, cls, meth, values in benchmarks(filters):
+        obj = cls()
+        try:
+            if hasattr(obj, 'setup'):
+                obj.setup(*values)
+        except NotImplementedError as e:
+            results[name] = None
+            if verbose:
+                print("%-70s skipped (%s)" % (name, e))
+            continue
+        try:
+            fn = getattr(obj, meth)
+            res = measure(lambda: fn(*values),
+                          number=getattr(cls, 'number', None),
+                          repeat=getattr(cls, 'repeat', None))
+        finally:
+            if hasattr(obj, 'teardown'):
+                obj.teardown(*values)
+        results[name] = res
+        if verbose:
+            print("%-70s %12s %12s" % (name, _fmt(res['min']),
+                                       _fmt(res['median'])))
+    return results
+
+
+def _fmt(t):
+    for unit, scale in [('s', 1), ('ms', 1e3), ('us', 1e6)]:
+        if t >= 1 / scale:
+            return "%.3f %s" % (t * scale, unit)
+    return "%.1f ns" % (t * 1e9)
+
+
+def compare(results, base, threshold):
+    """
+    Print the ratio of the median of each benchmark in `results` to the
+    one in `base` and return the names of those slower by more than
+    `threshold`.
+    """
+    slower = []
+    print("\n%-70s %8s" % ("benchmark", "ratio"))
+    for name in sorted(results):
+        new, old = results[name], base.get(name)
+        if new is None or old is None:
+            continue
+        ratio = new['median'] / old['median']
+        mark = ""
+        if ratio > threshold:
+            mark = " slower"
+            slower.append(name)
+        elif ratio < 1 / threshold:
+            mark = " faster"
+        print("%-70s %8.2f%s" % (name, ratio, mark))
+    return slower
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Run the pygpu benchmarks.")
+    p.add_argument('filters', nargs='*',
+                   help="only run the benchmarks matching these regexes")
+    p.add_argument('-d', '--device',
+                   help="device to run on (default: $GPUARRAY_BENCH_DEVICE "
+                   "or $DEVICE)")
+    p.add_argument('-o', '--output', help="save the results to this file")
+    p.add_argument('-c', '--compare', metavar='BASELINE',
+                   help="compare with the results saved in this file")
+    p.add_argument('-t', '--threshold', type=float, default=1.2,
+                   help="ratio over which a benchmark is reported as slower "
+                   "(default: 1.2)")
+    args = p.parse_args(argv)
+
+    if args.device:
+        os.environ['GPUARRAY_BENCH_DEVICE'] = args.device
+    from .common import get_context, get_device
+    ctx = get_context()
+
+    results = run(args.filters)
+
+    if args.output:
+        info = dict(device=get_device(), kind=ctx.kind, devname=ctx.devname,
+                    date=datetime.datetime.now().isoformat(),
+                    machine=platform.node(), python=platform.python_version(),
+                    results=results)
+        with open(args.output, 'w') as f:
+            json.dump(info, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)['results']
+        if compare(results, base, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,12 +4,19 @@ def get_include():
     assert os.path.exists(os.path.join(p, 'gpuarray_api.h'))
     return p
 
-from . import gpuarray, elemwise, reduction
+from . import (gpuarray, elemwise, reduction, scan, tracing, timing,
+               compilation, autotune)
 from .gpuarray import (init, set_default_context, get_default_context,
                        array, zeros, empty, asarray, ascontiguousarray,
-                       asfortranarray, register_dtype)
+                       asfortranarray, register_dtype, pinned_empty, Arena,
+                       from_host_buffer)
 from .operations import (split, array_split, hsplit, vsplit, dsplit,
                          concatenate, hstack, vstack, dstack)
+from .reduction import reduce
+from .npyio import load_npy, from_memmap
+from .tracing import Tracer
+from .timing import Timer
+from .compilation import compile_stats
 from ._array import ndgpuarray
 
 from .tests import main
@@ -2,7 +2,8 @@ from __future__ import division
 import numpy as np
 
 from .elemwise import elemwise1, elemwise2, ielemwise2, compare, ElemwiseKernel
-from .reduction import reduce1, ReductionKernel
+from .reduction import reduce1, moments, ReductionKernel
+from .scan import cumsum, cumprod
 from .dtypes import dtype_to_ctype, get_np_obj, get_common_dtype
 from .tools import as_argument, ArrayArg
 from . import gpuarray
@@ -294,3 +295,20 @@ Since these functions are untested (thus probably wrong), we disable them.
                 if di.itemsize > dtype.itemsize:
                     dtype = di
         return reduce1(self, '+', '0', dtype, axis=axis, out=out)
+
+    def mean(self, axis=None, dtype=None, out=None):
+        return moments(self, axis=axis, out_type=dtype, out=(out, None))[0]
+
+    def var(self, axis=None, dtype=None, out=None, ddof=0):
+        return moments(self, axis=axis, ddof=ddof, out_type=dtype,
+                       out=(None, out))[1]
+
+    def std(self, axis=None, dtype=None, out=None, ddof=0):
+        return moments(self, axis=axis, ddof=ddof, out_type=dtype,
+                       std=True, out=(None, out))[1]
+
+    def cumsum(self, axis=None, dtype=None, out=None):
+        return cumsum(self, axis=axis, dtype=dtype, out=out)
+
+    def cumprod(self, axis=None, dtype=None, out=None):
+        return cumprod(self, axis=axis, dtype=dtype, out=out)
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+
+
+def _bucket(n):
+    # Sizes within a factor of two share their configuration
+    return (n - 1).bit_length() if n > 1 else 0
+
+
+class LaunchTuner(object):
+    """
+    LaunchTuner(context, path=None, repeat=2, min_size=4096)
+
+    Pick the launch configuration of the kernels called with only `n`
+    on `context` by measuring it.  Install it with::
+
+        ctx.launch_tuner = LaunchTuner(ctx, 'tuning.json')
+
+    The sizes are grouped in powers of two.  The first calls of a
+    kernel for a group each try one of a few candidates, `repeat`
+    times each: a range of local sizes from the preferred one to the
+    maximum with enough groups to cover `n`, plus, for kernels created
+    with `grid_stride=True`, 2, 4 and 8 groups per compute unit.  The
+    fastest on the device timer is then used for all the later calls.
+    These calls are synchronous since they wait for their time.
+
+    Calls with `n` under `min_size` keep the default configuration.
+
+    The results are kept by device name and kernel source in `table`
+    and saved to `path` (if not None) each time a new one is found.  An
+    existing file at `path` is loaded first, so the results carry over
+    to later runs.
+    """
+    def __init__(self, context, path=None, repeat=2, min_size=4096):
+        self.context = context
+        self.path = path
+        self.repeat = repeat
+        self.min_size = min_size
+        self.devname = context.devname
+        self.table = {}
+        self._trials = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def candidates(self, kernel, n):
+        """
+        candidates(kernel, n)
+
+        Return the list of `(ls, gs)` to try for `kernel` with `n`
+        threads.  A `gs` of 0 means enough groups to cover `n`.
+        """
+        maxls = kernel.maxlsize
+        pref = min(kernel.preflsize, maxls)
+        lss = sorted(set([min(pref << i, maxls) for i in range(4)] +
+                         [maxls]))
+        res = [(ls, 0) for ls in lss]
+        if kernel.grid_stride:
+            procs = self.context.numprocs
+            for ls in lss:
+                for k in (2, 4, 8):
+                    if k * procs * ls < n:
+                        res.append((ls, k * procs))
+        return res
+
+    def config(self, kernel, n):
+        """
+        config(kernel, n)
+
+        Return `(ls, gs, trial)` for a call of `kernel` with `n`
+        threads, or None for the default configuration.  If `trial` is
+        True the call must be timed and reported with :meth:`report`.
+        """
+        if n < self.min_size:
+            return None
+        key = (kernel.cachekey, _bucket(n))
+        res = self.table.get(key)
+        if res is not None:
+            return res[0], res[1], False
+        with self._lock:
+            # Another thread may have finished the trials
+            res = self.table.get(key)
+            if res is not None:
+                return res[0], res[1], False
+            tr = self._trials.get(key)
+            if tr is None:
+                tr = [self.candidates(kernel, n), {}]
+                self._trials[key] = tr
+            cands, times = tr
+            for c in cands:
+                if len(times.get(c, ())) < self.repeat:
+                    return c[0], c[1], True
+        return None
+
+    def report(self, kernel, n, cfg, elapsed):
+        """
+        report(kernel, n, cfg, elapsed)
+
+        Record that the trial of `cfg` (as returned by :meth:`config`)
+        took `elapsed` seconds.
+        """
+        key = (kernel.cachekey, _bucket(n))
+        with self._lock:
+            tr = self._trials.get(key)
+            if tr is None:
+                return
+            cands, times = tr
+            times.setdefault((cfg[0], cfg[1]), []).append(elapsed)
+            if any(len(times.get(c, ())) < self.repeat for c in cands):
+                return
+            best = min(cands, key=lambda c: min(times[c]))
+            self.table[key] = best
+            del self._trials[key]
+        if self.path is not None:
+            self.save(self.path)
+
+    def save(self, path):
+        """
+        save(path)
+
+        Write the table to `path`, keeping the entries for other
+        devices already in the file.
+        """
+        data = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+        with self._lock:
+            data[self.devname] = dict(("%s:%d" % k, list(v)) for k, v in
+                                      self.table.items())
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    def load(self, path):
+        "Add the entries of `path` for this device to the table."
+        with open(path) as f:
+            data = json.load(f)
+        with self._lock:
+            for k, v in data.get(self.devname, {}).items():
+                name, bucket = k.rsplit(':', 1)
+                self.table[(name, int(bucket))] = tuple(v)
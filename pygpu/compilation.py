@@ -0,0 +1,153 @@
+import collections
+import os
+import sys
+import threading
+from timeit import default_timer
+
+from mako import template
+
+from .gpuarray import _set_compile_listener
+from .tools import _caches
+
+#: Compiles that took longer than this many seconds (render and
+#: backend compile together) are logged to stderr.  None disables
+#: the log.  Initialized from the GPUARRAY_COMPILE_LOG environment
+#: variable.
+log_threshold = None
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class Template(template.Template):
+    """
+    Mako template that records the time taken by :meth:`render` for
+    the next kernel compiled on the same thread.
+    """
+    def render(self, *args, **kwargs):
+        t = default_timer()
+        res = template.Template.render(self, *args, **kwargs)
+        _local.render = default_timer() - t
+        return res
+
+
+class CompileStats(object):
+    """
+    CompileStats(window=1000)
+
+    Where the time of the kernel compiles goes, by kernel name.  The
+    details of each compile are kept for the last `window` compiles.
+    """
+    def __init__(self, window=1000):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        "Forget all the compiles."
+        with _lock:
+            self._kernels = {}
+            self._recent = collections.deque(maxlen=self.window)
+            self._tiers = dict(disk=0, miss=0)
+            self._hits = dict((c, c.hits) for c in _caches)
+
+    def add(self, rec):
+        "Add the record of a compile, as in :meth:`get`."
+        with _lock:
+            st = self._kernels.get(rec['name'])
+            if st is None:
+                st = dict(count=0, render_time=0.0, compile_time=0.0,
+                          source_size=0, binary_size=0)
+                self._kernels[rec['name']] = st
+            st['count'] += 1
+            st['render_time'] += rec['render_time']
+            st['compile_time'] += rec['compile_time']
+            st['source_size'] = rec['source_size']
+            st['binary_size'] = rec['binary_size']
+            self._tiers[rec['tier']] += 1
+            self._recent.append(rec)
+
+    def _memory_hits(self):
+        res = {}
+        for c in _caches:
+            # clear() on the cache resets its count
+            hits = c.hits - self._hits.get(c, 0)
+            if hits < 0:
+                hits = c.hits
+            if hits:
+                res["%s.%s" % (c.__module__, c.__name__)] = hits
+        return res
+
+    def get(self):
+        """
+        get()
+
+        Return a dict with:
+
+        * `kernels`: maps each kernel name to the `count` of compiles,
+          their total `render_time` and `compile_time` in seconds and
+          the `source_size` and `binary_size` in bytes of the last one.
+        * `tiers`: the number of kernels found in the in-memory caches
+          of pygpu (`memory`), loaded from a binary (`disk`) and
+          compiled from source (`miss`).
+        * `memory_hits`: the `memory` hits by cache.
+        * `compiles`: the last compiles, each a dict with the `name`,
+          `tier`, `render_time`, `source_size`, `compile_time` and
+          `binary_size`.
+        """
+        with _lock:
+            hits = self._memory_hits()
+            tiers = dict(self._tiers)
+            tiers['memory'] = sum(hits.values())
+            return dict(kernels=dict((n, dict(st)) for n, st in
+                                     self._kernels.items()),
+                        tiers=tiers, memory_hits=hits,
+                        compiles=list(self._recent))
+
+
+#: Statistics of all the compiles
+stats = CompileStats()
+
+
+def compile_stats(reset=False):
+    """
+    compile_stats(reset=False)
+
+    Return the statistics of the kernel compiles done by pygpu (see
+    :meth:`CompileStats.get`), then forget them if `reset` is True.
+
+    The render time only covers the kernels generated by pygpu (elemwise,
+    reductions and scans) since it is measured on their templates.
+    """
+    res = stats.get()
+    if reset:
+        stats.reset()
+    return res
+
+
+def _on_compile(kernel, binary, source_size, compile_time, binary_size):
+    render_time = getattr(_local, 'render', 0.0)
+    _local.render = 0.0
+    rec = dict(name=kernel.name, render_time=render_time,
+               source_size=source_size, compile_time=compile_time,
+               binary_size=binary_size,
+               tier='disk' if binary else 'miss')
+    stats.add(rec)
+    if (log_threshold is not None and
+            render_time + compile_time >= log_threshold):
+        sys.stderr.write("pygpu: compiled %s (%s) in %.1f ms: render "
+                         "%.1f ms, compile %.1f ms, source %d bytes, "
+                         "binary %d bytes\n" %
+                         (rec['name'], rec['tier'],
+                          (render_time + compile_time) * 1e3,
+                          render_time * 1e3, compile_time * 1e3,
+                          source_size, binary_size))
+
+
+def _log_from_env():
+    global log_threshold
+    val = os.environ.get('GPUARRAY_COMPILE_LOG')
+    if val:
+        log_threshold = float(val)
+
+_log_from_env()
+_set_compile_listener(_on_compile)
@@ -1,13 +1,15 @@
-from mako.template import Template
+from compilation import Template
 
-from tools import ScalarArg, ArrayArg, as_argument, check_args, lfu_cache
+from tools import (ScalarArg, ArrayArg, as_argument, check_args, lfu_cache,
+                   Counter)
 from dtypes import parse_c_arg_backend
 from dtypes import dtype_to_ctype, get_np_obj, get_common_dtype
 
 import numpy
 import gpuarray
 
-__all__ = ['ElemwiseKernel', 'elemwise1', 'elemwise2', 'ielemwise2', 'compare']
+__all__ = ['ElemwiseKernel', 'elemwise1', 'elemwise2', 'ielemwise2', 'compare',
+           'SelectStats', 'select_stats', 'select_report']
 
 # parameters: preamble, name, nd, arguments, expression
 basic_kernel = Template("""
@@ -236,6 +238,63 @@ def massage_op(operation):
     return INDEX_RE.sub('\g<1>[0]', operation)
 
 
+VARIANTS = ('contig', 'specialized', 'dimspec', 'basic')
+
+
+class SelectStats(object):
+    """
+    Counters of the kernel variants picked by
+    :meth:`ElemwiseKernel.select_kernel`.
+
+    `calls` and `compiles` map each variant ('contig', 'specialized',
+    'dimspec' and 'basic') to the number of calls that used it and the
+    number of kernels compiled for it.  `key_changes` counts, for
+    'specialized' and 'dimspec', how many times the shape that the
+    kernel was counting towards specialization changed before reaching
+    the limit.  A high count relative to the calls means alternating
+    shapes keep resetting the count.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        "Set all the counters to zero."
+        self.calls = Counter()
+        self.compiles = Counter()
+        self.key_changes = Counter()
+
+    def __str__(self):
+        total = sum(self.calls.values())
+        lines = ["%-12s %10s %7s %9s %12s" %
+                 ("variant", "calls", "%", "compiles", "key changes")]
+        for v in VARIANTS:
+            changes = ""
+            if v in ('specialized', 'dimspec'):
+                changes = self.key_changes[v]
+            lines.append("%-12s %10d %7.1f %9d %12s" %
+                         (v, self.calls[v],
+                          100.0 * self.calls[v] / total if total else 0.0,
+                          self.compiles[v], changes))
+        return "\n".join(lines)
+
+
+#: Counters for all the ElemwiseKernel instances
+select_stats = SelectStats()
+
+
+def select_report(kernel=None):
+    """
+    select_report(kernel=None)
+
+    Return a table of the kernel variants used by `kernel` or by all
+    the :class:`ElemwiseKernel` instances if None (see
+    :class:`SelectStats`).
+    """
+    if kernel is None:
+        return str(select_stats)
+    return str(kernel.select_stats)
+
+
 class ElemwiseKernel(object):
     def __init__(self, context, arguments, operation, preamble="",
                  dimspec_limit=2, spec_limit=10):
@@ -277,7 +336,9 @@ class ElemwiseKernel(object):
         self.contig_k = gpuarray.GpuKernel(self.contig_src, "elem_contig",
                                            self.argspec_contig(),
                                            context=self.context, cluda=True,
-                                           **self.flags)
+                                           grid_stride=True, **self.flags)
+        self.select_stats = SelectStats()
+        self._count('compiles', 'contig')
         self._speckey = None
         self._dims = None
 
@@ -292,6 +353,10 @@ class ElemwiseKernel(object):
                 self.context == other.context and
                 self.preamble == other.preamble)
 
+    def _count(self, counter, variant):
+        getattr(self.select_stats, counter)[variant] += 1
+        getattr(select_stats, counter)[variant] += 1
+
     def clear_caches(self):
         """
         Clears the compiled kernel caches.
@@ -324,11 +389,12 @@ class ElemwiseKernel(object):
 
     @lfu_cache()
     def _make_basic(self, nd):
+        self._count('compiles', 'basic')
         name = "elem_" + str(nd)
         src = self.render_basic(nd, name=name)
         return gpuarray.GpuKernel(src, name, self.argspec_basic(nd),
                                   context=self.context, cluda=True,
-                                  **self.flags)
+                                  grid_stride=True, **self.flags)
 
     def prepare_args_basic(self, args, n, dims, strs, offsets):
         kernel_args = [n]
@@ -362,13 +428,14 @@ class ElemwiseKernel(object):
 
     @lfu_cache()
     def _make_dimspec(self, n, nd, dims):
+        self._count('compiles', 'dimspec')
         src = dimspec_kernel.render(preamble=self.preamble, name="elemk",
                                     n=n, nd=nd, dims=dims,
                                     arguments=self.arguments,
                                     expression=self.expression)
         return gpuarray.GpuKernel(src, "elemk", self.argspec_dimspec(nd),
                                   context=self.context, cluda=True,
-                                  **self.flags)
+                                  grid_stride=True, **self.flags)
 
     def prepare_args_dimspec(self, args, strs, offsets):
         kernel_args = []
@@ -406,6 +473,7 @@ class ElemwiseKernel(object):
 
     @lfu_cache()
     def _make_specialized(self, n, nd, dims, strs, offsets):
+        self._count('compiles', 'specialized')
         src = specialized_kernel.render(preamble=self.preamble,
                                         name="elemk", n=n, nd=nd,
                                         dim=dims, strs=strs,
@@ -414,7 +482,7 @@ class ElemwiseKernel(object):
                                         offsets=offsets)
         return gpuarray.GpuKernel(src, "elemk", self.argspec_specialized(),
                                   context=self.context, cluda=True,
-                                  **self.flags)
+                                  grid_stride=True, **self.flags)
 
     def get_specialized(self, args, n, nd, dims, strs, offsets):
         args = self.prepare_args_specialized(args)
@@ -430,31 +498,43 @@ class ElemwiseKernel(object):
                                                         collapse=collapse,
                                                         broadcast=broadcast)
         if contig:
+            self._count('calls', 'contig')
             return (self.contig_k, self.prepare_args_contig(args, n, offsets)), n
 
         try:
-            return self.try_specialized(args, n, nd, dims, strs, offsets), n
+            res = self.try_specialized(args, n, nd, dims, strs, offsets), n
+            self._count('calls', 'specialized')
+            return res
         except KeyError:
             key = dims, strs, offsets
             if key == self._speckey:
                 if self._numcall > self._spec_limit:
+                    self._count('calls', 'specialized')
                     return self.get_specialized(args, n, nd, dims, strs, offsets), n
                 self._numcall += 1
             else:
+                if self._speckey is not None:
+                    self._count('key_changes', 'specialized')
                 self._speckey = key
                 self._numcall = 1
 
         try:
-            return self.try_dimspec(args, n, nd, dims, strs, offsets), n
+            res = self.try_dimspec(args, n, nd, dims, strs, offsets), n
+            self._count('calls', 'dimspec')
+            return res
         except KeyError:
             if dims == self._dims:
                 if self._dimcall > self._dimspec_limit:
+                    self._count('calls', 'dimspec')
                     return self.get_dimspec(args, n, nd, dims, strs, offsets), n
                 self._dimcall += 1
             else:
+                if self._dims is not None:
+                    self._count('key_changes', 'dimspec')
                 self._dims = dims
                 self._dimcall = 1
 
+        self._count('calls', 'basic')
         return self.get_basic(args, n, nd, dims, strs, offsets), n
 
     def prepare(self, *args, **kwargs):
@@ -70,8 +70,17 @@ cdef extern from "gpuarray/buffer.h":
     ctypedef struct gpuarray_buffer_ops:
         void *buffer_init(int devno, int flags, int *ret)
         void buffer_deinit(void *ctx)
+        gpudata *buffer_alloc(void *ctx, size_t sz, void *data, int flags,
+                              int *ret)
+        void buffer_release(gpudata *b)
         char *ctx_error(void *ctx)
         int property(void *c, gpudata *b, gpukernel *k, int prop_id, void *res)
+        int ctx_set_property(void *ctx, int prop_id, const void *val)
+        int buffer_set_property(gpudata *buf, int prop_id, const void *val)
+
+    int GA_CTX_MULTI_THREAD
+    int GA_CTX_SINGLE_THREAD
+    int GA_CTX_MEM_POOL
 
     int GA_CTX_PROP_DEVNAME
     int GA_CTX_PROP_MAXLSIZE
@@ -79,12 +88,74 @@ cdef extern from "gpuarray/buffer.h":
     int GA_CTX_PROP_NUMPROCS
     int GA_CTX_PROP_MAXGSIZE
     int GA_CTX_PROP_BIN_ID
+    int GA_CTX_PROP_POOL_LIMIT
+    int GA_CTX_PROP_POOL_CACHED
+    int GA_CTX_PROP_POOL_HITS
+    int GA_CTX_PROP_POOL_MISSES
+    int GA_CTX_PROP_MEM_STATS
+    int GA_CTX_PROP_RECLAIM_ADD
+    int GA_CTX_PROP_RECLAIM_DEL
+    int GA_CTX_PROP_OOM_RETRIES
+    int GA_CTX_PROP_MEM_BUDGET
+    int GA_CTX_PROP_SPILLED
+    int GA_CTX_PROP_SPILLS
+
+    ctypedef void (*gpuarray_reclaim_fn)(void *data)
+    ctypedef struct gpuarray_reclaim:
+        gpuarray_reclaim_fn fn
+        void *data
+
+    enum:
+        GA_MEM_HIST_BINS
+
+    ctypedef struct gpuarray_mem_stats:
+        size_t live_bytes
+        size_t peak_bytes
+        size_t live_buffers
+        size_t allocs
+        size_t frees
+        size_t hist[GA_MEM_HIST_BINS]
+
+    int GA_CTX_PROP_CALL_STATS
+    int GA_CTX_PROP_NULL_CONFIG
+    int GA_CTX_PROP_TIMING
+
+    enum:
+        GA_CALL_KINDS
+
+    ctypedef struct gpuarray_call_record:
+        int kind
+        size_t bytes
+        size_t items
+        double time
+
+    ctypedef struct gpuarray_call_stats:
+        size_t calls[GA_CALL_KINDS]
+        size_t bytes[GA_CALL_KINDS]
+        double time
+        const gpuarray_call_record *log
+        size_t nlog
+
+    ctypedef struct gpuarray_null_config:
+        double launch_latency
+        double item_time
+        double transfer_latency
+        double bandwidth
+        double device_bandwidth
+        size_t log_max
+        int realtime
     int GA_BUFFER_PROP_CTX
+    int GA_BUFFER_PROP_HOSTPOINTER
+    int GA_BUFFER_PROP_SPILLABLE
+
+    int GA_BUFFER_HOST
+    int GA_BUFFER_USE_DATA
     int GA_KERNEL_PROP_CTX
     int GA_KERNEL_PROP_MAXLSIZE
     int GA_KERNEL_PROP_PREFLSIZE
     int GA_KERNEL_PROP_NUMARGS
     int GA_KERNEL_PROP_TYPES
+    int GA_KERNEL_PROP_ELAPSED
 
     cdef enum ga_usefl:
         GA_USE_CLUDA, GA_USE_SMALL, GA_USE_DOUBLE, GA_USE_COMPLEX, GA_USE_HALF,
@@ -97,6 +168,9 @@ cdef extern from "gpuarray/kernel.h":
     ctypedef struct _GpuKernel "GpuKernel":
         gpukernel *k
         const gpuarray_buffer_ops *ops
+        size_t maxlsize
+        size_t preflsize
+        size_t maxgsize
 
     int GpuKernel_init(_GpuKernel *k, const gpuarray_buffer_ops *ops, void *ctx,
                        unsigned int count, const char **strs,
@@ -163,6 +237,9 @@ cdef extern from "gpuarray/array.h":
     int GpuArray_move(_GpuArray *dst, _GpuArray *src)
     int GpuArray_write(_GpuArray *dst, void *src, size_t src_sz)
     int GpuArray_read(void *dst, size_t dst_sz, _GpuArray *src)
+    int GpuArray_write_async(_GpuArray *dst, void *src, size_t src_sz)
+    int GpuArray_read_async(void *dst, size_t dst_sz, _GpuArray *src)
+    int GpuArray_done(_GpuArray *a, int *ret)
     int GpuArray_memset(_GpuArray *a, int data)
     int GpuArray_copy(_GpuArray *res, _GpuArray *a, ga_order order)
 
@@ -223,6 +300,9 @@ cdef void *array_context(GpuArray a) except NULL
 cdef int array_move(GpuArray a, GpuArray src) except -1
 cdef int array_write(GpuArray a, void *src, size_t sz) except -1
 cdef int array_read(void *dst, size_t sz, GpuArray src) except -1
+cdef int array_write_async(GpuArray a, void *src, size_t sz) except -1
+cdef int array_read_async(void *dst, size_t sz, GpuArray src) except -1
+cdef bint array_done(GpuArray a) except -1
 cdef int array_memset(GpuArray a, int data) except -1
 cdef int array_copy(GpuArray res, GpuArray a, ga_order order) except -1
 cdef int array_transfer(GpuArray res, GpuArray a, void *new_ctx,
@@ -244,6 +324,8 @@ cdef int kernel_binary(GpuKernel k, size_t *, void **) except -1
 cdef int kernel_property(GpuKernel k, int prop_id, void *res) except -1
 
 cdef int ctx_property(GpuContext c, int prop_id, void *res) except -1
+cdef int ctx_set_property(GpuContext c, int prop_id,
+                          const void *val) except -1
 cdef const gpuarray_buffer_ops *get_ops(kind) except NULL
 cdef ops_kind(const gpuarray_buffer_ops *ops)
 cdef GpuContext ensure_context(GpuContext c)
@@ -299,6 +381,15 @@ cdef api GpuArray pygpu_concatenate(const _GpuArray **a, size_t n,
 cdef api class GpuContext [type PyGpuContextType, object PyGpuContextObject]:
     cdef const gpuarray_buffer_ops *ops
     cdef void* ctx
+    cdef list reclaimers
+    cdef bint timed
+    cdef object tuner
+    cdef dict _kernels
+    # Immutable properties, fetched on first use
+    cdef size_t _maxlsize
+    cdef size_t _lmemsize
+    cdef size_t _maxgsize
+    cdef unsigned int _numprocs
 
 cdef GpuArray new_GpuArray(type cls, GpuContext ctx, object base)
 
@@ -311,11 +402,21 @@ cdef api class GpuArray [type PyGpuArrayType, object PyGpuArrayObject]:
     cdef __index_helper(self, key, unsigned int i, ssize_t *start,
                         ssize_t *stop, ssize_t *step)
 
+# Stores an argument of a given type in its kernel call slot
+ctypedef int (*arg_packer)(void **slot, object o) except -1
+
 cdef api class GpuKernel [type PyGpuKernelType, object PyGpuKernelObject]:
     cdef _GpuKernel k
     cdef readonly GpuContext context
     cdef void **callbuf
+    cdef unsigned int _numargs
+    cdef arg_packer *_packers
+    cdef readonly object name
+    cdef readonly object cachekey
+    cdef readonly bint grid_stride
     cdef object __weakref__
 
-    cdef do_call(self, py_n, py_ls, py_gs, py_args, size_t shared)
+    cdef do_call(self, py_n, py_ls, py_gs, py_args, size_t shared,
+                 bint timed)
+    cdef int _pack(self, tuple args) except -1
     cdef _setarg(self, unsigned int index, int typecode, object o)
@@ -1,11 +1,11 @@
 cimport libc.stdio
 from libc.stdlib cimport malloc, calloc, free
 from cpython.mem cimport PyMem_Malloc, PyMem_Free
-from libc.string cimport strncmp
+from libc.string cimport strncmp, strlen
 
 cimport numpy as np
 
-from cpython cimport Py_INCREF, PyNumber_Index
+from cpython cimport Py_INCREF, Py_DECREF, PyNumber_Index
 from cpython.object cimport Py_EQ, Py_NE
 
 def api_version():
@@ -17,6 +17,11 @@ np.import_array()
 # to export the numeric value
 SIZE = GA_SIZE
 
+# context flags
+CTX_MULTI_THREAD = GA_CTX_MULTI_THREAD
+CTX_SINGLE_THREAD = GA_CTX_SINGLE_THREAD
+CTX_MEM_POOL = GA_CTX_MEM_POOL
+
 # Numpy API steals dtype references and this breaks cython
 cdef object PyArray_Empty(int a, np.npy_intp *b, np.dtype c, int d):
     Py_INCREF(c)
@@ -138,9 +143,60 @@ def cuda_wrap_ctx(size_t ptr, bint own):
     res.ctx = cuda_make_ctx(<void *>ptr, flags)
     if res.ctx == NULL:
         raise RuntimeError, "cuda_make_ctx call failed"
+    ctx_init_reclaim(res)
     return res
 
+import gc
+import hashlib
+import traceback
 import numpy
+from timeit import default_timer
+
+# Set by pygpu.tracing while a Tracer is active
+cdef object tracer = None
+
+# Set by pygpu.timing, called with the context, the kernel name and
+# the device time of each timed launch
+cdef object timing_listener = None
+
+# Set by pygpu.compilation, called with the kernel, whether it was
+# loaded from a binary, the source size, the compile time and the
+# binary size of each compile
+cdef object compile_listener = None
+
+def _set_tracer(t):
+    """
+    _set_tracer(t)
+
+    Install `t` as the active tracer (None to stop tracing) and return
+    the previous one.  Use :class:`pygpu.tracing.Tracer` instead.
+    """
+    global tracer
+    prev = tracer
+    tracer = t
+    return prev
+
+def _set_timing_listener(fn):
+    """
+    _set_timing_listener(fn)
+
+    Install `fn` to be called with the context, kernel name and device
+    time of each timed launch.  Used by :mod:`pygpu.timing`.
+    """
+    global timing_listener
+    timing_listener = fn
+
+def _set_compile_listener(fn):
+    """
+    _set_compile_listener(fn)
+
+    Install `fn` to be called with the kernel, whether it was loaded
+    from a binary, the source size, the compile time and the binary
+    size of each kernel compile.  Used by
+    :mod:`pygpu.compilation`.
+    """
+    global compile_listener
+    compile_listener = fn
 
 cdef dict NP_TO_TYPE = {
     np.dtype('bool'): GA_BOOL,
@@ -317,10 +373,15 @@ cdef int array_copy_from_host(GpuArray a, const gpuarray_buffer_ops *ops,
                               unsigned int nd, const size_t *dims,
                               const ssize_t *strides) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_copy_from_host(&a.ga, ops, ctx, buf, typecode, nd, dims,
                                   strides);
     if err != GA_NO_ERROR:
         raise get_exc(err), Gpu_error(ops, ctx, err)
+    if tracer is not None:
+        tracer.record('transfer', 'write', t, (a,), dict())
 
 cdef int array_view(GpuArray v, GpuArray a) except -1:
     cdef int err
@@ -343,9 +404,14 @@ cdef int array_index(GpuArray r, GpuArray a, const ssize_t *starts,
 
 cdef int array_setarray(GpuArray v, GpuArray a) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_setarray(&v.ga, &a.ga)
     if err != GA_NO_ERROR:
         raise get_exc(err), GpuArray_error(&v.ga, err)
+    if tracer is not None:
+        tracer.record('copy', 'setarray', t, (v, a), dict())
 
 cdef int array_reshape(GpuArray res, GpuArray a, unsigned int nd,
                        const size_t *newdims, ga_order ord,
@@ -377,41 +443,101 @@ cdef void *array_context(GpuArray a) except NULL:
 
 cdef int array_move(GpuArray a, GpuArray src) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_move(&a.ga, &src.ga)
     if err != GA_NO_ERROR:
         raise get_exc(err), GpuArray_error(&a.ga, err)
+    if tracer is not None:
+        tracer.record('copy', 'move', t, (a, src), dict())
 
 cdef int array_write(GpuArray a, void *src, size_t sz) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_write(&a.ga, src, sz)
     if err != GA_NO_ERROR:
         raise get_exc(err), GpuArray_error(&a.ga, err)
+    if tracer is not None:
+        tracer.record('transfer', 'write', t, (a,), dict(bytes=sz))
 
 cdef int array_read(void *dst, size_t sz, GpuArray src) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_read(dst, sz, &src.ga)
     if err != GA_NO_ERROR:
         raise get_exc(err), GpuArray_error(&src.ga, err)
+    if tracer is not None:
+        tracer.record('transfer', 'read', t, (src,), dict(bytes=sz))
+
+cdef int array_write_async(GpuArray a, void *src, size_t sz) except -1:
+    cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
+    err = GpuArray_write_async(&a.ga, src, sz)
+    if err != GA_NO_ERROR:
+        raise get_exc(err), GpuArray_error(&a.ga, err)
+    if tracer is not None:
+        tracer.record('transfer', 'write_async', t, (a,), dict(bytes=sz))
+
+cdef int array_read_async(void *dst, size_t sz, GpuArray src) except -1:
+    cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
+    err = GpuArray_read_async(dst, sz, &src.ga)
+    if err != GA_NO_ERROR:
+        raise get_exc(err), GpuArray_error(&src.ga, err)
+    if tracer is not None:
+        tracer.record('transfer', 'read_async', t, (src,), dict(bytes=sz))
+
+cdef bint array_done(GpuArray a) except -1:
+    cdef int err = GA_NO_ERROR
+    cdef int res
+    res = GpuArray_done(&a.ga, &err)
+    if res == -1:
+        raise get_exc(err), GpuArray_error(&a.ga, err)
+    return res
 
 cdef int array_memset(GpuArray a, int data) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_memset(&a.ga, data)
     if err != GA_NO_ERROR:
         raise get_exc(err), GpuArray_error(&a.ga, err)
+    if tracer is not None:
+        tracer.record('copy', 'memset', t, (a,), dict(value=data))
 
 cdef int array_copy(GpuArray res, GpuArray a, ga_order order) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_copy(&res.ga, &a.ga, order)
     if err != GA_NO_ERROR:
         raise get_exc(err), GpuArray_error(&a.ga, err)
+    if tracer is not None:
+        tracer.record('copy', 'copy', t, (a, res), dict())
 
 cdef int array_transfer(GpuArray res, GpuArray a, void *new_ctx,
                         const gpuarray_buffer_ops *new_ops,
                         bint may_share) except -1:
     cdef int err
+    cdef double t = 0
+    if tracer is not None:
+        t = tracer.start()
     err = GpuArray_transfer(&res.ga, &a.ga, new_ctx, new_ops, may_share)
     if err != GA_NO_ERROR:
         raise get_exc(err), GpuArray_error(&a.ga, err)
+    if tracer is not None:
+        tracer.record('transfer', 'transfer', t, (res,), dict(may_share=may_share))
 
 cdef int array_split(_GpuArray **res, GpuArray a, size_t n, size_t *p,
                      unsigned int axis) except -1:
@@ -436,8 +562,21 @@ cdef int kernel_init(GpuKernel k, const gpuarray_buffer_ops *ops, void *ctx,
                      int flags) except -1:
     cdef int err
     cdef char *err_str = NULL
+    cdef double t = 0
+    cdef double t0 = 0
+    cdef double elapsed
+    cdef size_t srcsz = 0
+    cdef size_t binsz = 0
+    cdef void *bin
+    cdef unsigned int i
+    if tracer is not None:
+        t = tracer.start()
+    if compile_listener is not None:
+        t0 = default_timer()
     err = GpuKernel_init(&k.k, ops, ctx, count, strs, len, name, argcount,
                           types, flags, &err_str)
+    if compile_listener is not None:
+        elapsed = default_timer() - t0
     if err != GA_NO_ERROR:
         if err_str != NULL:
             try:
@@ -446,6 +585,17 @@ cdef int kernel_init(GpuKernel k, const gpuarray_buffer_ops *ops, void *ctx,
                 free(err_str)
             raise get_exc(err), py_err_str
         raise get_exc(err), Gpu_error(ops, ctx, err)
+    if tracer is not None:
+        tracer.record('compile', k.name, t, (), dict(flags=flags))
+    if compile_listener is not None:
+        for i in range(count):
+            srcsz += strlen(strs[i]) if len == NULL or len[i] == 0 else len[i]
+        if GpuKernel_binary(&k.k, &binsz, &bin) == GA_NO_ERROR:
+            free(bin)
+        else:
+            binsz = 0
+        compile_listener(k, (flags & GA_USE_BINARY) != 0, srcsz, elapsed,
+                         binsz)
 
 cdef int kernel_clear(GpuKernel k) except -1:
     GpuKernel_clear(&k.k)
@@ -493,6 +643,40 @@ cdef int ctx_property(GpuContext c, int prop_id, void *res) except -1:
     if err != GA_NO_ERROR:
         raise get_exc(err), Gpu_error(c.ops, c.ctx, err)
 
+cdef int ctx_set_property(GpuContext c, int prop_id,
+                          const void *val) except -1:
+    cdef int err
+    err = c.ops.ctx_set_property(c.ctx, prop_id, val)
+    if err != GA_NO_ERROR:
+        raise get_exc(err), Gpu_error(c.ops, c.ctx, err)
+
+cdef void ctx_reclaim(void *data) with gil:
+    cdef GpuContext c = <GpuContext>data
+    # data is borrowed and gc.collect() could release the last other
+    # reference, so hold our own for the whole callback
+    Py_INCREF(c)
+    # Nothing can be raised from here
+    try:
+        # Arrays only referenced from cycles hold device memory too
+        gc.collect()
+        for fn in list(c.reclaimers):
+            try:
+                fn()
+            except Exception:
+                traceback.print_exc()
+    except:
+        pass
+    finally:
+        Py_DECREF(c)
+
+cdef int ctx_init_reclaim(GpuContext c) except -1:
+    cdef gpuarray_reclaim r
+    r.fn = <gpuarray_reclaim_fn>ctx_reclaim
+    # Borrowed reference, the callback is removed in __dealloc__
+    r.data = <void *>c
+    ctx_set_property(c, GA_CTX_PROP_RECLAIM_ADD, &r)
+    c.reclaimers = []
+
 cdef const gpuarray_buffer_ops *get_ops(kind) except NULL:
     cdef const gpuarray_buffer_ops *res
     res = gpuarray_get_ops(kind)
@@ -500,11 +684,19 @@ cdef const gpuarray_buffer_ops *get_ops(kind) except NULL:
         raise RuntimeError, "Unsupported kind: %s" % (kind,)
     return res
 
+# Names of the gpuarray_call_kind values, in order
+_call_kinds = ('alloc', 'free', 'move', 'read', 'write', 'memset',
+               'compile', 'launch', 'sync', 'extcopy', 'transfer')
+
 cdef ops_kind(const gpuarray_buffer_ops *ops):
     if ops == gpuarray_get_ops("opencl"):
         return "opencl"
     if ops == gpuarray_get_ops("cuda"):
         return "cuda"
+    if ops == gpuarray_get_ops("host"):
+        return "host"
+    if ops == gpuarray_get_ops("null"):
+        return "null"
     raise RuntimeError, "Unknown ops vector"
 
 def set_default_context(GpuContext ctx):
@@ -551,6 +743,9 @@ cdef bint pygpu_GpuArray_Check(object o):
     return isinstance(o, GpuArray)
 
 cdef GpuContext pygpu_init(dev):
+    return ctx_init(dev, 0)
+
+cdef GpuContext ctx_init(dev, int flags):
     if dev.startswith('cuda'):
         kind = "cuda"
         if dev[4:] == '':
@@ -566,18 +761,29 @@ cdef GpuContext pygpu_init(dev):
             raise ValueError, "OpenCL name incorrect. Should be opencl<int>:<int> instead got: " + dev
         else:
             devnum = int(devspec[0]) << 16 | int(devspec[1])
+    elif dev.startswith('host'):
+        kind = "host"
+        if dev[4:] == '':
+            devnum = 0
+        else:
+            devnum = int(dev[4:])
+    elif dev == 'null':
+        kind = "null"
+        devnum = 0
     else:
         raise ValueError, "Unknown device format:" + dev
-    return GpuContext(kind, devnum)
+    return GpuContext(kind, devnum, flags)
 
-def init(dev):
+def init(dev, flags=0):
     """
-    init(dev)
+    init(dev, flags=0)
 
     Creates a context from a device specifier.
 
     :param dev: device specifier
     :type dev: string
+    :param flags: context flags (`CTX_MEM_POOL`, ...)
+    :type flags: int
     :rtype: GpuContext
 
     Device specifiers are composed of the type string and the device
@@ -585,6 +791,8 @@ def init(dev):
 
         "cuda0"
         "opencl0:1"
+        "host"
+        "null"
 
     For cuda the device id is the numeric identifier.  You can see
     what devices are available by running nvidia-smi on the machine.
@@ -596,8 +804,22 @@ def init(dev):
     list available platforms and devices.  You can experiement with
     the values, unavaiable ones will just raise an error, and there
     are no gaps in the valid numbers.
+
+    "host" runs the kernels on the CPU with a pool of threads (set
+    the GPUARRAY_HOST_THREADS environment variable to control their
+    number).  The kernels are compiled with the system C compiler, so
+    it needs to be available at runtime.
+
+    "null" runs nothing: it only records the calls made on the
+    context and their estimated cost, see :meth:`GpuContext.call_stats`.
+    Reading from its arrays gives zeros.
+
+    Passing `CTX_MEM_POOL` in `flags` makes the context keep released
+    buffers around to serve later allocations of a similar size
+    without going through the driver allocator.  See
+    :meth:`GpuContext.pool_stats`.
     """
-    return pygpu_init(dev)
+    return ctx_init(dev, flags)
 
 def zeros(shape, dtype=GA_DOUBLE, order='C', GpuContext context=None,
           cls=None):
@@ -707,6 +929,294 @@ def empty(shape, dtype=GA_DOUBLE, order='C', GpuContext context=None,
     finally:
         free(cdims)
 
+cdef class _HostBuffer:
+    """
+    Owner of a page-locked host allocation, exposed as bytes to numpy.
+    """
+    cdef GpuContext context
+    cdef gpudata *buf
+    cdef void *ptr
+    cdef size_t sz
+
+    def __cinit__(self, GpuContext context, size_t sz):
+        cdef int err = GA_NO_ERROR
+        self.context = context
+        self.sz = sz
+        self.buf = context.ops.buffer_alloc(context.ctx, sz, NULL,
+                                            GA_BUFFER_HOST, &err)
+        if self.buf == NULL:
+            raise get_exc(err), Gpu_error(context.ops, context.ctx, err)
+        err = context.ops.property(NULL, self.buf, NULL,
+                                   GA_BUFFER_PROP_HOSTPOINTER, &self.ptr)
+        if err != GA_NO_ERROR:
+            raise get_exc(err), Gpu_error(context.ops, context.ctx, err)
+
+    def __dealloc__(self):
+        if self.buf != NULL:
+            self.context.ops.buffer_release(self.buf)
+
+    property __array_interface__:
+        def __get__(self):
+            return {'shape': (self.sz,), 'typestr': '|u1',
+                    'data': (<size_t>self.ptr, False), 'version': 3}
+
+def pinned_empty(shape, dtype=GA_DOUBLE, order='C', GpuContext context=None):
+    """
+    pinned_empty(shape, dtype='float64', order='C', context=None)
+
+    Returns an empty (uninitialized) numpy array of the requested
+    shape, type and order in page-locked host memory.
+
+    Transfers between pinned memory and the device are faster than
+    with regular memory and don't need to be staged.  Pinned memory
+    is a limited system resource so don't use this for every array.
+
+    :param shape: number of elements in each dimension
+    :type shape: iterable of ints
+    :param dtype: type of the elements
+    :type dtype: string, numpy.dtype or int
+    :param order: layout of the data in memory, 'C' or 'F'ortran
+    :type order: string
+    :param context: context for which the memory is pinned
+    :type context: GpuContext
+    :rtype: numpy.ndarray
+    """
+    cdef np.dtype dt
+    cdef size_t sz
+
+    context = ensure_context(context)
+    dt = typecode_to_dtype(dtype_to_typecode(dtype))
+    sz = dt.itemsize
+    for d in shape:
+        sz *= d
+    buf = _HostBuffer(context, sz)
+    return numpy.asarray(buf).view(dt).reshape(shape, order=order)
+
+def from_host_buffer(obj, dtype=None, zero_copy=True, GpuContext context=None,
+                     cls=None):
+    """
+    from_host_buffer(obj, dtype=None, zero_copy=True, context=None, cls=None)
+
+    Returns an array that uses the memory of `obj` as storage.
+
+    `obj` can be anything that :func:`numpy.asarray` accepts without
+    copying, like a numpy array or an object exposing a writable
+    buffer.  The device accesses the host memory directly so there is
+    no transfer, but every access goes over the bus.  This is only
+    worth it for data that is used once or that is too big for the
+    device.
+
+    If the memory can't be used directly (it is read-only, not
+    contiguous or the backend doesn't support it) or `zero_copy` is
+    False, the data is copied to the device like with :func:`array`.
+
+    The memory of `obj` must not be modified by the host while the
+    device is using it.
+
+    :param obj: host memory to wrap
+    :param dtype: type of the elements (a conversion implies a copy)
+    :type dtype: string, numpy.dtype or int
+    :param zero_copy: use the host memory directly if possible
+    :type zero_copy: bool
+    :param context: context in which to create the array
+    :type context: GpuContext
+    :param cls: class of the returned array (must inherit from GpuArray)
+    :type cls: class
+    :rtype: array
+    """
+    cdef np.ndarray n
+    cdef gpudata *buf
+    cdef size_t *cdims = NULL
+    cdef ssize_t *cstrides = NULL
+    cdef unsigned int nd
+    cdef int err = GA_NO_ERROR
+
+    context = ensure_context(context)
+    if dtype is not None:
+        dtype = typecode_to_dtype(dtype_to_typecode(dtype))
+    n = numpy.asarray(obj, dtype=dtype)
+    flags = (<object>n).flags
+
+    if not (zero_copy and flags.writeable and np.PyArray_NBYTES(n) != 0 and
+            (flags.c_contiguous or flags.f_contiguous)):
+        return array(n, context=context, cls=cls)
+
+    buf = context.ops.buffer_alloc(context.ctx, np.PyArray_NBYTES(n),
+                                   np.PyArray_DATA(n),
+                                   GA_BUFFER_USE_DATA, &err)
+    if buf == NULL:
+        if err == GA_DEVSUP_ERROR or err == GA_IMPL_ERROR:
+            return array(n, context=context, cls=cls)
+        raise get_exc(err), Gpu_error(context.ops, context.ctx, err)
+
+    try:
+        nd = <unsigned int>np.PyArray_NDIM(n)
+        cdims = <size_t *>calloc(nd, sizeof(size_t))
+        cstrides = <ssize_t *>calloc(nd, sizeof(ssize_t))
+        if nd != 0 and (cdims == NULL or cstrides == NULL):
+            raise MemoryError
+        for i in range(nd):
+            cdims[i] = np.PyArray_DIM(n, i)
+            cstrides[i] = np.PyArray_STRIDE(n, i)
+        # n keeps the memory alive as long as the array needs it
+        return pygpu_fromgpudata(buf, 0, dtype_to_typecode((<object>n).dtype),
+                                 nd, cdims, cstrides, context, True, n, cls)
+    finally:
+        free(cdims)
+        free(cstrides)
+        context.ops.buffer_release(buf)
+
+cdef class Arena:
+    """
+    Sub-allocator that carves arrays out of one device buffer.
+
+    .. code-block:: python
+
+        Arena(size, context=None, alignment=256)
+
+    :param size: size of the arena in bytes
+    :type size: int
+    :param context: context in which to allocate the arena
+    :type context: GpuContext
+    :param alignment: alignment (in bytes) of the arrays handed out,
+                      must be a power of 2
+    :type alignment: int
+
+    Arrays are views into the arena buffer so creating them doesn't
+    involve the driver.  Space is only reclaimed all at once with
+    :meth:`reset`.  The whole content can be saved and restored in a
+    single transfer with :meth:`read` and :meth:`write`.
+    """
+    cdef readonly GpuContext context
+    cdef GpuArray buf
+    cdef readonly size_t size
+    cdef readonly size_t alignment
+    cdef size_t top
+
+    def __cinit__(self, size_t size, GpuContext context=None,
+                  size_t alignment=256):
+        if alignment == 0 or (alignment & (alignment - 1)) != 0:
+            raise ValueError, "alignment must be a power of 2"
+        self.context = ensure_context(context)
+        self.buf = pygpu_empty(1, &size, GA_UBYTE, GA_C_ORDER, self.context,
+                               None)
+        self.size = size
+        self.alignment = alignment
+        self.top = 0
+
+    property used:
+        "Number of bytes handed out since the last reset"
+        def __get__(self):
+            return self.top
+
+    def empty(self, shape, dtype=GA_DOUBLE, order='C', cls=None):
+        """
+        empty(shape, dtype='float64', order='C', cls=None)
+
+        Returns an empty (uninitialized) array of the requested shape,
+        type and order placed in the arena.
+
+        Raises MemoryError if there is not enough space left.
+        """
+        cdef size_t *cdims = NULL
+        cdef ssize_t *cstrides = NULL
+        cdef unsigned int nd, i
+        cdef size_t elsize, nbytes, off, align
+        cdef int typecode
+        cdef ga_order ord = to_ga_order(order)
+
+        typecode = dtype_to_typecode(dtype)
+        elsize = gpuarray_get_elsize(typecode)
+        nd = <unsigned int>len(shape)
+        try:
+            cdims = <size_t *>calloc(nd, sizeof(size_t))
+            cstrides = <ssize_t *>calloc(nd, sizeof(ssize_t))
+            if cdims == NULL or cstrides == NULL:
+                raise MemoryError
+            for i, d in enumerate(shape):
+                cdims[i] = d
+            nbytes = elsize
+            if ord == GA_F_ORDER:
+                for i in range(nd):
+                    cstrides[i] = nbytes
+                    nbytes *= cdims[i]
+            else:
+                for i in range(nd, 0, -1):
+                    cstrides[i-1] = nbytes
+                    nbytes *= cdims[i-1]
+
+            align = self.alignment
+            if elsize > align:
+                align = elsize
+            off = (self.top + align - 1) // align * align
+            if off > self.size or nbytes > self.size - off:
+                raise MemoryError, "not enough space left in the arena"
+
+            res = pygpu_fromgpudata(self.buf.ga.data, self.buf.ga.offset + off,
+                                    typecode, nd, cdims, cstrides,
+                                    self.context, True, self, cls)
+            self.top = off + nbytes
+            return res
+        finally:
+            free(cdims)
+            free(cstrides)
+
+    def array(self, a, dtype=None, order='C', cls=None):
+        """
+        array(a, dtype=None, order='C', cls=None)
+
+        Returns an array placed in the arena with a copy of the data
+        in `a`.
+        """
+        cdef np.ndarray n
+        cdef GpuArray res
+
+        n = numpy.asarray(a, dtype=dtype,
+                          order='F' if to_ga_order(order) == GA_F_ORDER
+                          else 'C')
+        res = self.empty((<object>n).shape, n.dtype, order, cls)
+        array_write(res, np.PyArray_DATA(n), np.PyArray_NBYTES(n))
+        return res
+
+    def reset(self):
+        """
+        reset()
+
+        Make all the space available again.  Arrays handed out before
+        the reset still point into the arena and will alias the new
+        ones, so they shouldn't be used anymore.
+        """
+        self.top = 0
+
+    def read(self):
+        """
+        read()
+
+        Returns the used part of the arena as a numpy array of bytes.
+        """
+        cdef np.ndarray res
+        res = numpy.empty((self.top,), dtype='uint8')
+        if self.top != 0:
+            array_read(np.PyArray_DATA(res), self.top, self.buf)
+        return res
+
+    def write(self, data):
+        """
+        write(data)
+
+        Restores the arena content from `data` (as obtained from
+        :meth:`read`) in a single transfer.  Arrays handed out by the
+        arena see the restored content and the arena is considered used
+        up to the end of `data`.
+        """
+        cdef np.ndarray d
+        d = numpy.frombuffer(data, dtype='uint8')
+        if <size_t>len(d) > self.size:
+            raise ValueError, "data is larger than the arena"
+        if len(d) != 0:
+            array_write(self.buf, np.PyArray_DATA(d), len(d))
+        self.top = len(d)
+
 def asarray(a, dtype=None, order='A', GpuContext context=None):
     """
     asarray(a, dtype=None, order='A', context=None)
@@ -947,33 +1457,42 @@ cdef class GpuContext:
 
     .. code-block:: python
 
-        GpuContext(kind, devno)
+        GpuContext(kind, devno, flags=0)
 
     :param kind: module name for the context
     :type kind: string
     :param devno: device number
     :type devno: int
+    :param flags: context flags (`CTX_MEM_POOL`, ...)
+    :type flags: int
 
     The currently implemented modules (for the `kind` parameter) are
-    "cuda" and "opencl".  Which are available depends on the build
+    "cuda", "opencl", "host" and "null".  Which are available depends on the build
     options for libgpuarray.
 
     If you want an alternative interface check :meth:`~pygpu.gpuarray.init`.
     """
     def __dealloc__(self):
+        cdef gpuarray_reclaim r
         if self.ctx != NULL:
+            if self.reclaimers is not None:
+                r.fn = <gpuarray_reclaim_fn>ctx_reclaim
+                r.data = <void *>self
+                self.ops.ctx_set_property(self.ctx, GA_CTX_PROP_RECLAIM_DEL,
+                                          &r)
             self.ops.buffer_deinit(self.ctx)
 
-    def __cinit__(self, kind, devno):
+    def __cinit__(self, kind, devno, flags=0):
         cdef int err = GA_NO_ERROR
         cdef void *ctx
         self.ops = get_ops(kind)
-        self.ctx = self.ops.buffer_init(devno, 0, &err)
+        self.ctx = self.ops.buffer_init(devno, flags, &err)
         if (err != GA_NO_ERROR):
             if err == GA_VALUE_ERROR:
                 raise get_exc(err), "No device %d"%(devno,)
             else:
                 raise get_exc(err), self.ops.ctx_error(NULL)
+        ctx_init_reclaim(self)
 
     property kind:
         "Module name this context uses"
@@ -985,6 +1504,16 @@ cdef class GpuContext:
         def __get__(self):
             return <size_t>self.ctx
 
+    property kernel_cache:
+        """
+        Dict where pygpu keeps the kernels it generates for this
+        context, so that they go away with it.
+        """
+        def __get__(self):
+            if self._kernels is None:
+                self._kernels = {}
+            return self._kernels
+
     property devname:
         "Device name for this context"
         def __get__(self):
@@ -1001,30 +1530,30 @@ cdef class GpuContext:
     property maxlsize:
         "Maximum size of thread block (local size) for this context"
         def __get__(self):
-            cdef size_t res
-            ctx_property(self, GA_CTX_PROP_MAXLSIZE, &res)
-            return res
+            if self._maxlsize == 0:
+                ctx_property(self, GA_CTX_PROP_MAXLSIZE, &self._maxlsize)
+            return self._maxlsize
 
     property lmemsize:
         "Size of the local (shared) memory, in bytes, for this context"
         def __get__(self):
-            cdef size_t res
-            ctx_property(self, GA_CTX_PROP_LMEMSIZE, &res)
-            return res
+            if self._lmemsize == 0:
+                ctx_property(self, GA_CTX_PROP_LMEMSIZE, &self._lmemsize)
+            return self._lmemsize
 
     property numprocs:
         "Number of compute units for this context"
         def __get__(self):
-            cdef unsigned int res
-            ctx_property(self, GA_CTX_PROP_NUMPROCS, &res)
-            return res
+            if self._numprocs == 0:
+                ctx_property(self, GA_CTX_PROP_NUMPROCS, &self._numprocs)
+            return self._numprocs
 
     property maxgsize:
         "Maximum group size for kernel calls"
         def __get__(self):
-            cdef size_t res
-            ctx_property(self, GA_CTX_PROP_MAXGSIZE, &res)
-            return res
+            if self._maxgsize == 0:
+                ctx_property(self, GA_CTX_PROP_MAXGSIZE, &self._maxgsize)
+            return self._maxgsize
 
     property bin_id:
         "Binary compatibility id"
@@ -1033,6 +1562,281 @@ cdef class GpuContext:
             ctx_property(self, GA_CTX_PROP_BIN_ID, &res)
             return res;
 
+    property pool_limit:
+        """
+        Maximum number of bytes kept in the buffer cache (`None` for no
+        limit).  Lowering it releases cached buffers to fit.
+        """
+        def __get__(self):
+            cdef size_t res
+            ctx_property(self, GA_CTX_PROP_POOL_LIMIT, &res)
+            if res == <size_t>-1:
+                return None
+            return res
+
+        def __set__(self, val):
+            cdef size_t v
+            if val is None:
+                v = <size_t>-1
+            else:
+                v = val
+            ctx_set_property(self, GA_CTX_PROP_POOL_LIMIT, &v)
+
+    property memory_budget:
+        """
+        Maximum number of bytes of device memory the arrays of this
+        context should use (`None` for no budget).
+
+        When an allocation would go over the budget, the least
+        recently used arrays marked as :attr:`GpuArray.spillable` are
+        moved to host memory until it fits.  They are moved back when
+        used.  Only supported by CUDA.
+        """
+        def __get__(self):
+            cdef size_t res
+            ctx_property(self, GA_CTX_PROP_MEM_BUDGET, &res)
+            if res == <size_t>-1:
+                return None
+            return res
+
+        def __set__(self, val):
+            cdef size_t v
+            if val is None:
+                v = <size_t>-1
+            else:
+                v = val
+            ctx_set_property(self, GA_CTX_PROP_MEM_BUDGET, &v)
+
+    def empty_cache(self):
+        """
+        empty_cache()
+
+        Release all the buffers held in the cache of this context back
+        to the driver.
+        """
+        cdef size_t v = 0
+        ctx_set_property(self, GA_CTX_PROP_POOL_CACHED, &v)
+
+    def pool_stats(self, reset=False):
+        """
+        pool_stats(reset=False)
+
+        Return a dict with the state of the buffer cache: `cached`
+        (bytes currently held), `limit`, `hits` and `misses` (number of
+        allocations served from the cache or not).
+
+        If `reset` is True, the hit and miss counters are set back to 0
+        after being read.
+
+        The cache is only used for contexts created with the
+        `CTX_MEM_POOL` flag.
+        """
+        cdef size_t cached, hits, misses
+        cdef size_t zero = 0
+        ctx_property(self, GA_CTX_PROP_POOL_CACHED, &cached)
+        ctx_property(self, GA_CTX_PROP_POOL_HITS, &hits)
+        ctx_property(self, GA_CTX_PROP_POOL_MISSES, &misses)
+        res = dict(cached=cached, hits=hits, misses=misses,
+                   limit=self.pool_limit)
+        if reset:
+            ctx_set_property(self, GA_CTX_PROP_POOL_HITS, &zero)
+            ctx_set_property(self, GA_CTX_PROP_POOL_MISSES, &zero)
+        return res
+
+    def memory_stats(self, reset=False):
+        """
+        memory_stats(reset=False)
+
+        Return a dict with the memory accounting of this context:
+
+        * `live_bytes`: bytes held by the buffers currently alive
+        * `peak_bytes`: highest value of `live_bytes`
+        * `live_buffers`: number of buffers currently alive
+        * `allocs`, `frees`: number of buffers allocated and released
+        * `hist`: allocations by size, maps `2**i` to the number of
+          requests of a size in `[2**i, 2**(i+1))`
+        * `oom_retries`: number of allocations that were retried after
+          running the reclaim callbacks (see
+          :meth:`add_reclaim_callback`)
+        * `spilled_bytes`: bytes of the arrays currently moved to host
+          memory (see :attr:`memory_budget`)
+        * `spills`: number of times an array was moved to host memory
+
+        Buffers kept in the cache (see :meth:`pool_stats`) are not
+        counted as alive.
+
+        If `reset` is True, the counters are reset after being read
+        and the peak goes back to the current live size.
+        """
+        cdef gpuarray_mem_stats st
+        cdef size_t oom, spilled, spills
+        cdef size_t zero = 0
+        cdef unsigned int i
+        ctx_property(self, GA_CTX_PROP_MEM_STATS, &st)
+        hist = {}
+        for i in range(GA_MEM_HIST_BINS):
+            if st.hist[i] != 0:
+                hist[(<size_t>1) << i] = st.hist[i]
+        res = dict(live_bytes=st.live_bytes, peak_bytes=st.peak_bytes,
+                   live_buffers=st.live_buffers, allocs=st.allocs,
+                   frees=st.frees, hist=hist)
+        ctx_property(self, GA_CTX_PROP_OOM_RETRIES, &oom)
+        res['oom_retries'] = oom
+        ctx_property(self, GA_CTX_PROP_SPILLED, &spilled)
+        res['spilled_bytes'] = spilled
+        ctx_property(self, GA_CTX_PROP_SPILLS, &spills)
+        res['spills'] = spills
+        if reset:
+            ctx_set_property(self, GA_CTX_PROP_MEM_STATS, NULL)
+            ctx_set_property(self, GA_CTX_PROP_OOM_RETRIES, &zero)
+            ctx_set_property(self, GA_CTX_PROP_SPILLS, &zero)
+        return res
+
+    def add_reclaim_callback(self, fn):
+        """
+        add_reclaim_callback(fn)
+
+        Register `fn` to be called (without arguments) when an
+        allocation in this context fails for lack of memory.  It
+        should drop references to the arrays it can do without, like
+        caches.
+
+        On failure, the context first runs :func:`gc.collect`, then
+        the callbacks in the order they were added, gives back its own
+        cached memory and retries the allocation once before raising.
+        Exceptions raised by callbacks are printed and ignored.
+        """
+        self.reclaimers.append(fn)
+
+    def remove_reclaim_callback(self, fn):
+        """
+        remove_reclaim_callback(fn)
+
+        Unregister a callback added with :meth:`add_reclaim_callback`.
+        """
+        self.reclaimers.remove(fn)
+
+    property timing:
+        """
+        Whether the kernel launches on this context are timed on the
+        device.
+
+        The device time of each launch is then returned by
+        :meth:`GpuKernel.__call__` and added to
+        :data:`pygpu.timing.kernel_stats`.  Getting it waits for the
+        launch to finish, so this makes launches synchronous.  See
+        also :class:`pygpu.timing.Timer`.
+        """
+        def __get__(self):
+            return self.timed
+
+        def __set__(self, val):
+            cdef int v = bool(val)
+            ctx_set_property(self, GA_CTX_PROP_TIMING, &v)
+            self.timed = v
+
+    def call_stats(self, reset=False):
+        """
+        call_stats(reset=False)
+
+        Return a dict with the calls made on this context since the
+        last reset.  Only supported by the "null" context.
+
+        * `calls`: number of calls of each kind (`alloc`, `free`,
+          `move`, `read`, `write`, `memset`, `compile`, `launch`,
+          `sync`, `extcopy` and `transfer`)
+        * `bytes`: bytes allocated, copied or set by each kind of call
+        * `time`: total simulated time in seconds (see
+          :attr:`cost_model`)
+        * `log`: list of `(kind, bytes, items, time)` tuples, one per
+          call in order, up to the `log_max` of :attr:`cost_model`.
+          `items` is the number of work items of a launch.
+
+        If `reset` is True, the counters and the log are cleared after
+        being read.
+        """
+        cdef gpuarray_call_stats st
+        cdef size_t i
+        ctx_property(self, GA_CTX_PROP_CALL_STATS, &st)
+        calls = {}
+        nbytes = {}
+        for i in range(GA_CALL_KINDS):
+            calls[_call_kinds[i]] = st.calls[i]
+            nbytes[_call_kinds[i]] = st.bytes[i]
+        log = [(_call_kinds[st.log[i].kind], st.log[i].bytes,
+                st.log[i].items, st.log[i].time) for i in range(st.nlog)]
+        if reset:
+            ctx_set_property(self, GA_CTX_PROP_CALL_STATS, NULL)
+        return dict(calls=calls, bytes=nbytes, time=st.time, log=log)
+
+    property launch_tuner:
+        """
+        Tuner of the launch configuration of the kernels called with
+        `n` and no `ls` or `gs` on this context (None by default, to
+        use :meth:`GpuKernel.sched`).  See
+        :class:`pygpu.autotune.LaunchTuner`.
+
+        The tuner measures the launches with the device timer, so
+        setting one raises
+        :class:`~pygpu.gpuarray.UnsupportedException` if the context
+        can't time launches.
+        """
+        def __get__(self):
+            return self.tuner
+
+        def __set__(self, val):
+            cdef int v
+            if val is not None and not self.timed:
+                v = 1
+                ctx_set_property(self, GA_CTX_PROP_TIMING, &v)
+                v = 0
+                ctx_set_property(self, GA_CTX_PROP_TIMING, &v)
+            self.tuner = val
+
+    property cost_model:
+        """
+        Cost model of the "null" context as a dict.  Times are in
+        seconds and bandwidths in bytes per second (0 for infinite):
+
+        * `launch_latency`: time for a kernel launch
+        * `item_time`: time per work item of a launch
+        * `transfer_latency`: time for a copy between host and device
+        * `bandwidth`: bandwidth between host and device
+        * `device_bandwidth`: bandwidth of copies on the device
+        * `log_max`: maximum number of calls kept in the log
+        * `realtime`: if True, the calls wait for their simulated time
+
+        Setting it only changes the keys that are present.
+        """
+        def __get__(self):
+            cdef gpuarray_null_config c
+            ctx_property(self, GA_CTX_PROP_NULL_CONFIG, &c)
+            return dict(launch_latency=c.launch_latency,
+                        item_time=c.item_time,
+                        transfer_latency=c.transfer_latency,
+                        bandwidth=c.bandwidth,
+                        device_bandwidth=c.device_bandwidth,
+                        log_max=c.log_max, realtime=bool(c.realtime))
+
+        def __set__(self, val):
+            cdef gpuarray_null_config c
+            ctx_property(self, GA_CTX_PROP_NULL_CONFIG, &c)
+            for k in val:
+                if k not in ('launch_latency', 'item_time',
+                             'transfer_latency', 'bandwidth',
+                             'device_bandwidth', 'log_max', 'realtime'):
+                    raise KeyError, k
+            c.launch_latency = val.get('launch_latency', c.launch_latency)
+            c.item_time = val.get('item_time', c.item_time)
+            c.transfer_latency = val.get('transfer_latency',
+                                         c.transfer_latency)
+            c.bandwidth = val.get('bandwidth', c.bandwidth)
+            c.device_bandwidth = val.get('device_bandwidth',
+                                         c.device_bandwidth)
+            c.log_max = val.get('log_max', c.log_max)
+            c.realtime = bool(val.get('realtime', c.realtime))
+            ctx_set_property(self, GA_CTX_PROP_NULL_CONFIG, &c)
+
 cdef class flags(object):
     cdef int fl
 
@@ -1243,6 +2047,82 @@ cdef np.ndarray pygpu_as_ndarray(GpuArray a):
 
     return res
 
+cdef class GpuTransfer:
+    """
+    Pending copy between host and device memory.
+
+    Returned by :meth:`GpuArray.write_async` and
+    :meth:`GpuArray.read_async`.  It keeps the host array alive until
+    the copy is done and waits for the copy if it is dropped before.
+    It can be polled with :meth:`done`, waited on with :meth:`wait` or
+    :meth:`result` and awaited from a coroutine.
+    """
+    cdef GpuArray ary
+    cdef object host
+    cdef object res
+
+    def __cinit__(self, GpuArray ary, host, res):
+        self.ary = ary
+        self.host = host
+        self.res = res
+
+    def __dealloc__(self):
+        # The device may still be reading or writing the host buffer,
+        # which goes away with us.  Errors can't be raised from here.
+        if self.ary is not None:
+            GpuArray_sync(&self.ary.ga)
+
+    def done(self):
+        """
+        done()
+
+        Return True if the copy is finished, without blocking.
+        """
+        if self.ary is None:
+            return True
+        if array_done(self.ary):
+            self.ary = None
+            return True
+        return False
+
+    def wait(self):
+        """
+        wait()
+
+        Block until the copy is finished.
+        """
+        if self.ary is not None:
+            array_sync(self.ary)
+            self.ary = None
+
+    def result(self):
+        """
+        result()
+
+        Wait for the copy and return the destination (the numpy array
+        for reads, the GpuArray for writes).
+        """
+        self.wait()
+        return self.res
+
+    def __await__(self):
+        if self.done():
+            return self.res
+        import asyncio
+        # wait() holds the GIL so it can't be moved to a thread without
+        # stopping the loop too.  Poll with a growing delay instead.
+        loop = asyncio.get_event_loop()
+        delay = 0.0001
+        while not self.done():
+            fut = loop.create_future()
+            h = loop.call_later(delay, fut.set_result, None)
+            try:
+                yield from fut
+            finally:
+                h.cancel()
+            delay = min(delay * 2, 0.01)
+        return self.res
+
 cdef GpuArray pygpu_index(GpuArray a, const ssize_t *starts,
                           const ssize_t *stops, const ssize_t *steps):
     cdef GpuArray res
@@ -1417,6 +2297,73 @@ cdef class GpuArray:
         """
         return pygpu_as_ndarray(self)
 
+    def write_async(self, np.ndarray src not None):
+        """
+        write_async(src)
+
+        Start copying the content of `src` to this array and return a
+        :class:`GpuTransfer` without waiting for the copy to finish.
+
+        :param src: host data with the same shape and dtype as this array
+        :type src: numpy.ndarray
+        :rtype: GpuTransfer
+
+        This array must be contiguous.  Operations done on it later are
+        ordered after the copy.  Don't modify `src` until the transfer
+        is done.
+        """
+        if (<object>src).shape != self.shape or src.dtype != self.dtype:
+            raise ValueError, "source does not match destination"
+        if py_CHKFLAGS(self, GA_C_CONTIGUOUS):
+            src = numpy.require(src, requirements='C')
+        elif py_CHKFLAGS(self, GA_F_CONTIGUOUS):
+            src = numpy.require(src, requirements='F')
+        else:
+            raise ValueError, "destination is not contiguous"
+        array_write_async(self, np.PyArray_DATA(src), np.PyArray_NBYTES(src))
+        return GpuTransfer(self, src, self)
+
+    def read_async(self, np.ndarray out=None):
+        """
+        read_async(out=None)
+
+        Start copying the content of this array to host memory and
+        return a :class:`GpuTransfer` without waiting for the copy to
+        finish.
+
+        :param out: destination, must have the same shape and dtype as
+                    this array and be contiguous in the same order
+        :type out: numpy.ndarray
+        :rtype: GpuTransfer
+
+        The result of the transfer is the destination array, its
+        content is undefined until the transfer is done.  Using
+        pinned memory (see :func:`pinned_empty`) for `out` lets the copy
+        truly run in the background.
+        """
+        cdef GpuArray a = self
+        cdef bint f_order
+
+        if not py_ISONESEGMENT(a):
+            a = pygpu_copy(a, GA_ANY_ORDER)
+        f_order = (py_CHKFLAGS(a, GA_F_CONTIGUOUS) and
+                   not py_CHKFLAGS(a, GA_C_CONTIGUOUS))
+
+        if out is None:
+            out = PyArray_Empty(a.ga.nd, <np.npy_intp *>a.ga.dimensions,
+                                a.dtype, f_order)
+        else:
+            if (<object>out).shape != a.shape or out.dtype != a.dtype:
+                raise ValueError, "destination does not match source"
+            if not (out.flags['F_CONTIGUOUS'] if f_order
+                    else out.flags['C_CONTIGUOUS']):
+                raise ValueError, "destination is not contiguous"
+            if not out.flags['WRITEABLE']:
+                raise ValueError, "destination is not writeable"
+
+        array_read_async(np.PyArray_DATA(out), np.PyArray_NBYTES(out), a)
+        return GpuTransfer(a, out, out)
+
     def _empty_like_me(self, dtype=None, order='C'):
         """
         _empty_like_me(dtype=None, order='C')
@@ -1752,6 +2699,125 @@ cdef class GpuArray:
             # structure.
             return <size_t>((<void **>self.ga.data)[0])
 
+    property spillable:
+        """
+        Whether the data of this array can be moved to host memory to
+        respect the :attr:`GpuContext.memory_budget`.
+
+        This applies to the whole buffer, so it is shared with views
+        of the array.  The :attr:`gpudata` pointer of an array is not
+        valid while it is spilled.
+        """
+        def __get__(self):
+            cdef int res
+            cdef int err
+            err = self.ga.ops.property(NULL, self.ga.data, NULL,
+                                       GA_BUFFER_PROP_SPILLABLE, &res)
+            if err != GA_NO_ERROR:
+                raise get_exc(err), GpuArray_error(&self.ga, err)
+            return bool(res)
+
+        def __set__(self, bint val):
+            cdef int v = val
+            cdef int err
+            err = self.ga.ops.buffer_set_property(self.ga.data,
+                                                  GA_BUFFER_PROP_SPILLABLE,
+                                                  &v)
+            if err != GA_NO_ERROR:
+                raise get_exc(err), GpuArray_error(&self.ga, err)
+
+
+cdef int pack_buffer(void **slot, object o) except -1:
+    if not isinstance(o, GpuArray):
+        raise TypeError, "expected a GpuArray"
+    slot[0] = <void *>((<GpuArray>o).ga.data)
+    return 0
+
+cdef int pack_size(void **slot, object o) except -1:
+    (<size_t *>slot[0])[0] = o
+    return 0
+
+cdef int pack_float(void **slot, object o) except -1:
+    (<float *>slot[0])[0] = o
+    return 0
+
+cdef int pack_double(void **slot, object o) except -1:
+    (<double *>slot[0])[0] = o
+    return 0
+
+cdef int pack_byte(void **slot, object o) except -1:
+    (<signed char *>slot[0])[0] = o
+    return 0
+
+cdef int pack_ubyte(void **slot, object o) except -1:
+    (<unsigned char *>slot[0])[0] = o
+    return 0
+
+cdef int pack_short(void **slot, object o) except -1:
+    (<short *>slot[0])[0] = o
+    return 0
+
+cdef int pack_ushort(void **slot, object o) except -1:
+    (<unsigned short *>slot[0])[0] = o
+    return 0
+
+cdef int pack_int(void **slot, object o) except -1:
+    (<int *>slot[0])[0] = o
+    return 0
+
+cdef int pack_uint(void **slot, object o) except -1:
+    (<unsigned int *>slot[0])[0] = o
+    return 0
+
+cdef int pack_long(void **slot, object o) except -1:
+    (<long *>slot[0])[0] = o
+    return 0
+
+cdef int pack_ulong(void **slot, object o) except -1:
+    (<unsigned long *>slot[0])[0] = o
+    return 0
+
+cdef arg_packer get_packer(int typecode) except NULL:
+    if typecode == GA_BUFFER:
+        return pack_buffer
+    elif typecode == GA_SIZE:
+        return pack_size
+    elif typecode == GA_FLOAT:
+        return pack_float
+    elif typecode == GA_DOUBLE:
+        return pack_double
+    elif typecode == GA_BYTE:
+        return pack_byte
+    elif typecode == GA_UBYTE:
+        return pack_ubyte
+    elif typecode == GA_SHORT:
+        return pack_short
+    elif typecode == GA_USHORT:
+        return pack_ushort
+    elif typecode == GA_INT:
+        return pack_int
+    elif typecode == GA_UINT:
+        return pack_uint
+    elif typecode == GA_LONG:
+        return pack_long
+    elif typecode == GA_ULONG:
+        return pack_ulong
+    raise ValueError, "Unsupported kernel argument type: %d" % (typecode,)
+
+cdef unsigned int parse_dims(object o, size_t *d, str what) except 0:
+    cdef unsigned int nd
+    cdef unsigned int i
+    if isinstance(o, (int, long)):
+        d[0] = o
+        return 1
+    if not isinstance(o, (list, tuple)):
+        raise TypeError, "%s is not int or list" % (what,)
+    nd = len(o)
+    if nd == 0 or nd > 3:
+        raise ValueError, "%s is not of length 3 or less" % (what,)
+    for i in range(nd):
+        d[i] = o[i]
+    return nd
 
 cdef class GpuKernel:
     """
@@ -1778,6 +2844,8 @@ cdef class GpuKernel:
     :param ptx: kernel is PTX code?
     :param cuda: kernel is cuda code?
     :param opencl: kernel is opencl code?
+    :param grid_stride: the kernel loops over `n` by the total number
+                        of threads so it works with any `gs`?
 
     The kernel function is retrieved using the provided `name` which
     must match what you named your kernel in `source`.  You can safely
@@ -1821,15 +2889,33 @@ cdef class GpuKernel:
 
     If you choose to use this interface, make sure to stay within the
     limits of `k.maxlsize` and `ctx.maxgsize` or the call will fail.
+
+    Passing `timed=True` times the launch on the device and returns
+    its duration in seconds, after waiting for it to finish.  This is
+    also done for all launches on a context while its
+    :attr:`~GpuContext.timing` is on.
+
+    Calls with only `n` use the configuration picked by the
+    :attr:`~GpuContext.launch_tuner` of the context if it has one.
+    The tuner only tries a number of threads smaller than `n` for
+    kernels created with `grid_stride=True`.
     """
     def __dealloc__(self):
+        cdef unsigned int i
+        if self.callbuf != NULL and self._packers != NULL:
+            for i in range(self._numargs):
+                # Buffer slots hold the buffer itself
+                if self._packers[i] != pack_buffer:
+                    free(self.callbuf[i])
         free(self.callbuf)
+        free(self._packers)
         kernel_clear(self)
 
     def __cinit__(self, source, name, types, GpuContext context=None,
                   cluda=True, have_double=False, have_small=False,
                   have_complex=False, have_half=False, binary=False,
-                  ptx=False, cuda=False, opencl=False, *a, **kwa):
+                  ptx=False, cuda=False, opencl=False, grid_stride=False,
+                  *a, **kwa):
         cdef const char *s[1]
         cdef size_t l
         cdef unsigned int numargs
@@ -1844,6 +2930,8 @@ cdef class GpuKernel:
             raise TypeError, "Expected a string for the kernel name"
 
         self.context = ensure_context(context)
+        self.name = name
+        self.grid_stride = grid_stride
 
         if cluda:
             flags |= GA_USE_CLUDA
@@ -1867,9 +2955,19 @@ cdef class GpuKernel:
         s[0] = source
         l = len(source)
         numargs = <unsigned int>len(types)
-        self.callbuf = <void **>calloc(len(types), sizeof(void *))
+        # Identifies the kernel across runs for pygpu.autotune
+        h = hashlib.sha1(source if isinstance(source, bytes)
+                         else source.encode('utf-8'))
+        h.update(str(flags).encode('ascii'))
+        self.cachekey = "%s-%s" % (name, h.hexdigest()[:16])
+        self.callbuf = <void **>calloc(numargs, sizeof(void *))
         if self.callbuf == NULL:
             raise MemoryError
+        # Picked once here so that calls don't look at the types
+        self._packers = <arg_packer *>calloc(numargs, sizeof(arg_packer))
+        if self._packers == NULL:
+            raise MemoryError
+        self._numargs = numargs
         _types = <int *>calloc(numargs, sizeof(int))
         if _types == NULL:
             raise MemoryError
@@ -1879,28 +2977,65 @@ cdef class GpuKernel:
                     _types[i] = GA_BUFFER
                 else:
                     _types[i] = dtype_to_typecode(types[i])
-                self.callbuf[i] = malloc(gpuarray_get_elsize(_types[i]))
-                if self.callbuf[i] == NULL:
-                    raise MemoryError
+                self._packers[i] = get_packer(_types[i])
+                if _types[i] != GA_BUFFER:
+                    self.callbuf[i] = malloc(gpuarray_get_elsize(_types[i]))
+                    if self.callbuf[i] == NULL:
+                        raise MemoryError
             kernel_init(self, self.context.ops, self.context.ctx, 1, s, &l,
                         name, numargs, _types, flags)
         finally:
             free(_types)
 
-    def __call__(self, *args, n=None, ls=None, gs=None, shared=0):
+    def __call__(self, *args, n=None, ls=None, gs=None, shared=0,
+                 timed=False):
         if n == None and (ls == None or gs == None):
             raise ValueError, "Must specify size (n) or both gs and ls"
-        self.do_call(n, ls, gs, args, shared)
+        return self.do_call(n, ls, gs, args, shared, timed)
 
-    cdef do_call(self, py_n, py_ls, py_gs, py_args, size_t shared):
+    def launch_raw(self, tuple args, ls, gs, size_t shared=0):
+        """
+        launch_raw(args, ls, gs, shared=0)
+
+        Launch the kernel with the tuple of arguments `args` and the
+        exact local and global sizes `ls` and `gs` (ints or sequences
+        of up to 3 ints of the same length).
+
+        This skips the scheduling and the launch tuner of
+        :meth:`__call__` to keep the per-launch cost as low as
+        possible for code that launches the same kernel many times.
+        """
+        cdef size_t l[3]
+        cdef size_t g[3]
+        cdef unsigned int nd
+        if tracer is not None or self.context.timed:
+            return self.do_call(None, ls, gs, args, shared, False)
+        nd = parse_dims(ls, l, "ls")
+        if parse_dims(gs, g, "gs") != nd:
+            raise ValueError, "nd mismatch between ls and gs"
+        self._pack(args)
+        kernel_call(self, nd, l, g, shared, self.callbuf)
+
+    cdef int _pack(self, tuple args) except -1:
+        cdef unsigned int i
+        if len(args) != self._numargs:
+            raise TypeError, "Expected %d arguments, got %d," % (self._numargs, len(args))
+        for i in range(self._numargs):
+            self._packers[i](&self.callbuf[i], args[i])
+        return 0
+
+    cdef do_call(self, py_n, py_ls, py_gs, py_args, size_t shared,
+                 bint timed):
         cdef size_t n
         cdef size_t gs[3]
         cdef size_t ls[3]
         cdef size_t tmp
         cdef unsigned int nd;
-        cdef const int *types
-        cdef unsigned int numargs
-        cdef unsigned int i
+        cdef double t = 0
+        cdef double elapsed
+        cdef int on = 1
+        cdef int off = 0
+        cdef bint trial = False
 
         nd = 0
 
@@ -1935,9 +3070,9 @@ cdef class GpuKernel:
                     raise ValueError, "nd mismatch for gs (int)"
                 gs[0] = py_gs
             elif isinstance(py_gs, (list, tuple)):
-                if len(py_gs) < 3:
+                if len(py_gs) > 3:
                     raise ValueError, "gs is not of length 3 or less"
-                if len(py_ls) != nd:
+                if len(py_gs) != nd:
                     raise ValueError, "nd mismatch for gs (tuple)"
 
                 if nd >= 3:
@@ -1949,69 +3084,68 @@ cdef class GpuKernel:
             else:
                 raise TypeError, "gs is not int or list"
 
-        numargs = self.numargs
-        if len(py_args) != numargs:
-            raise TypeError, "Expected %d arguments, got %d," % (numargs, len(py_args))
-        kernel_property(self, GA_KERNEL_PROP_TYPES, &types)
-        for i in range(numargs):
-            self._setarg(i, types[i], py_args[i])
+        if type(py_args) is not tuple:
+            py_args = tuple(py_args)
+        self._pack(py_args)
         if py_n is not None:
             if nd != 1:
                 raise ValueError, "n is specified and nd != 1"
             n = py_n
+            if (self.context.tuner is not None and py_ls is None and
+                    py_gs is None):
+                cfg = self.context.tuner.config(self, n)
+                if cfg is not None:
+                    ls[0], gs[0], trial = cfg
             kernel_sched(self, n, &ls[0], &gs[0])
-        kernel_call(self, nd, ls, gs, shared, self.callbuf)
+        if tracer is not None:
+            t = tracer.start()
+        if (timed or trial) and not self.context.timed:
+            ctx_set_property(self.context, GA_CTX_PROP_TIMING, &on)
+            try:
+                kernel_call(self, nd, ls, gs, shared, self.callbuf)
+            finally:
+                ctx_set_property(self.context, GA_CTX_PROP_TIMING, &off)
+        else:
+            kernel_call(self, nd, ls, gs, shared, self.callbuf)
+        res = None
+        if timed or trial or self.context.timed:
+            kernel_property(self, GA_KERNEL_PROP_ELAPSED, &elapsed)
+            if trial:
+                self.context.tuner.report(self, n, cfg, elapsed)
+        if timed or self.context.timed:
+            res = elapsed
+            if timing_listener is not None:
+                timing_listener(self.context, self.name, elapsed)
+        if tracer is not None:
+            tracer.record('launch', self.name, t, py_args,
+                          dict(ls=[ls[i] for i in range(nd)],
+                               gs=[gs[i] for i in range(nd)],
+                               shared=shared, device_time=res))
+        return res
 
     cdef _setarg(self, unsigned int index, int typecode, object o):
-        if typecode == GA_BUFFER:
-            if not isinstance(o, GpuArray):
-                raise TypeError, "expected a GpuArray"
-            self.callbuf[index] = <void *>((<GpuArray>o).ga.data)
-        elif typecode == GA_SIZE:
-            (<size_t *>self.callbuf[index])[0] = o
-        elif typecode == GA_FLOAT:
-            (<float *>self.callbuf[index])[0] = o
-        elif typecode == GA_DOUBLE:
-            (<double *>self.callbuf[index])[0] = o
-        elif typecode == GA_BYTE:
-            (<signed char *>self.callbuf[index])[0] = o
-        elif typecode == GA_UBYTE:
-            (<unsigned char *>self.callbuf[index])[0] = o
-        elif typecode == GA_SHORT:
-            (<short *>self.callbuf[index])[0] = o
-        elif typecode == GA_USHORT:
-            (<unsigned short *>self.callbuf[index])[0] = o
-        elif typecode == GA_INT:
-            (<int *>self.callbuf[index])[0] = o
-        elif typecode == GA_UINT:
-            (<unsigned int *>self.callbuf[index])[0] = o
-        elif typecode == GA_LONG:
-            (<long *>self.callbuf[index])[0] = o
-        elif typecode == GA_ULONG:
-            (<unsigned long *>self.callbuf[index])[0] = o
-        else:
-            raise ValueError, "Bad typecode in _setarg (please report this, it is a bug)"
+        if index >= self._numargs:
+            raise IndexError, "argument index out of range"
+        # The slot layout is fixed by the type the kernel was built with
+        if get_packer(typecode) != self._packers[index]:
+            raise TypeError, "argument %d doesn't have type %d" % (index,
+                                                                   typecode)
+        self._packers[index](&self.callbuf[index], o)
 
     property maxlsize:
         "Maximum local size for this kernel"
         def __get__(self):
-            cdef size_t res
-            kernel_property(self, GA_KERNEL_PROP_MAXLSIZE, &res)
-            return res
+            return self.k.maxlsize
 
     property preflsize:
         "Preferred multiple for local size for this kernel"
         def __get__(self):
-            cdef size_t res
-            kernel_property(self, GA_KERNEL_PROP_PREFLSIZE, &res)
-            return res
+            return self.k.preflsize
 
     property numargs:
         "Number of arguments to kernel"
         def __get__(self):
-            cdef unsigned int res
-            kernel_property(self, GA_KERNEL_PROP_NUMARGS, &res)
-            return res
+            return self._numargs
 
     property _binary:
         "Kernel compiled binary for the associated context."
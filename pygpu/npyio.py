@@ -0,0 +1,90 @@
+import numpy
+
+from .gpuarray import GpuArrayException, empty, array, pinned_empty
+
+# 8 MB, big enough to hide the per-transfer overhead
+DEFAULT_CHUNK_SIZE = 8 << 20
+
+
+def _staging(nelem, dtype, context):
+    try:
+        return pinned_empty((nelem,), dtype=dtype, context=context)
+    except GpuArrayException:
+        # Not supported by the backend, transfers will just be slower
+        return numpy.empty((nelem,), dtype=dtype)
+
+
+def from_memmap(mm, context=None, cls=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    from_memmap(mm, context=None, cls=None, chunk_size=DEFAULT_CHUNK_SIZE)
+
+    Copy `mm` to a new GpuArray in chunks of at most `chunk_size`
+    bytes.
+
+    The chunks go through two alternating staging buffers so that
+    reading the next chunk from disk overlaps with the transfer of the
+    previous one.  Only the staging buffers are allocated on the host,
+    so the whole array is never loaded in memory at once.
+
+    :param mm: source data, usually a :class:`numpy.memmap`
+    :type mm: numpy.ndarray
+    :param context: context in which to create the array
+    :type context: GpuContext
+    :param cls: class of the returned array (must inherit from GpuArray)
+    :type cls: class
+    :param chunk_size: size of a staging buffer in bytes
+    :type chunk_size: int
+    :rtype: array
+    """
+    mm = numpy.asanyarray(mm)
+    if mm.flags.c_contiguous:
+        order = 'C'
+    elif mm.flags.f_contiguous:
+        order = 'F'
+    else:
+        # No cheap flat view to take chunks from
+        return array(mm, context=context, cls=cls)
+
+    res = empty((mm.size,), dtype=mm.dtype, context=context, cls=cls)
+    if mm.size != 0:
+        src = mm.reshape((mm.size,), order=order)
+        step = max(chunk_size // mm.dtype.itemsize, 1)
+        stages = [_staging(min(step, mm.size), mm.dtype, context)
+                  for _ in range(2)]
+        pending = [None, None]
+        for i, start in enumerate(range(0, mm.size, step)):
+            stop = min(start + step, mm.size)
+            k = i % 2
+            if pending[k] is not None:
+                pending[k].wait()
+            stage = stages[k][:stop - start]
+            stage[...] = src[start:stop]
+            pending[k] = res[start:stop].write_async(stage)
+        for p in pending:
+            if p is not None:
+                p.wait()
+    return res.reshape(mm.shape, order=order)
+
+
+def load_npy(path, context=None, cls=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    load_npy(path, context=None, cls=None, chunk_size=DEFAULT_CHUNK_SIZE)
+
+    Load a .npy file directly into a new GpuArray.
+
+    The file is mapped and streamed to the device with
+    :func:`from_memmap`, so host memory use is bounded by
+    `chunk_size` rather than by the size of the array.
+
+    :param path: name of the file
+    :type path: string
+    :param context: context in which to create the array
+    :type context: GpuContext
+    :param cls: class of the returned array (must inherit from GpuArray)
+    :type cls: class
+    :param chunk_size: size of a staging buffer in bytes
+    :type chunk_size: int
+    :rtype: array
+    """
+    mm = numpy.load(path, mmap_mode='r')
+    return from_memmap(mm, context=context, cls=cls, chunk_size=chunk_size)
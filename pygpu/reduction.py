@@ -1,8 +1,8 @@
 import math
 
-from mako.template import Template
+from compilation import Template
 
-from tools import ArrayArg, check_args, prod, lfu_cache
+from tools import ArrayArg, check_args, prod, owned_lfu_cache
 from elemwise import parse_c_args, massage_op
 
 import numpy
@@ -31,6 +31,10 @@ KERNEL void ${name}(const unsigned int n, ${out_arg.decltype()} out
 % endfor
 ) {
   LOCAL_MEM ${out_arg.ctype()} ldata[${local_size}];
+% if compensated:
+  LOCAL_MEM ${out_arg.ctype()} lcomp[${local_size}];
+  ${out_arg.ctype()} comp = 0, x, t, bp;
+% endif
   const unsigned int lid = LID_0;
   unsigned int i;
   GLOBAL_MEM char *tmp;
@@ -90,29 +94,323 @@ KERNEL void ${name}(const unsigned int n, ${out_arg.decltype()} out
     ${arg.decltype()} ${arg.name} = (${arg.decltype()})${arg.name}_p;
     % endif
 % endfor
+% if compensated:
+    x = ${map_expr};
+    t = acc + x;
+    bp = t - acc;
+    comp += (acc - (t - bp)) + (x - bp);
+    acc = t;
+% else:
     acc = REDUCE((acc), (${map_expr}));
+% endif
   }
   ldata[lid] = acc;
+% if compensated:
+  lcomp[lid] = comp;
+% endif
 
   <% cur_size = local_size %>
   % while cur_size > 1:
     <% cur_size = cur_size / 2 %>
     local_barrier();
     if (lid < ${cur_size}) {
+  % if compensated:
+      acc = ldata[lid];
+      x = ldata[lid+${cur_size}];
+      t = acc + x;
+      bp = t - acc;
+      lcomp[lid] += lcomp[lid+${cur_size}] + (acc - (t - bp)) + (x - bp);
+      ldata[lid] = t;
+  % else:
       ldata[lid] = REDUCE(ldata[lid], ldata[lid+${cur_size}]);
+  % endif
     }
   % endwhile
+% if compensated:
+  if (lid == 0) out[GID_0] = ldata[0] + lcomp[0];
+% else:
   if (lid == 0) out[GID_0] = ldata[0];
+% endif
+}
+""")
+
+
+moments_kernel = Template("""
+${preamble}
+
+KERNEL void ${name}(const unsigned int n, ${out_arg.decltype()} mean,
+                    ${out_arg.decltype()} var, const ${acc_t} ddof
+% for d in range(nd):
+                    , const unsigned int dim${d}
+% endfor
+% for arg in arguments:
+    % if arg.isarray():
+                    , ${arg.decltype()} ${arg.name}_data
+                    , const unsigned int ${arg.name}_offset
+        % for d in range(nd):
+                    , const int ${arg.name}_str_${d}
+        % endfor
+    % else:
+                    , ${arg.decltype()} ${arg.name}
+    % endif
+% endfor
+) {
+  LOCAL_MEM ${acc_t} lmean[${local_size}];
+  LOCAL_MEM ${acc_t} lm2[${local_size}];
+  LOCAL_MEM unsigned int lcount[${local_size}];
+  const unsigned int lid = LID_0;
+  unsigned int i;
+  GLOBAL_MEM char *tmp;
+
+% for arg in arguments:
+  % if arg.isarray():
+  tmp = (GLOBAL_MEM char *)${arg.name}_data; tmp += ${arg.name}_offset;
+  ${arg.name}_data = (${arg.decltype()})tmp;
+  % endif
+% endfor
+
+  i = GID_0;
+% for i in range(nd-1, -1, -1):
+  % if not redux[i]:
+    % if i > 0:
+  const unsigned int pos${i} = i % dim${i};
+  i = i / dim${i};
+    % else:
+  const unsigned int pos${i} = i;
+    % endif
+  % endif
+% endfor
+
+  unsigned int count = 0;
+  ${acc_t} m = 0;
+  ${acc_t} m2 = 0;
+
+  for (i = lid; i < n; i += LDIM_0) {
+    int ii = i;
+    int pos;
+    ${acc_t} x, delta;
+% for arg in arguments:
+    % if arg.isarray():
+        GLOBAL_MEM char *${arg.name}_p = (GLOBAL_MEM char *)${arg.name}_data;
+    % endif
+% endfor
+% for i in range(nd-1, -1, -1):
+    % if redux[i]:
+        % if i > 0:
+        pos = ii % dim${i};
+        ii = ii / dim${i};
+        % else:
+        pos = ii;
+        % endif
+        % for arg in arguments:
+            % if arg.isarray():
+        ${arg.name}_p += pos * ${arg.name}_str_${i};
+            % endif
+        % endfor
+    % else:
+        % for arg in arguments:
+            % if arg.isarray():
+        ${arg.name}_p += pos${i} * ${arg.name}_str_${i};
+            % endif
+        % endfor
+    % endif
+% endfor
+% for arg in arguments:
+    % if arg.isarray():
+    ${arg.decltype()} ${arg.name} = (${arg.decltype()})${arg.name}_p;
+    % endif
+% endfor
+    x = (${acc_t})(${map_expr});
+    count += 1;
+    delta = x - m;
+    m += delta / (${acc_t})count;
+    m2 += delta * (x - m);
+  }
+  lcount[lid] = count;
+  lmean[lid] = m;
+  lm2[lid] = m2;
+
+  <% cur_size = local_size %>
+  % while cur_size > 1:
+    <% cur_size = cur_size / 2 %>
+    local_barrier();
+    if (lid < ${cur_size} && lcount[lid+${cur_size}] != 0) {
+      const unsigned int na = lcount[lid];
+      const unsigned int nab = na + lcount[lid+${cur_size}];
+      const ${acc_t} delta = lmean[lid+${cur_size}] - lmean[lid];
+      const ${acc_t} fb = (${acc_t})lcount[lid+${cur_size}] / (${acc_t})nab;
+      lmean[lid] += delta * fb;
+      lm2[lid] += lm2[lid+${cur_size}] + delta * delta * (${acc_t})na * fb;
+      lcount[lid] = nab;
+    }
+  % endwhile
+  if (lid == 0) {
+    mean[GID_0] = lmean[0];
+% if std:
+    var[GID_0] = sqrt(lm2[0] / ((${acc_t})lcount[0] - ddof));
+% else:
+    var[GID_0] = lm2[0] / ((${acc_t})lcount[0] - ddof);
+% endif
+  }
+}
+""")
+
+
+# One work-group per segment, segments are [offsets[i], offsets[i+1])
+segment_kernel = Template("""
+${preamble}
+
+#define REDUCE(a, b) (${reduce_expr})
+
+KERNEL void ${name}(const unsigned int nseg,
+                    ${out_arg.decltype()} out_data,
+                    const unsigned int out_offset, const int out_str,
+                    ${offsets_arg.decltype()} offsets_data,
+                    const unsigned int offsets_offset,
+                    const int offsets_str,
+                    ${arg.decltype()} ${arg.name}_data,
+                    const unsigned int ${arg.name}_offset,
+                    const int ${arg.name}_str) {
+  LOCAL_MEM ${out_arg.ctype()} ldata[${local_size}];
+  const unsigned int lid = LID_0;
+  unsigned int seg, i, start, end;
+  ${out_arg.ctype()} acc;
+  GLOBAL_MEM char *out_p = (GLOBAL_MEM char *)out_data;
+  GLOBAL_MEM char *offsets_p = (GLOBAL_MEM char *)offsets_data;
+  GLOBAL_MEM char *${arg.name}_p = (GLOBAL_MEM char *)${arg.name}_data;
+  out_p += out_offset;
+  offsets_p += offsets_offset;
+  ${arg.name}_p += ${arg.name}_offset;
+
+  for (seg = GID_0; seg < nseg; seg += GDIM_0) {
+    start = *(${offsets_arg.decltype()})(offsets_p + (int)seg * offsets_str);
+    end = *(${offsets_arg.decltype()})(offsets_p + (int)(seg + 1) * offsets_str);
+    acc = ${neutral};
+    for (i = start + lid; i < end; i += LDIM_0) {
+      ${arg.decltype()} ${arg.name} = (${arg.decltype()})(${arg.name}_p + (int)i * ${arg.name}_str);
+      acc = REDUCE((acc), (${map_expr}));
+    }
+    ldata[lid] = acc;
+
+    <% cur_size = local_size %>
+    % while cur_size > 1:
+      <% cur_size = cur_size / 2 %>
+    local_barrier();
+    if (lid < ${cur_size}) {
+      ldata[lid] = REDUCE(ldata[lid], ldata[lid+${cur_size}]);
+    }
+    % endwhile
+    if (lid == 0)
+      *(${out_arg.decltype()})(out_p + (int)seg * out_str) = ldata[0];
+    local_barrier();
+  }
+}
+""")
+
+# Counts (or sums weights) into bins with atomics.  When the bins fit
+# in local memory each group accumulates privately and merges its bins
+# into out at the end.
+histogram_kernel = Template("""
+${preamble}
+
+#if defined(__CUDACC__) || defined(GA_HOST)
+#define ATOMIC_ADD_U(as, p, v) atomicAdd((p), (v))
+#define ATOMIC_ADD_F(as, p, v) atomicAdd((p), (v))
+#else
+#define ATOMIC_ADD_U(as, p, v) atomic_add((p), (v))
+#define ATOMIC_ADD_F(as, p, v) do { \\
+    union { unsigned int u; float f; } o_, n_; \\
+    do { \\
+      o_.f = *(p); n_.f = o_.f + (v); \\
+    } while (atomic_cmpxchg((volatile as unsigned int *)(p), \\
+                            o_.u, n_.u) != o_.u); \\
+  } while (0)
+#endif
+
+% if weights:
+#define ATOMIC_ADD ATOMIC_ADD_F
+% else:
+#define ATOMIC_ADD ATOMIC_ADD_U
+% endif
+
+KERNEL void ${name}(const unsigned int n,
+                    GLOBAL_MEM ${x_t} *x_data, const unsigned int x_offset,
+                    const int x_str,
+% if weights:
+                    GLOBAL_MEM ${w_t} *w_data, const unsigned int w_offset,
+                    const int w_str,
+% endif
+% if histogram:
+                    const ${range_t} lo, const ${range_t} hi,
+                    const ${range_t} scale,
+% endif
+                    const unsigned int nbins,
+                    GLOBAL_MEM ${cnt_t} *out) {
+% if local_bins:
+  LOCAL_MEM ${cnt_t} lbins[${local_bins}];
+% endif
+  GLOBAL_MEM char *x_p = (GLOBAL_MEM char *)x_data;
+% if weights:
+  GLOBAL_MEM char *w_p = (GLOBAL_MEM char *)w_data;
+% endif
+  unsigned int i;
+  long b;
+  x_p += x_offset;
+% if weights:
+  w_p += w_offset;
+% endif
+
+% if local_bins:
+  for (i = LID_0; i < nbins; i += LDIM_0)
+    lbins[i] = 0;
+  local_barrier();
+% endif
+
+  for (i = GID_0 * LDIM_0 + LID_0; i < n; i += LDIM_0 * GDIM_0) {
+    const ${x_t} x = *(GLOBAL_MEM ${x_t} *)(x_p + (int)i * x_str);
+% if histogram:
+    if (!(x >= lo && x <= hi)) continue;
+    b = (long)((x - lo) * scale);
+    if (b >= nbins) b = nbins - 1;
+% else:
+    b = (long)x;
+    if (b < 0 || b >= nbins) continue;
+% endif
+% if weights:
+    const ${cnt_t} v = (${cnt_t})*(GLOBAL_MEM ${w_t} *)(w_p + (int)i * w_str);
+% else:
+    const ${cnt_t} v = 1;
+% endif
+% if local_bins:
+    ATOMIC_ADD(LOCAL_MEM, &lbins[b], v);
+% else:
+    ATOMIC_ADD(GLOBAL_MEM, &out[b], v);
+% endif
+  }
+
+% if local_bins:
+  local_barrier();
+  for (i = LID_0; i < nbins; i += LDIM_0)
+    if (lbins[i] != 0)
+      ATOMIC_ADD(GLOBAL_MEM, &out[i], lbins[i]);
+% endif
 }
 """)
 
 
 class ReductionKernel(object):
     def __init__(self, context, dtype_out, neutral, reduce_expr, redux,
-                 map_expr=None, arguments=None, preamble="", init_nd=None):
+                 map_expr=None, arguments=None, preamble="", init_nd=None,
+                 accuracy=None):
         """
         :param init_nd: used to pre compile the reduction code for
             this value of nd and the self.init_local_size value.
+        :param accuracy: if 'compensated', carry a running error term
+            (Kahan/Neumaier two-sum) through the per-thread loop and
+            the local-memory tree.  This keeps float32 sums close to
+            float64 accuracy without upcasting, at the cost of twice
+            the local memory.  Only valid for sums (`reduce_expr` must
+            be ``a + b``).
 
         """
         self.context = context
@@ -131,6 +429,17 @@ class ReductionKernel(object):
             self.arguments = arguments
 
         self.reduce_expr = reduce_expr
+        if accuracy not in (None, 'compensated'):
+            raise ValueError("Unknown accuracy mode: %s" % (accuracy,))
+        self.compensated = accuracy == 'compensated'
+        if self.compensated:
+            if (reduce_expr is None or
+                    reduce_expr.replace(' ', '') != 'a+b'):
+                raise ValueError("Compensated accuracy is only available "
+                                 "for sums ('a + b')")
+            if self.out_arg.dtype.kind != 'f':
+                raise TypeError("Compensated accuracy needs a floating "
+                                "point output type")
         if map_expr is None:
             if len(self.arguments) != 1:
                 raise ValueError("Don't know what to do with more than one "
@@ -162,8 +471,10 @@ class ReductionKernel(object):
                           have_complex=have_complex)
         self.preamble = preamble
 
-        self.init_local_size = min(context.lmemsize //
-                                   self.out_arg.dtype.itemsize,
+        lmem_per_item = self.out_arg.dtype.itemsize
+        if self.compensated:
+            lmem_per_item *= 2
+        self.init_local_size = min(context.lmemsize // lmem_per_item,
                                    context.maxlsize)
 
         # this is to prep the cache
@@ -202,6 +513,7 @@ class ReductionKernel(object):
                                   local_size=ls,
                                   redux=self.redux,
                                   neutral=self.neutral,
+                                  compensated=self.compensated,
                                   map_expr=self.expression)
         spec = ['uint32', gpuarray.GpuArray]
         spec.extend('uint32' for _ in range(nd))
@@ -214,17 +526,23 @@ class ReductionKernel(object):
                                cluda=True, **self.flags)
         return k, src, spec
 
-    @lfu_cache()
+    @owned_lfu_cache(maxsize=100)
     def _get_basic_kernel(self, maxls, nd):
         return self._find_kernel_ls(self._gen_basic, maxls, nd)
 
-    def __call__(self, *args, **kwargs):
+    def _max_ls(self, n):
+        #Don't compile and cache for nothing for big size
+        if self.init_local_size < n:
+            return self.init_local_size
+        # _find_kernel_ls goes to the next power of 2 anyway, do it
+        # here so that all the sizes in between share a cache entry.
+        if n > 1:
+            return 2**int(math.ceil(math.log(n, 2)))
+        return n
+
+    def _prepare(self, args):
         _, nd, dims, strs, offsets, contig = check_args(args, collapse=False,
                                                         broadcast=False)
-        out = kwargs.pop('out', None)
-        if len(kwargs) != 0:
-            raise TypeError('Unexpected keyword argument: %s' %
-                            kwargs.keys()[0])
         n = prod(dims)
         out_shape = tuple(d for i, d in enumerate(dims) if not self.redux[i])
         gs = prod(out_shape)
@@ -235,36 +553,202 @@ class ReductionKernel(object):
             raise ValueError("Array to big to be reduced along the "
                              "selected axes")
 
+        k, _, _, ls = self._get_basic_kernel(self._max_ls(n), nd)
+
+        kargs = list(dims)
+        for i, arg in enumerate(args):
+            kargs.append(arg)
+            if isinstance(arg, gpuarray.GpuArray):
+                kargs.append(offsets[i])
+                kargs.extend(strs[i])
+
+        return k, n, ls, gs, out_shape, kargs
 
+    def _check_out(self, out, out_shape, dtype):
         if out is None:
             out = gpuarray.empty(out_shape, context=self.context,
-                                 dtype=self.dtype_out)
+                                 dtype=dtype)
         else:
-            if out.shape != out_shape or out.dtype != self.dtype_out:
+            if out.shape != out_shape or out.dtype != dtype:
                 raise TypeError("Out array is not of expected type "
                                 "(expected %s %s, got %s %s)" % (
-                        out_shape, self.dtype_out, out.shape, out.dtype))
-        #Don't compile and cache for nothing for big size
-        if self.init_local_size < n:
-            k, _, _, ls = self._get_basic_kernel(self.init_local_size, nd)
-        else:
-            k, _, _, ls = self._get_basic_kernel(n, nd)
+                        out_shape, dtype, out.shape, out.dtype))
+        return out
 
-        kargs = [n, out]
-        kargs.extend(dims)
-        for i, arg in enumerate(args):
-            kargs.append(arg)
-            if isinstance(arg, gpuarray.GpuArray):
-                kargs.append(offsets[i])
-                kargs.extend(strs[i])
+    def __call__(self, *args, **kwargs):
+        out = kwargs.pop('out', None)
+        if len(kwargs) != 0:
+            raise TypeError('Unexpected keyword argument: %s' %
+                            kwargs.keys()[0])
+
+        k, n, ls, gs, out_shape, kargs = self._prepare(args)
+        out = self._check_out(out, out_shape, self.dtype_out)
 
-        k(*kargs, ls=ls, gs=gs)
+        k(n, out, *kargs, ls=ls, gs=gs)
 
         return out
 
 
-def reduce1(ary, op, neutral, out_type, axis=None, out=None, oper=None):
-    nd = ary.ndim
+class MomentsKernel(ReductionKernel):
+    """
+    Single-pass mean and variance along the axes selected by `redux`.
+
+    Each work-item accumulates a (count, mean, M2) triple with
+    Welford's update and the triples are merged in local memory with
+    Chan's parallel formula, so both statistics come out of one launch
+    without a temporary for the centered data.
+
+    :param std: write the standard deviation instead of the variance.
+
+    The other parameters have the same meaning as for
+    :class:`ReductionKernel`.  `dtype_out` is also the accumulation
+    type and must be a floating point type.
+    """
+    def __init__(self, context, dtype_out, redux, map_expr=None,
+                 arguments=None, preamble="", std=False, init_nd=None):
+        dtype_out = numpy.dtype(dtype_out)
+        if dtype_out.kind != 'f':
+            raise TypeError("MomentsKernel needs a floating point output "
+                            "type, got %s" % (dtype_out,))
+        ReductionKernel.__init__(self, context, dtype_out, "0", None,
+                                 redux, map_expr=map_expr,
+                                 arguments=arguments, preamble=preamble)
+        self.std = std
+        if dtype_out == numpy.float64:
+            self.flags['have_double'] = True
+
+        self.init_local_size = min(context.lmemsize //
+                                   (2 * dtype_out.itemsize + 4),
+                                   context.maxlsize)
+
+        if init_nd is not None:
+            self._get_basic_kernel(self.init_local_size, init_nd)
+
+    def _gen_basic(self, ls, nd):
+        src = moments_kernel.render(preamble=self.preamble,
+                                    name="momentk",
+                                    out_arg=self.out_arg,
+                                    acc_t=self.out_arg.ctype(),
+                                    nd=nd, arguments=self.arguments,
+                                    local_size=ls,
+                                    redux=self.redux,
+                                    std=self.std,
+                                    map_expr=self.expression)
+        spec = ['uint32', gpuarray.GpuArray, gpuarray.GpuArray,
+                self.out_arg.dtype]
+        spec.extend('uint32' for _ in range(nd))
+        for i, arg in enumerate(self.arguments):
+            spec.append(arg.spec())
+            if arg.isarray():
+                spec.append('uint32')
+                spec.extend('int32' for _ in range(nd))
+        k = gpuarray.GpuKernel(src, "momentk", spec, context=self.context,
+                               cluda=True, **self.flags)
+        return k, src, spec
+
+    def __call__(self, *args, **kwargs):
+        """
+        Returns a (mean, var) pair, or (mean, std) if the kernel was
+        built with `std=True`.
+
+        :param ddof: delta degrees of freedom, the divisor used is
+            ``N - ddof`` (default 0).
+        :param out: optional (mean, var) pair of output arrays.
+        """
+        ddof = kwargs.pop('ddof', 0)
+        out = kwargs.pop('out', None)
+        if len(kwargs) != 0:
+            raise TypeError('Unexpected keyword argument: %s' %
+                            kwargs.keys()[0])
+        if out is None:
+            out = (None, None)
+
+        k, n, ls, gs, out_shape, kargs = self._prepare(args)
+        mean = self._check_out(out[0], out_shape, self.dtype_out)
+        var = self._check_out(out[1], out_shape, self.dtype_out)
+
+        k(n, mean, var, ddof, *kargs, ls=ls, gs=gs)
+
+        return mean, var
+
+
+class SegmentReductionKernel(ReductionKernel):
+    """
+    Reduction over the variable-length segments of a 1-d array.
+
+    Segment i covers ``values[offsets[i]:offsets[i+1]]`` (CSR-style
+    offsets, so there are ``len(offsets) - 1`` segments).  Empty
+    segments produce `neutral`.  The offsets must be non-decreasing and
+    between 0 and ``len(values)``, which is checked on the host.
+
+    :param dtype_in: type of the values
+    :param dtype_offsets: integer type of the offsets
+
+    The other parameters have the same meaning as for
+    :class:`ReductionKernel`.
+    """
+    def __init__(self, context, dtype_out, neutral, reduce_expr, dtype_in,
+                 dtype_offsets='uint32', preamble=""):
+        self.offsets_arg = ArrayArg(numpy.dtype(dtype_offsets), 'offsets')
+        if self.offsets_arg.dtype.kind not in 'iu':
+            raise TypeError("offsets must be of an integer type")
+        ReductionKernel.__init__(self, context, dtype_out, neutral,
+                                 reduce_expr, [True],
+                                 arguments=[ArrayArg(numpy.dtype(dtype_in),
+                                                     'a')],
+                                 preamble=preamble)
+
+    def _gen_basic(self, ls, nd):
+        src = segment_kernel.render(preamble=self.preamble,
+                                    reduce_expr=self.reduce_expr,
+                                    name="segred",
+                                    out_arg=self.out_arg,
+                                    offsets_arg=self.offsets_arg,
+                                    arg=self.arguments[0],
+                                    local_size=ls,
+                                    neutral=self.neutral,
+                                    map_expr=self.expression)
+        spec = ['uint32', gpuarray.GpuArray, 'uint32', 'int32',
+                gpuarray.GpuArray, 'uint32', 'int32',
+                gpuarray.GpuArray, 'uint32', 'int32']
+        k = gpuarray.GpuKernel(src, "segred", spec, context=self.context,
+                               cluda=True, **self.flags)
+        return k, src, spec
+
+    def __call__(self, values, offsets, out=None):
+        if values.ndim != 1 or offsets.ndim != 1:
+            raise ValueError("values and offsets must be 1-d arrays")
+        if len(offsets) == 0:
+            raise ValueError("offsets must have at least one element")
+        if (values.dtype != self.arguments[0].dtype or
+                offsets.dtype != self.offsets_arg.dtype):
+            raise TypeError("Arguments do not match the kernel types "
+                            "(expected %s and %s, got %s and %s)" % (
+                    self.arguments[0].dtype, self.offsets_arg.dtype,
+                    values.dtype, offsets.dtype))
+        offs = numpy.asarray(offsets)
+        if (offs[0] < 0 or offs[-1] > len(values) or
+                (offs[1:] < offs[:-1]).any()):
+            raise ValueError("offsets must be non-decreasing and within "
+                             "the values")
+        nseg = len(offsets) - 1
+        out = self._check_out(out, (nseg,), self.dtype_out)
+        if nseg == 0:
+            return out
+
+        # size the groups for the average segment length
+        k, _, _, ls = self._get_basic_kernel(
+            self._max_ls(len(values) // nseg), 1)
+        gs = min(nseg, self.context.maxgsize)
+
+        k(nseg, out, out.offset, out.strides[0],
+          offsets, offsets.offset, offsets.strides[0],
+          values, values.offset, values.strides[0], ls=ls, gs=gs)
+
+        return out
+
+
+def _get_redux(nd, axis):
     if axis is None:
         redux = [True] * nd
     else:
@@ -279,13 +763,291 @@ def reduce1(ary, op, neutral, out_type, axis=None, out=None, oper=None):
             if ax < 0 or ax >= nd:
                 raise ValueError('axis out of bounds')
             redux[ax] = True
+    return redux
+
+
+@owned_lfu_cache()
+def _get_reduction_kernel(context, dtype_out, neutral, reduce_expr, redux,
+                          dtype_in, accuracy):
+    # redux also fixes nd, so a hit here only costs a launch
+    return ReductionKernel(context, dtype_out=dtype_out, neutral=neutral,
+                           reduce_expr=reduce_expr, redux=redux,
+                           arguments=[ArrayArg(dtype_in, 'a')],
+                           accuracy=accuracy)
+
+
+@owned_lfu_cache()
+def _get_moments_kernel(context, dtype_out, redux, dtype_in, std):
+    return MomentsKernel(context, dtype_out=dtype_out, redux=redux,
+                         arguments=[ArrayArg(dtype_in, 'a')], std=std)
+
+
+def reduce1(ary, op, neutral, out_type, axis=None, out=None, oper=None,
+            accuracy=None):
+    redux = _get_redux(ary.ndim, axis)
 
     if oper is None:
         reduce_expr = "a %s b" % (op,)
     else:
         reduce_expr = oper
 
-    r = ReductionKernel(ary.context, dtype_out=out_type, neutral=neutral,
-                        reduce_expr=reduce_expr, redux=redux,
-                        arguments=[ArrayArg(ary.dtype, 'a')])
+    r = _get_reduction_kernel(ary.context, numpy.dtype(out_type), neutral,
+                              reduce_expr, tuple(redux), ary.dtype,
+                              accuracy)
+    return r(ary, out=out)
+
+
+@owned_lfu_cache()
+def _has_double(context):
+    try:
+        gpuarray.GpuKernel("KERNEL void k(GLOBAL_MEM ga_double *a) {}", "k",
+                           [gpuarray.GpuArray], context=context,
+                           cluda=True, have_double=True)
+    except gpuarray.UnsupportedException:
+        return False
+    return True
+
+
+def moments(ary, axis=None, ddof=0, out_type=None, std=False, out=None):
+    """
+    Compute the mean and the variance (or standard deviation if `std`
+    is True) of `ary` along `axis` in a single pass.
+
+    `out_type` defaults to float64 for float64 inputs and, like numpy,
+    for integer and boolean inputs if the device supports doubles.  It
+    is float32 otherwise.  Returns a (mean, var) pair of arrays.
+    """
+    if ary.ndim == 0:
+        ary = ary.reshape((1,))
+    redux = _get_redux(ary.ndim, axis)
+
+    if out_type is None:
+        if ary.dtype == numpy.float64:
+            out_type = numpy.float64
+        elif ary.dtype.kind in 'iub' and _has_double(ary.context):
+            out_type = numpy.float64
+        else:
+            out_type = numpy.float32
+
+    r = _get_moments_kernel(ary.context, numpy.dtype(out_type),
+                            tuple(redux), ary.dtype, std)
+    return r(ary, ddof=ddof, out=out)
+
+
+def _limit(dtype, lowest):
+    # C literal for the lowest (or highest) value of dtype
+    if dtype.kind == 'f':
+        info = numpy.finfo(dtype)
+    elif dtype.kind == 'b':
+        return '0' if lowest else '1'
+    else:
+        info = numpy.iinfo(dtype)
+    if lowest:
+        val = info.min
+    else:
+        val = info.max
+    if dtype.kind == 'f':
+        return repr(val)
+    val = int(val)
+    if dtype.itemsize < 8:
+        return str(val)
+    if dtype.kind == 'u':
+        return "%dULL" % (val,)
+    if val < 0:
+        # the literal for the lowest int64 would overflow before the minus
+        return "(%dLL - 1)" % (val + 1,)
+    return "%dLL" % (val,)
+
+
+def _reduce_op(op, neutral, dtype, oper):
+    if oper is not None:
+        if neutral is None:
+            raise ValueError("neutral is required with oper")
+        return oper, neutral
+    op = _op_names.get(op, op)
+    if op == 'max':
+        return "a > b ? a : b", _limit(dtype, True)
+    if op == 'min':
+        return "a < b ? a : b", _limit(dtype, False)
+    if neutral is None:
+        neutral = {'+': '0', '*': '1', '&&': '1', '||': '0'}.get(op)
+        if neutral is None:
+            raise ValueError("No default neutral for %s" % (op,))
+    return "a %s b" % (op,), neutral
+
+
+_op_names = {'sum': '+', 'prod': '*', 'all': '&&', 'any': '||'}
+
+
+@owned_lfu_cache()
+def _get_segment_kernel(context, dtype_out, neutral, reduce_expr,
+                        dtype_in, dtype_offsets):
+    return SegmentReductionKernel(context, dtype_out, neutral, reduce_expr,
+                                  dtype_in, dtype_offsets)
+
+
+def segment_reduce(values, offsets, op, neutral=None, out_type=None,
+                   out=None, oper=None):
+    """
+    Reduce each segment ``values[offsets[i]:offsets[i+1]]`` with `op`.
+
+    `op` is a C binary operator like for `reduce1` or one of 'max' and
+    'min'.  `neutral` has a default for '+', '*', '&&', '||', 'max'
+    and 'min'.  `oper` can give an arbitrary reduction expression in
+    terms of `a` and `b` instead (`neutral` is then required).
+    """
+    if out_type is None:
+        out_type = values.dtype
+    out_type = numpy.dtype(out_type)
+    reduce_expr, neutral = _reduce_op(op, neutral, out_type, oper)
+    k = _get_segment_kernel(values.context, out_type, neutral, reduce_expr,
+                            values.dtype, offsets.dtype)
+    return k(values, offsets, out=out)
+
+
+@owned_lfu_cache()
+def _get_histogram_kernel(context, x_dtype, w_dtype, histogram, local_bins):
+    x_arg = ArrayArg(x_dtype, 'x')
+    spec = ['uint32', gpuarray.GpuArray, 'uint32', 'int32']
+    flags = dict(have_small=x_dtype.itemsize < 4,
+                 have_double=x_dtype == numpy.float64)
+    if w_dtype is not None:
+        w_arg = ArrayArg(w_dtype, 'w')
+        spec.extend([gpuarray.GpuArray, 'uint32', 'int32'])
+        flags['have_small'] |= w_dtype.itemsize < 4
+        flags['have_double'] |= w_dtype == numpy.float64
+        cnt_t = 'ga_float'
+    else:
+        w_arg = None
+        cnt_t = 'ga_uint'
+    if x_dtype == numpy.float64:
+        range_dtype = numpy.dtype('float64')
+    else:
+        range_dtype = numpy.dtype('float32')
+    if histogram:
+        spec.extend([range_dtype] * 3)
+    spec.extend(['uint32', gpuarray.GpuArray])
+    src = histogram_kernel.render(preamble="", name="histk",
+                                  x_t=x_arg.ctype(),
+                                  w_t=w_arg and w_arg.ctype(),
+                                  weights=w_arg is not None,
+                                  histogram=histogram,
+                                  range_t=ArrayArg(range_dtype, 'r').ctype(),
+                                  cnt_t=cnt_t, local_bins=local_bins)
+    return gpuarray.GpuKernel(src, "histk", spec, context=context,
+                              cluda=True, **flags), range_dtype
+
+
+def _bin(x, nbins, weights, lo_hi):
+    if weights is not None:
+        if weights.shape != x.shape:
+            raise ValueError("weights should have the same shape as x")
+        out = gpuarray.zeros((nbins,), dtype='float32', context=x.context)
+    else:
+        out = gpuarray.zeros((nbins,), dtype='uint32', context=x.context)
+    if x.size == 0 or nbins == 0:
+        return out
+
+    # privatize the bins in local memory when they fit
+    local_bins = 16
+    while local_bins < nbins:
+        local_bins *= 2
+    if local_bins * out.itemsize > x.context.lmemsize:
+        local_bins = 0
+
+    k, range_dtype = _get_histogram_kernel(
+        x.context, x.dtype, weights.dtype if weights is not None else None,
+        lo_hi is not None, local_bins)
+    kargs = [x.size, x, x.offset, x.strides[0]]
+    if weights is not None:
+        kargs.extend([weights, weights.offset, weights.strides[0]])
+    if lo_hi is not None:
+        lo, hi = lo_hi
+        kargs.extend([range_dtype.type(lo), range_dtype.type(hi),
+                      range_dtype.type(nbins / float(hi - lo))])
+    kargs.extend([nbins, out])
+    k(*kargs, n=x.size)
+    return out
+
+
+def bincount(x, weights=None, minlength=0):
+    """
+    Count the occurences of each value in the 1-d integer array `x`,
+    like :func:`numpy.bincount`.
+
+    Negative values are ignored.  The result is a uint32 array, or a
+    float32 array holding the sum of `weights` per bin if given.
+    """
+    if x.ndim != 1:
+        raise ValueError("x must be a 1-d array")
+    if x.dtype.kind not in 'iu':
+        raise TypeError("x must be of an integer type")
+    nbins = minlength
+    if x.size != 0:
+        mx = reduce1(x, '', _limit(x.dtype, True), x.dtype,
+                     oper="a > b ? a : b")
+        nbins = max(nbins, int(numpy.asarray(mx)) + 1)
+    return _bin(x, nbins, weights, None)
+
+
+def histogram(a, bins=10, range=None, weights=None):
+    """
+    Compute the histogram of `a` with `bins` equal-width bins over
+    `range` (the min and max of `a` by default), like
+    :func:`numpy.histogram`.
+
+    Returns the counts on the device (uint32, or float32 sums of
+    `weights`) and the bin edges as a numpy array.
+    """
+    if not isinstance(bins, (int, long)):
+        raise TypeError("Only a number of bins is supported")
+    if a.ndim != 1:
+        a = a.reshape((a.size,))
+    if weights is not None and weights.ndim != 1:
+        weights = weights.reshape((weights.size,))
+    if range is None:
+        if a.size == 0:
+            lo, hi = 0.0, 1.0
+        else:
+            lo = float(numpy.asarray(reduce1(a, '', _limit(a.dtype, False),
+                                             a.dtype,
+                                             oper="a < b ? a : b")))
+            hi = float(numpy.asarray(reduce1(a, '', _limit(a.dtype, True),
+                                             a.dtype,
+                                             oper="a > b ? a : b")))
+    else:
+        lo, hi = float(range[0]), float(range[1])
+        if lo > hi:
+            raise ValueError("max must be larger than min in range")
+    if lo == hi:
+        lo -= 0.5
+        hi += 0.5
+    return (_bin(a, bins, weights, (lo, hi)),
+            numpy.linspace(lo, hi, bins + 1))
+
+
+def reduce(ary, op, axis=None, dtype=None, out=None):
+    """
+    Reduce `ary` along `axis` (all axes if None) with `op`.
+
+    `op` is one of 'sum', 'prod', 'max', 'min', 'all', 'any' or a C
+    binary operator with a known neutral ('+', '*', '&&', '||').  The
+    result has type `dtype`, which defaults to the type of `ary` (bool
+    for 'all' and 'any').
+
+    The kernels are cached on the context, types, operation and axes,
+    so repeated reductions of the same kind only cost a launch.
+    """
+    if dtype is None:
+        if _op_names.get(op, op) in ('&&', '||'):
+            dtype = 'bool'
+        else:
+            dtype = ary.dtype
+    dtype = numpy.dtype(dtype)
+    reduce_expr, neutral = _reduce_op(op, None, dtype, None)
+    if ary.ndim == 0:
+        ary = ary.reshape((1,))
+    redux = _get_redux(ary.ndim, axis)
+    r = _get_reduction_kernel(ary.context, dtype, neutral, reduce_expr,
+                              tuple(redux), ary.dtype, None)
     return r(ary, out=out)
@@ -0,0 +1,367 @@
+import math
+
+from compilation import Template
+
+from tools import ArrayArg, prod, owned_lfu_cache
+
+import numpy
+import gpuarray
+
+__all__ = ['ScanKernel', 'scan', 'cumsum', 'cumprod']
+
+# Work-efficient (Blelloch) scan of one tile of 2*local_size elements
+# along the last dimension.  Each group handles one tile of one row
+# and, if there is more than one tile per row, writes the tile total
+# to sums[GID_0] so that the tiles can be combined afterwards.
+#
+# parameters: preamble, name, nd, in_t, out_t, scan_expr, neutral,
+#             local_size, exclusive
+block_kernel = Template("""
+${preamble}
+
+#define SCAN(a, b) (${scan_expr})
+
+KERNEL void ${name}(const unsigned int n, const unsigned int nblocks,
+                    GLOBAL_MEM ${in_t} *in_data,
+                    const unsigned int in_offset
+% for d in range(nd):
+                    , const int in_str_${d}
+% endfor
+                    , GLOBAL_MEM ${out_t} *out_data
+                    , const unsigned int out_offset
+% for d in range(nd):
+                    , const int out_str_${d}
+% endfor
+% for d in range(nd-1):
+                    , const unsigned int dim${d}
+% endfor
+                    , GLOBAL_MEM ${out_t} *sums
+) {
+  LOCAL_MEM ${out_t} ldata[${2*local_size}];
+  const unsigned int lid = LID_0;
+  const unsigned int start = (GID_0 % nblocks) * ${2*local_size};
+  unsigned int r = GID_0 / nblocks;
+  unsigned int pos;
+  unsigned int ai, bi;
+  ${out_t} x0, x1, t;
+  GLOBAL_MEM char *in_p = (GLOBAL_MEM char *)in_data;
+  GLOBAL_MEM char *out_p = (GLOBAL_MEM char *)out_data;
+  in_p += in_offset;
+  out_p += out_offset;
+
+% for d in range(nd-2, -1, -1):
+  pos = r % dim${d};
+  r = r / dim${d};
+  in_p += pos * in_str_${d};
+  out_p += pos * out_str_${d};
+% endfor
+
+  x0 = ${neutral};
+  x1 = ${neutral};
+  if (start + lid < n)
+    x0 = (${out_t})*(GLOBAL_MEM ${in_t} *)(in_p + (int)(start + lid) * in_str_${nd-1});
+  if (start + lid + ${local_size} < n)
+    x1 = (${out_t})*(GLOBAL_MEM ${in_t} *)(in_p + (int)(start + lid + ${local_size}) * in_str_${nd-1});
+  ldata[lid] = x0;
+  ldata[lid + ${local_size}] = x1;
+
+  <% offset = 1; d = local_size %>
+  % while d > 0:
+  local_barrier();
+  if (lid < ${d}) {
+    ai = ${offset} * (2 * lid + 1) - 1;
+    bi = ${offset} * (2 * lid + 2) - 1;
+    ldata[bi] = SCAN(ldata[ai], ldata[bi]);
+  }
+    <% offset = offset * 2; d = d // 2 %>
+  % endwhile
+
+  local_barrier();
+  if (lid == 0) {
+    if (nblocks > 1)
+      sums[GID_0] = ldata[${2*local_size - 1}];
+    ldata[${2*local_size - 1}] = ${neutral};
+  }
+
+  <% d = 1 %>
+  % while d < 2*local_size:
+    <% offset = offset // 2 %>
+  local_barrier();
+  if (lid < ${d}) {
+    ai = ${offset} * (2 * lid + 1) - 1;
+    bi = ${offset} * (2 * lid + 2) - 1;
+    t = ldata[ai];
+    ldata[ai] = ldata[bi];
+    ldata[bi] = SCAN(ldata[bi], t);
+  }
+    <% d = d * 2 %>
+  % endwhile
+  local_barrier();
+
+% if exclusive:
+  x0 = ldata[lid];
+  x1 = ldata[lid + ${local_size}];
+% else:
+  x0 = SCAN(ldata[lid], x0);
+  x1 = SCAN(ldata[lid + ${local_size}], x1);
+% endif
+  if (start + lid < n)
+    *(GLOBAL_MEM ${out_t} *)(out_p + (int)(start + lid) * out_str_${nd-1}) = x0;
+  if (start + lid + ${local_size} < n)
+    *(GLOBAL_MEM ${out_t} *)(out_p + (int)(start + lid + ${local_size}) * out_str_${nd-1}) = x1;
+}
+""")
+
+# Combines the scanned tile totals (sums) with the tiles of each row.
+#
+# parameters: preamble, name, nd, out_t, scan_expr, tile
+add_kernel = Template("""
+${preamble}
+
+#define SCAN(a, b) (${scan_expr})
+
+KERNEL void ${name}(const unsigned int n, const unsigned int nblocks,
+                    GLOBAL_MEM ${out_t} *out_data,
+                    const unsigned int out_offset
+% for d in range(nd):
+                    , const int out_str_${d}
+% endfor
+% for d in range(nd-1):
+                    , const unsigned int dim${d}
+% endfor
+                    , GLOBAL_MEM ${out_t} *sums
+) {
+  const unsigned int start = (GID_0 % nblocks) * ${tile};
+  unsigned int r = GID_0 / nblocks;
+  unsigned int pos;
+  unsigned int i;
+  ${out_t} prefix;
+  GLOBAL_MEM ${out_t} *p;
+  GLOBAL_MEM char *out_p = (GLOBAL_MEM char *)out_data;
+  out_p += out_offset;
+
+  if (start == 0) return;
+
+% for d in range(nd-2, -1, -1):
+  pos = r % dim${d};
+  r = r / dim${d};
+  out_p += pos * out_str_${d};
+% endfor
+
+  prefix = sums[GID_0];
+  for (i = start + LID_0; i < start + ${tile} && i < n; i += LDIM_0) {
+    p = (GLOBAL_MEM ${out_t} *)(out_p + (int)i * out_str_${nd-1});
+    *p = SCAN(prefix, *p);
+  }
+}
+""")
+
+
+class ScanKernel(object):
+    """
+    Inclusive or exclusive scan (prefix reduction) along one axis.
+
+    :param context: the context to compile the kernels for
+    :param dtype_out: the output (and accumulation) type
+    :param neutral: neutral element of `scan_expr`, as a C expression
+    :param scan_expr: associative operator expressed in terms of `a`
+        and `b`, like the `reduce_expr` of
+        :class:`~pygpu.reduction.ReductionKernel`.  It does not need to
+        be commutative.
+    :param preamble: code to put before the kernels
+
+    The kernels are compiled on first use and cached per input type,
+    number of dimensions and scan kind.
+    """
+    def __init__(self, context, dtype_out, neutral, scan_expr, preamble=""):
+        self.context = context
+        self.dtype_out = numpy.dtype(dtype_out)
+        self.out_arg = ArrayArg(self.dtype_out, 'out')
+        self.neutral = neutral
+        self.scan_expr = scan_expr
+        self.preamble = preamble
+
+        ls = min(context.lmemsize // (2 * self.dtype_out.itemsize),
+                 context.maxlsize)
+        # nearest power of 2 (going down), the tile must fit in lmem
+        self.init_local_size = 2**int(math.floor(math.log(ls, 2)))
+
+    def _flags(self, in_dtype):
+        have_small = False
+        have_double = False
+        have_complex = False
+        for dt in (in_dtype, self.dtype_out):
+            if dt.itemsize < 4:
+                have_small = True
+            if dt in [numpy.float64, numpy.complex128]:
+                have_double = True
+            if dt in [numpy.complex64, numpy.complex128]:
+                have_complex = True
+        return dict(have_small=have_small, have_double=have_double,
+                    have_complex=have_complex)
+
+    @owned_lfu_cache()
+    def _get_block_kernel(self, in_dtype, nd, exclusive):
+        in_arg = ArrayArg(in_dtype, 'in')
+        spec = ['uint32', 'uint32', gpuarray.GpuArray, 'uint32']
+        spec.extend('int32' for _ in range(nd))
+        spec.extend([gpuarray.GpuArray, 'uint32'])
+        spec.extend('int32' for _ in range(nd))
+        spec.extend('uint32' for _ in range(nd - 1))
+        spec.append(gpuarray.GpuArray)
+
+        local_size = self.init_local_size
+        while local_size > 0:
+            src = block_kernel.render(preamble=self.preamble,
+                                      name="scank", nd=nd,
+                                      in_t=in_arg.ctype(),
+                                      out_t=self.out_arg.ctype(),
+                                      scan_expr=self.scan_expr,
+                                      neutral=self.neutral,
+                                      local_size=local_size,
+                                      exclusive=exclusive)
+            k = gpuarray.GpuKernel(src, "scank", spec, context=self.context,
+                                   cluda=True, **self._flags(in_dtype))
+            if local_size <= k.maxlsize:
+                return k, local_size
+            local_size //= 2
+
+        raise RuntimeError("Can't stabilize the local_size for kernel."
+                           " Please report this along with your "
+                           "scan code.")
+
+    @owned_lfu_cache()
+    def _get_add_kernel(self, nd, tile):
+        spec = ['uint32', 'uint32', gpuarray.GpuArray, 'uint32']
+        spec.extend('int32' for _ in range(nd))
+        spec.extend('uint32' for _ in range(nd - 1))
+        spec.append(gpuarray.GpuArray)
+        src = add_kernel.render(preamble=self.preamble, name="scanadd",
+                                nd=nd, out_t=self.out_arg.ctype(),
+                                scan_expr=self.scan_expr, tile=tile)
+        k = gpuarray.GpuKernel(src, "scanadd", spec, context=self.context,
+                               cluda=True, **self._flags(self.dtype_out))
+        return k, min(tile, k.maxlsize)
+
+    def _scan(self, ary, out, exclusive):
+        # scans along the last dimension of ary into out
+        nd = ary.ndim
+        n = ary.shape[-1]
+        rows = prod(ary.shape[:-1])
+        if n == 0 or rows == 0:
+            return
+
+        k, ls = self._get_block_kernel(ary.dtype, nd, exclusive)
+        tile = 2 * ls
+        nblocks = (n + tile - 1) // tile
+        gs = rows * nblocks
+        if gs > self.context.maxgsize:
+            raise ValueError("Array to big to be scanned along the "
+                             "selected axis")
+
+        if nblocks > 1:
+            sums = gpuarray.empty((rows, nblocks), dtype=self.dtype_out,
+                                  context=self.context)
+        else:
+            # never written to in that case
+            sums = out
+
+        kargs = [n, nblocks, ary, ary.offset]
+        kargs.extend(ary.strides)
+        kargs.extend([out, out.offset])
+        kargs.extend(out.strides)
+        kargs.extend(ary.shape[:-1])
+        kargs.append(sums)
+        k(*kargs, ls=ls, gs=gs)
+
+        if nblocks > 1:
+            self._scan(sums, sums, True)
+            ak, als = self._get_add_kernel(nd, tile)
+            kargs = [n, nblocks, out, out.offset]
+            kargs.extend(out.strides)
+            kargs.extend(out.shape[:-1])
+            kargs.append(sums)
+            ak(*kargs, ls=als, gs=gs)
+
+    def __call__(self, ary, axis=None, exclusive=False, out=None):
+        """
+        Scan `ary` along `axis`.  If `axis` is None the scan is done
+        over the flattened array.
+
+        :param exclusive: if True, element i of the result does not
+            include element i of the input and the first element is
+            the neutral.
+        :param out: optional output array of the right shape and type
+        """
+        if axis is None:
+            if ary.ndim != 1:
+                ary = ary.reshape((ary.size,))
+            axis = 0
+        nd = ary.ndim
+        if axis < 0:
+            axis += nd
+        if axis < 0 or axis >= nd:
+            raise ValueError('axis out of bounds')
+
+        if out is None:
+            out = gpuarray.empty(ary.shape, context=self.context,
+                                 dtype=self.dtype_out)
+        else:
+            if out.shape != ary.shape or out.dtype != self.dtype_out:
+                raise TypeError("Out array is not of expected type "
+                                "(expected %s %s, got %s %s)" % (
+                        ary.shape, self.dtype_out, out.shape, out.dtype))
+
+        if axis != nd - 1:
+            axes = [i for i in range(nd) if i != axis] + [axis]
+            self._scan(ary.transpose(axes), out.transpose(axes), exclusive)
+        else:
+            self._scan(ary, out, exclusive)
+        return out
+
+
+@owned_lfu_cache()
+def _get_scan_kernel(context, dtype_out, neutral, scan_expr):
+    return ScanKernel(context, dtype_out, neutral, scan_expr)
+
+
+def _accum_dtype(dtype):
+    # we only upcast integers that are smaller than the plaform default
+    if dtype.kind == 'i':
+        di = numpy.dtype('int')
+        if di.itemsize > dtype.itemsize:
+            return di
+    if dtype.kind == 'u':
+        di = numpy.dtype('uint')
+        if di.itemsize > dtype.itemsize:
+            return di
+    return dtype
+
+
+def scan(ary, scan_expr, neutral, axis=None, exclusive=False, dtype=None,
+         out=None):
+    """
+    Scan `ary` along `axis` with the operator `scan_expr` (in terms of
+    `a` and `b`) whose neutral element is `neutral`.
+
+    The kernels are shared between calls with the same context, type,
+    operator and neutral.
+    """
+    if dtype is None:
+        dtype = ary.dtype
+    k = _get_scan_kernel(ary.context, numpy.dtype(dtype), neutral, scan_expr)
+    return k(ary, axis=axis, exclusive=exclusive, out=out)
+
+
+def cumsum(ary, axis=None, dtype=None, out=None, exclusive=False):
+    if dtype is None:
+        dtype = _accum_dtype(ary.dtype)
+    return scan(ary, "a + b", "0", axis=axis, exclusive=exclusive,
+                dtype=dtype, out=out)
+
+
+def cumprod(ary, axis=None, dtype=None, out=None, exclusive=False):
+    if dtype is None:
+        dtype = _accum_dtype(ary.dtype)
+    return scan(ary, "a * b", "1", axis=axis, exclusive=exclusive,
+                dtype=dtype, out=out)
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import pygpu
+from pygpu.autotune import LaunchTuner
+from pygpu.elemwise import ElemwiseKernel
+
+
+def test_launch_tuner():
+    nctx = pygpu.init('null')
+    # Every item costs the same, so the fewest threads win
+    nctx.cost_model = dict(launch_latency=1e-5, item_time=1e-9, log_max=100)
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    os.remove(path)
+    try:
+        tuner = LaunchTuner(nctx, path, repeat=2)
+        nctx.launch_tuner = tuner
+        k = ElemwiseKernel(nctx, "float *a", "a[i] = 3")
+        a = pygpu.empty((100000,), dtype='float32', context=nctx)
+        ntrials = 2 * len(tuner.candidates(k.contig_k, 100000))
+        for i in range(ntrials):
+            k(a)
+        assert list(tuner.table.values()) == [(32, 32)]
+        nctx.call_stats(reset=True)
+        k(a)
+        # A size in the same bucket uses the same configuration
+        k(a[:70000])
+        log = nctx.call_stats()['log']
+        assert [r[2] for r in log] == [32 * 32, 32 * 32]
+        # Reloaded in a new tuner
+        nctx.launch_tuner = None
+        assert LaunchTuner(nctx, path).table == tuner.table
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_launch_tuner_cover():
+    nctx = pygpu.init('null')
+    nctx.cost_model = dict(item_time=1e-9)
+    k = pygpu.gpuarray.GpuKernel("KERNEL void k(GLOBAL_MEM float *a) {}",
+                                 "k", [pygpu.gpuarray.GpuArray],
+                                 context=nctx)
+    assert not k.grid_stride
+    # Without grid_stride every candidate covers n
+    for ls, gs in LaunchTuner(nctx).candidates(k, 100000):
+        assert gs == 0
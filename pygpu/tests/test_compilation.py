@@ -0,0 +1,41 @@
+import pygpu
+from pygpu.elemwise import ElemwiseKernel
+from pygpu.gpuarray import GpuKernel
+
+from .support import context
+
+
+def test_compile_stats():
+    pygpu.compile_stats(reset=True)
+    k = ElemwiseKernel(context, "float *a", "a[i] = 2")
+    # Strided so that it goes through the cached kernels
+    a = pygpu.empty((20,), dtype='float32', context=context)[::2]
+    k(a)
+    k(a)
+    st = pygpu.compile_stats()
+    assert st['tiers']['miss'] >= 1
+    assert st['tiers']['miss'] == len(st['compiles'])
+    for rec in st['compiles']:
+        assert rec['tier'] == 'miss'
+        assert rec['compile_time'] >= 0
+        assert rec['source_size'] > 0
+        assert rec['name'] in st['kernels']
+    # Kernels come from the template
+    assert any(rec['render_time'] > 0 for rec in st['compiles'])
+    # The second call finds its kernel in memory
+    assert st['tiers']['memory'] >= 1
+    assert sum(st['memory_hits'].values()) == st['tiers']['memory']
+
+
+def test_compile_stats_reset():
+    GpuKernel("KERNEL void k(GLOBAL_MEM float *a) { a[0] = 1; }",
+              "k", [pygpu.gpuarray.GpuArray], context=context)
+    st = pygpu.compile_stats(reset=True)
+    rec = st['compiles'][-1]
+    assert rec['name'] == 'k'
+    # Not generated from a template
+    assert rec['render_time'] == 0
+    assert st['kernels']['k']['count'] >= 1
+    st = pygpu.compile_stats()
+    assert st['compiles'] == []
+    assert st['tiers'] == dict(memory=0, disk=0, miss=0)
@@ -2,7 +2,7 @@ import operator
 import numpy
 
 from pygpu import gpuarray, ndgpuarray as elemary
-from pygpu.elemwise import ElemwiseKernel
+from pygpu.elemwise import ElemwiseKernel, select_stats, select_report
 from pygpu.tools import check_args, ArrayArg, ScalarArg
 
 from .support import (guard_devsup, rand, check_flags, check_meta, check_all,
@@ -421,3 +421,24 @@ def elemwise_collapse(dtype1, dtype2, shape1, shape2, expected):
             assert nd >= expected
         else:
             assert nd == expected2
+
+
+def test_select_stats():
+    k = ElemwiseKernel(context, "float *a", "a[i] = 7.25",
+                       dimspec_limit=1, spec_limit=2)
+    select_stats.reset()
+    a = gpuarray.empty((20,), dtype='float32', context=context)
+    for i in range(5):
+        k(a[::2])
+    st = k.select_stats
+    assert st.calls == dict(basic=2, dimspec=1, specialized=2)
+    assert st.compiles == dict(contig=1, basic=1, dimspec=1, specialized=1)
+    assert sum(st.key_changes.values()) == 0
+    k(a)
+    assert st.calls['contig'] == 1
+    # A new shape resets the counts towards specialization
+    k(a[::4])
+    assert st.key_changes == dict(specialized=1, dimspec=1)
+    assert select_stats.calls == st.calls
+    assert 'specialized' in select_report(k)
+    assert 'basic' in select_report()
@@ -1,12 +1,15 @@
 import copy
 
+from nose.plugins.skip import SkipTest
+from nose.tools import assert_raises
+
 import numpy
 
 import pygpu.gpuarray as gpu_ndarray
 
 from .support import (guard_devsup, check_meta, check_flags, check_all,
                       gen_gpuarray, context as ctx, dtypes_all,
-                      dtypes_no_complex, skip_single_f)
+                      dtypes_no_complex, skip_single_f, get_env_dev)
 
 
 def product(*args, **kwds):
@@ -615,3 +618,409 @@ def flag_prop(p):
 
     assert getattr(c2.flags, p) == getattr(g2.flags, p)
     assert getattr(c3.flags, p) == getattr(g3.flags, p)
+
+
+def test_mem_pool():
+    pctx = gpu_ndarray.init(get_env_dev(), flags=gpu_ndarray.CTX_MEM_POOL)
+    st = pctx.pool_stats(reset=True)
+    assert st['cached'] == 0
+    assert st['limit'] is None
+
+    a = numpy.random.rand(1000).astype('float32')
+    g = gpu_ndarray.array(a, context=pctx)
+    del g
+    st = pctx.pool_stats()
+    assert st['cached'] >= a.nbytes
+    assert st['misses'] == 1
+
+    # A slightly different size falls in the same size class
+    b = numpy.random.rand(990).astype('float32')
+    g = gpu_ndarray.array(b, context=pctx)
+    assert pctx.pool_stats()['hits'] == 1
+    assert pctx.pool_stats()['cached'] == 0
+    numpy.testing.assert_equal(numpy.asarray(g), b)
+
+    g2 = gpu_ndarray.zeros((990,), dtype='float32', context=pctx)
+    numpy.testing.assert_equal(numpy.asarray(g2), 0)
+    del g, g2
+    assert pctx.pool_stats()['cached'] > 0
+
+    pctx.empty_cache()
+    assert pctx.pool_stats()['cached'] == 0
+
+
+def test_mem_pool_limit():
+    pctx = gpu_ndarray.init(get_env_dev(), flags=gpu_ndarray.CTX_MEM_POOL)
+    g1 = gpu_ndarray.empty((1024,), dtype='float32', context=pctx)
+    g2 = gpu_ndarray.empty((4096,), dtype='float32', context=pctx)
+    pctx.pool_limit = 8192
+    assert pctx.pool_limit == 8192
+    del g1, g2
+    # The bigger buffer would go over the limit
+    assert 0 < pctx.pool_stats()['cached'] <= 8192
+    pctx.pool_limit = 0
+    assert pctx.pool_stats()['cached'] == 0
+    pctx.pool_limit = None
+    assert pctx.pool_limit is None
+
+
+def test_mem_pool_off():
+    ctx.empty_cache()
+    g = gpu_ndarray.empty((1024,), dtype='float32', context=ctx)
+    del g
+    assert ctx.pool_stats()['cached'] == 0
+
+
+@guard_devsup
+def test_pinned_empty():
+    a = gpu_ndarray.pinned_empty((3, 4), dtype='float32', context=ctx)
+    assert isinstance(a, numpy.ndarray)
+    assert a.shape == (3, 4)
+    assert a.dtype == numpy.float32
+    assert a.flags['C_CONTIGUOUS']
+    a[...] = numpy.arange(12).reshape(3, 4)
+    g = gpu_ndarray.array(a, context=ctx)
+    numpy.testing.assert_equal(numpy.asarray(g), a)
+
+    f = gpu_ndarray.pinned_empty((3, 4), dtype='int16', order='F',
+                                 context=ctx)
+    assert f.flags['F_CONTIGUOUS']
+    f[...] = numpy.asarray(g)
+    numpy.testing.assert_equal(f, a)
+
+
+def test_transfer_large():
+    # Big enough (and of an odd size) to go through staging
+    a = numpy.random.rand(3 * 1024 * 1024 + 5).astype('float32')
+    g = gpu_ndarray.array(a, context=ctx)
+    numpy.testing.assert_equal(numpy.asarray(g), a)
+
+
+def test_write_async():
+    a = numpy.random.rand(5, 7).astype('float32')
+    g = gpu_ndarray.empty((5, 7), dtype='float32', context=ctx)
+    t = g.write_async(a)
+    assert t.result() is g
+    assert t.done()
+    numpy.testing.assert_equal(numpy.asarray(g), a)
+
+    # The source is converted to the layout of the destination
+    gf = gpu_ndarray.empty((5, 7), dtype='float32', order='F', context=ctx)
+    gf.write_async(a).wait()
+    numpy.testing.assert_equal(numpy.asarray(gf), a)
+
+    try:
+        g.write_async(a.astype('float64'))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("did not raise ValueError")
+
+
+def test_read_async():
+    c, g = gen_gpuarray((5, 7), 'float32', ctx=ctx)
+    t = g.read_async()
+    numpy.testing.assert_equal(t.result(), c)
+
+    out = numpy.empty((5, 7), dtype='float32')
+    t = g.read_async(out=out)
+    assert t.result() is out
+    numpy.testing.assert_equal(out, c)
+
+    # Non-contiguous arrays are copied first
+    c, g = gen_gpuarray((5, 7), 'float32', ctx=ctx, sliced=2)
+    numpy.testing.assert_equal(g.read_async().result(), c)
+
+
+def test_transfer_dropped():
+    c, g = gen_gpuarray((50, 70), 'float32', ctx=ctx)
+    # The temporary host copies must outlive the transfers
+    g.write_async(numpy.asfortranarray(c * 2))
+    g.read_async()
+    numpy.testing.assert_equal(numpy.asarray(g), c * 2)
+
+
+def test_transfer_await():
+    try:
+        import asyncio
+    except ImportError:
+        raise SkipTest("asyncio not available")
+    c, g = gen_gpuarray((50, 70), 'float32', ctx=ctx)
+    loop = asyncio.new_event_loop()
+    try:
+        # run_until_complete() accepts any awaitable
+        res = loop.run_until_complete(g.read_async())
+    finally:
+        loop.close()
+    numpy.testing.assert_equal(res, c)
+
+
+def test_memory_stats():
+    st = ctx.memory_stats(reset=True)
+    live = st['live_bytes']
+    nbuf = st['live_buffers']
+
+    g1 = gpu_ndarray.empty((1000,), dtype='float32', context=ctx)
+    g2 = gpu_ndarray.empty((10,), dtype='float64', context=ctx)
+    st = ctx.memory_stats()
+    assert st['allocs'] == 2
+    assert st['frees'] == 0
+    assert st['live_buffers'] == nbuf + 2
+    assert st['live_bytes'] >= live + 4080
+    assert st['peak_bytes'] == st['live_bytes']
+    assert st['hist'] == {2048: 1, 64: 1}
+
+    del g1
+    st2 = ctx.memory_stats(reset=True)
+    assert st2['frees'] == 1
+    assert st2['live_buffers'] == nbuf + 1
+    assert st2['live_bytes'] < st['live_bytes']
+    assert st2['peak_bytes'] == st['peak_bytes']
+
+    st3 = ctx.memory_stats()
+    assert st3['allocs'] == 0
+    assert st3['hist'] == {}
+    assert st3['peak_bytes'] == st2['live_bytes']
+    del g2
+
+
+def test_release_temporaries():
+    # Released buffers may be freed later but must all be accounted for
+    live = ctx.memory_stats()['live_bytes']
+    a = numpy.random.rand(1000).astype('float32')
+    g = gpu_ndarray.array(a, context=ctx)
+    for i in range(20):
+        t = g.copy()
+        g = gpu_ndarray.empty((1000,), dtype='float32', context=ctx)
+        g[:] = t
+        del t
+    numpy.testing.assert_equal(numpy.asarray(g), a)
+    del g
+    assert ctx.memory_stats()['live_bytes'] == live
+
+
+def test_arena():
+    ar = gpu_ndarray.Arena(4096, context=ctx, alignment=64)
+    a = numpy.random.rand(3, 5).astype('float32')
+    b = numpy.arange(7, dtype='int16')
+    ga = ar.array(a)
+    gb = ar.array(b)
+    gc = ar.empty((2, 3), dtype='float64', order='F')
+    # 60 bytes at 0, 14 bytes at 64, 48 bytes at 128
+    assert ar.used == 176
+    assert gc.flags['F_CONTIGUOUS']
+    assert gb.offset % 64 == 0 and gc.offset % 64 == 0
+    numpy.testing.assert_equal(numpy.asarray(ga), a)
+    numpy.testing.assert_equal(numpy.asarray(gb), b)
+
+    saved = ar.read()
+    assert len(saved) == ar.used
+    ga.write_async(numpy.zeros_like(a)).wait()
+    ar.write(saved)
+    numpy.testing.assert_equal(numpy.asarray(ga), a)
+
+    try:
+        ar.empty((1000,), dtype='float32')
+    except MemoryError:
+        pass
+    else:
+        raise AssertionError("did not raise MemoryError")
+
+    ar.reset()
+    assert ar.used == 0
+    gd = ar.empty((1000,), dtype='float32')
+    assert gd.offset == ga.offset
+
+
+def test_from_host_buffer():
+    a = numpy.random.rand(4, 6).astype('float32')
+    g = gpu_ndarray.from_host_buffer(a, context=ctx)
+    numpy.testing.assert_equal(numpy.asarray(g), a)
+    # Zero-copy arrays see host updates and the other way around
+    if g.base is a:
+        a[1, 2] = 42
+        assert numpy.asarray(g)[1, 2] == 42
+        g.write_async(numpy.ones_like(a)).wait()
+        numpy.testing.assert_equal(a, 1)
+
+    b = bytearray(b'\x01\x02\x03\x04')
+    g = gpu_ndarray.from_host_buffer(b, context=ctx)
+    assert g.dtype == numpy.uint8
+    numpy.testing.assert_equal(numpy.asarray(g), [1, 2, 3, 4])
+
+    c = numpy.arange(10, dtype='int32')
+    g = gpu_ndarray.from_host_buffer(c, zero_copy=False, context=ctx)
+    assert g.base is not c
+    c[0] = 5
+    assert numpy.asarray(g)[0] == 0
+
+    # Non-contiguous input is copied
+    g = gpu_ndarray.from_host_buffer(c[::2], context=ctx)
+    numpy.testing.assert_equal(numpy.asarray(g), c[::2])
+
+
+def test_reclaim_callback():
+    calls = []
+
+    def cb():
+        calls.append(1)
+
+    ctx.add_reclaim_callback(cb)
+    try:
+        before = ctx.memory_stats()['oom_retries']
+        try:
+            # Too big for any device
+            gpu_ndarray.empty((1 << 50,), dtype='uint8', context=ctx)
+        except (gpu_ndarray.GpuArrayException, MemoryError, ValueError):
+            pass
+        else:
+            raise SkipTest("allocation did not fail")
+        if ctx.memory_stats()['oom_retries'] == before:
+            raise SkipTest("backend did not report out of memory")
+        assert calls == [1]
+    finally:
+        ctx.remove_reclaim_callback(cb)
+
+
+def test_memory_budget():
+    if ctx.kind != 'cuda':
+        raise SkipTest("memory budget needs cuda")
+    a = numpy.random.rand(1000).astype('float32')
+    b = numpy.random.rand(500).astype('float64')
+    ga = gpu_ndarray.array(a, context=ctx)
+    gb = gpu_ndarray.array(b, context=ctx)
+    ga.spillable = True
+    gb.spillable = True
+    assert ga[10:].spillable
+    ctx.memory_stats(reset=True)
+    # Nothing spillable fits, so every array not in use goes to the host
+    ctx.memory_budget = 1
+    try:
+        gc = gpu_ndarray.empty((100,), dtype='float32', context=ctx)
+        st = ctx.memory_stats()
+        assert st['spills'] == 2
+        assert st['spilled_bytes'] >= a.nbytes + b.nbytes
+        numpy.testing.assert_equal(numpy.asarray(ga), a)
+        numpy.testing.assert_equal(numpy.asarray(gb), b)
+        assert ctx.memory_stats()['spills'] == 3
+    finally:
+        ctx.memory_budget = None
+    # Spilled arrays come back on use even without a budget
+    numpy.testing.assert_equal(numpy.asarray(ga), a)
+    assert ctx.memory_stats()['spilled_bytes'] == 0
+    gb.spillable = False
+    assert not gb.spillable
+
+
+def test_host_context():
+    from pygpu.elemwise import ElemwiseKernel
+    from pygpu.reduction import reduce, histogram
+    try:
+        hctx = gpu_ndarray.init('host')
+    except (RuntimeError, gpu_ndarray.GpuArrayException):
+        raise SkipTest("host backend not available")
+    assert hctx.kind == 'host'
+    a = numpy.random.rand(1000).astype('float32')
+    b = numpy.random.rand(1000).astype('float32')
+    ga = gpu_ndarray.array(a, context=hctx)
+    gb = gpu_ndarray.array(b, context=hctx)
+    gc = gpu_ndarray.empty((1000,), dtype='float32', context=hctx)
+    k = ElemwiseKernel(hctx, "float *a, float *b, float *c",
+                       "c[i] = a[i] * b[i]")
+    k(ga, gb, gc)
+    numpy.testing.assert_allclose(numpy.asarray(gc), a * b)
+    # Uses local memory and barriers
+    numpy.testing.assert_allclose(numpy.asarray(reduce(ga, 'sum')),
+                                  a.sum(), rtol=1e-5)
+    # Uses atomics
+    h, _ = histogram(ga, bins=7, range=(0, 1))
+    numpy.testing.assert_equal(numpy.asarray(h),
+                               numpy.histogram(a, bins=7, range=(0, 1))[0])
+    # Strided copies go through extcopy
+    numpy.testing.assert_equal(numpy.asarray(ga[::3].copy()), a[::3])
+
+
+def test_null_context():
+    from pygpu.elemwise import ElemwiseKernel
+    nctx = gpu_ndarray.init('null')
+    assert nctx.kind == 'null'
+    nctx.cost_model = dict(launch_latency=1e-5, bandwidth=1e9)
+    a = numpy.random.rand(1000).astype('float32')
+    ga = gpu_ndarray.array(a, context=nctx)
+    gb = gpu_ndarray.empty((1000,), dtype='float32', context=nctx)
+    nctx.call_stats(reset=True)
+    k = ElemwiseKernel(nctx, "float *a, float *b", "b[i] = a[i] * 2")
+    k(ga, gb)
+    st = nctx.call_stats()
+    assert st['calls']['launch'] == 1
+    compiles = st['calls']['compile']
+    assert compiles >= 1
+    k(ga, gb)
+    # Nothing runs, reads give zeros
+    numpy.testing.assert_equal(numpy.asarray(gb), 0)
+    st = nctx.call_stats(reset=True)
+    assert st['calls']['launch'] == 2
+    assert st['calls']['compile'] == compiles
+    assert st['calls']['read'] == 1
+    assert st['bytes']['read'] == a.nbytes
+    assert st['calls']['write'] == 0
+    assert [r[0] for r in st['log']].count('launch') == 2
+    numpy.testing.assert_allclose(st['time'],
+                                  2e-5 + a.nbytes / 1e9)
+    assert nctx.call_stats()['calls']['launch'] == 0
+
+
+def test_kernel_cached_properties():
+    nctx = gpu_ndarray.init('null')
+    k = gpu_ndarray.GpuKernel("KERNEL void k(GLOBAL_MEM float *a, "
+                              "ga_size n) {}", "k",
+                              [gpu_ndarray.GpuArray, gpu_ndarray.SIZE],
+                              context=nctx)
+    assert k.numargs == 2
+    assert k.maxlsize == nctx.maxlsize == 1024
+    assert k.preflsize == 32
+    assert nctx.numprocs == 16
+    a = gpu_ndarray.empty((10,), dtype='float32', context=nctx)
+    nctx.call_stats(reset=True)
+    k(a, 10, n=100000)
+    # n=100000 is over maxlsize so the launch uses it
+    assert nctx.call_stats()['log'][0][2] == 1024 * 98
+
+
+def test_kernel_launch_raw():
+    nctx = gpu_ndarray.init('null')
+    nctx.cost_model = dict(log_max=10)
+    k = gpu_ndarray.GpuKernel("KERNEL void k(GLOBAL_MEM float *a, "
+                              "float b, ga_uint c) {}", "k",
+                              [gpu_ndarray.GpuArray, 'float32', 'uint32'],
+                              context=nctx)
+    a = gpu_ndarray.empty((10,), dtype='float32', context=nctx)
+    nctx.call_stats(reset=True)
+    k.launch_raw((a, 1.5, 2), 32, 4)
+    k.launch_raw((a, 1.5, 2), (8, 2), (2, 2))
+    assert [r[2] for r in nctx.call_stats()['log']] == [128, 64]
+    assert_raises(TypeError, k.launch_raw, (a, 1.5), 32, 4)
+    assert_raises(TypeError, k.launch_raw, (1, 1.5, 2), 32, 4)
+    assert_raises(ValueError, k.launch_raw, (a, 1.5, 2), (8, 2), 4)
+    # Unsupported argument types fail when creating the kernel
+    assert_raises(ValueError, gpu_ndarray.GpuKernel,
+                  "KERNEL void k(ga_cfloat a) {}", "k", ['complex64'],
+                  context=nctx)
+
+
+def test_kernel_call_gs_tuple():
+    nctx = gpu_ndarray.init('null')
+    nctx.cost_model = dict(log_max=10)
+    k = gpu_ndarray.GpuKernel("KERNEL void k(GLOBAL_MEM float *a) {}", "k",
+                              [gpu_ndarray.GpuArray], context=nctx)
+    a = gpu_ndarray.empty((10,), dtype='float32', context=nctx)
+    nctx.call_stats(reset=True)
+    k(a, ls=(32,), gs=(4,))
+    k(a, ls=32, gs=(4,))
+    k(a, ls=(8, 2), gs=(2, 2))
+    # ls is computed from n and gs
+    k(a, n=1000, gs=(4,))
+    assert ([r[2] for r in nctx.call_stats()['log']] ==
+            [128, 128, 64, 4 * (999 // 3)])
+    assert_raises(ValueError, k, a, ls=(8, 2), gs=(4,))
+    assert_raises(ValueError, k, a, ls=32, gs=(4, 4))
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+import numpy
+import pygpu
+
+from .support import context
+
+
+def test_load_npy():
+    for order in ['C', 'F']:
+        a = numpy.asarray(numpy.random.rand(37, 11), dtype='float32',
+                          order=order)
+        fd, path = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+        try:
+            numpy.save(path, a)
+            # Small chunks to go through both staging buffers
+            g = pygpu.load_npy(path, context=context, chunk_size=100)
+        finally:
+            os.remove(path)
+        assert g.shape == a.shape
+        assert g.dtype == a.dtype
+        numpy.testing.assert_equal(numpy.asarray(g), a)
+
+
+def test_from_memmap():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        mm = numpy.memmap(path, dtype='int32', mode='w+', shape=(5, 200))
+        mm[...] = numpy.arange(1000).reshape(5, 200)
+        g = pygpu.from_memmap(mm, context=context, chunk_size=1024)
+        numpy.testing.assert_equal(numpy.asarray(g), mm)
+        # Non-contiguous sources are still accepted
+        g = pygpu.from_memmap(mm[:, ::3], context=context, chunk_size=64)
+        numpy.testing.assert_equal(numpy.asarray(g), mm[:, ::3])
+        del mm
+    finally:
+        os.remove(path)
+
+    g = pygpu.from_memmap(numpy.zeros((0, 3)), context=context)
+    assert g.shape == (0, 3)
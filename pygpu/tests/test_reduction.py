@@ -1,8 +1,11 @@
+import gc
 import operator
 import numpy
 
 from pygpu import gpuarray, ndgpuarray as elemary
-from pygpu.reduction import ReductionKernel
+from pygpu.reduction import (ReductionKernel, moments, segment_reduce,
+                             bincount, histogram, reduce,
+                             _get_reduction_kernel, _has_double)
 
 from .support import (guard_devsup, rand, check_flags, check_meta, check_all,
                       check_meta_content, context, gen_gpuarray,
@@ -106,3 +109,229 @@ def test_reduction_0d():
     rg = g.all()
 
     assert numpy.all(rc == numpy.asarray(rg))
+
+
+def test_moments():
+    for dtype in dtypes_no_complex:
+        for shape, axis in [((10,), None),
+                            ((20, 30), None),
+                            ((20, 30), 0),
+                            ((20, 30), 1),
+                            ((8, 5, 10), (0, 2)),
+                            ((8, 5, 10), 1)]:
+            yield moments_op, 'mean', dtype, shape, axis
+            yield moments_op, 'var', dtype, shape, axis
+            yield moments_op, 'std', dtype, shape, axis
+
+
+@guard_devsup
+def moments_op(op, dtype, shape, axis):
+    c, g = gen_gpuarray(shape, dtype, ctx=context, cls=elemary)
+
+    rg = getattr(g, op)(axis=axis)
+    rc = getattr(c.astype(rg.dtype), op)(axis=axis)
+
+    assert rc.shape == rg.shape
+    assert numpy.allclose(rc, numpy.asarray(rg), rtol=1e-4)
+
+
+def test_moments_ddof():
+    c, g = gen_gpuarray((20, 30), 'float32', ctx=context, cls=elemary)
+
+    for ddof in [0, 1]:
+        rc = c.var(axis=0, ddof=ddof)
+        rg = g.var(axis=0, ddof=ddof)
+        assert numpy.allclose(rc, numpy.asarray(rg), rtol=1e-4)
+
+
+def test_moments_stability():
+    # a large offset destroys the naive E[x^2] - E[x]^2 formula in float32
+    c = (numpy.random.rand(100000) + 10000).astype('float32')
+    g = gpuarray.array(c, context=context, cls=elemary)
+
+    rc = c.astype('float64').var()
+    rg = numpy.asarray(g.var())
+    assert abs(rc - rg) / rc < 1e-3, (rc, rg)
+
+
+def test_moments_int():
+    # float32 can't hold these values exactly
+    c = numpy.random.randint(1 << 28, 1 << 30, size=(1000,)).astype('int64')
+    g = gpuarray.array(c, context=context)
+    mean, var = moments(g)
+    if not _has_double(context):
+        assert mean.dtype == numpy.float32
+        return
+    assert mean.dtype == numpy.float64
+    assert numpy.allclose(c.mean(), numpy.asarray(mean), rtol=1e-12)
+
+
+def test_moments_out():
+    c, g = gen_gpuarray((20, 30), 'float32', ctx=context)
+    mean = gpuarray.empty((30,), dtype='float32', context=context)
+    var = gpuarray.empty((30,), dtype='float32', context=context)
+
+    rmean, rvar = moments(g, axis=0, out=(mean, var))
+    assert rmean is mean and rvar is var
+    assert numpy.allclose(c.mean(axis=0), numpy.asarray(mean), rtol=1e-4)
+    assert numpy.allclose(c.var(axis=0), numpy.asarray(var), rtol=1e-4)
+
+
+def test_red_compensated():
+    # many small terms next to a large one lose most of their bits
+    # in a naive float32 sum
+    c = numpy.random.uniform(0, 1, (1000000,)).astype('float32')
+    c[0] = 1e6
+    g = gpuarray.array(c, context=context)
+
+    rc = c.astype('float64').sum()
+    rk = ReductionKernel(context, 'float32', "0", "a + b", [True],
+                         accuracy='compensated')(g)
+    assert abs(numpy.asarray(rk) - rc) / rc < 1e-6, (rc, numpy.asarray(rk))
+
+
+def test_red_compensated_axes():
+    for redux in [[True, False], [False, True]]:
+        c, g = gen_gpuarray((200, 300), 'float32', ctx=context)
+        axes = [i for i in range(len(redux)) if redux[i]]
+        rc = c.astype('float64').sum(axis=axes[0])
+        rg = ReductionKernel(context, 'float32', "0", "a + b", redux,
+                             accuracy='compensated')(g)
+        assert numpy.allclose(rc, numpy.asarray(rg), rtol=1e-6)
+
+
+def test_red_compensated_bad_op():
+    try:
+        ReductionKernel(context, 'float32', "1", "a * b", [True],
+                        accuracy='compensated')
+        assert False, "Expected a ValueError"
+    except ValueError:
+        pass
+
+
+def test_segment_reduce():
+    for op in ['+', '*', 'max', 'min']:
+        for dtype in ['float32', 'int32', 'int64', 'uint64']:
+            yield segment_reduce_op, op, dtype
+
+
+def test_segment_reduce_bad_offsets():
+    g = gpuarray.zeros((10,), dtype='float32', context=context)
+    for offsets in [[0, 5, 3, 10], [0, 11], [-1, 5]]:
+        goffsets = gpuarray.array(numpy.array(offsets, dtype='int32'),
+                                  context=context)
+        try:
+            segment_reduce(g, goffsets, '+')
+            assert False, "Expected a ValueError"
+        except ValueError:
+            pass
+
+
+def segment_reduce_op(op, dtype):
+    lens = numpy.random.randint(0, 50, size=(100,))
+    lens[3] = 0
+    lens[10] = 3000
+    offsets = numpy.zeros((101,), dtype='uint32')
+    offsets[1:] = numpy.cumsum(lens)
+    c = numpy.random.uniform(0.5, 1.5, (offsets[-1],)).astype(dtype)
+    g = gpuarray.array(c, context=context)
+    goffsets = gpuarray.array(offsets, context=context)
+
+    rg = numpy.asarray(segment_reduce(g, goffsets, op))
+    fn = {'+': numpy.sum, '*': numpy.prod,
+          'max': numpy.max, 'min': numpy.min}[op]
+    for i in range(100):
+        seg = c[offsets[i]:offsets[i+1]]
+        if len(seg) == 0:
+            continue
+        assert numpy.allclose(fn(seg), rg[i], rtol=1e-4), (op, i)
+    if op == '+':
+        assert rg[3] == 0
+    if op == '*':
+        assert rg[3] == 1
+
+
+def test_bincount():
+    for weighted in [False, True]:
+        for minlength in [0, 2000]:
+            yield bincount_op, weighted, minlength
+
+
+def bincount_op(weighted, minlength):
+    c = numpy.random.randint(0, 1000, size=(100000,)).astype('int32')
+    g = gpuarray.array(c, context=context)
+    w = None
+    gw = None
+    if weighted:
+        w = numpy.random.uniform(0, 1, c.shape).astype('float32')
+        gw = gpuarray.array(w, context=context)
+
+    rc = numpy.bincount(c, weights=w, minlength=minlength)
+    rg = numpy.asarray(bincount(g, weights=gw, minlength=minlength))
+    assert rc.shape == rg.shape
+    assert numpy.allclose(rc, rg, rtol=1e-4)
+
+
+def test_histogram():
+    for bins in [10, 100, 100000]:
+        for rng in [None, (2.0, 8.0)]:
+            yield histogram_op, bins, rng
+
+
+def histogram_op(bins, rng):
+    c, g = gen_gpuarray((300, 100), 'float32', ctx=context)
+
+    hc, ec = numpy.histogram(c, bins=bins, range=rng)
+    hg, eg = histogram(g, bins=bins, range=rng)
+    assert numpy.allclose(ec, eg)
+    # values right on an edge may land on either side
+    assert abs(hc - numpy.asarray(hg)).sum() <= 0.001 * c.size
+    assert numpy.asarray(hg).sum() == hc.sum()
+
+
+def test_reduce():
+    for axis in [None, 0, 1, (0, 1)]:
+        for op in ['sum', 'prod', 'max', 'min']:
+            for dtype in ['float32', 'int32']:
+                yield reduce_op, op, dtype, axis
+        for op in ['all', 'any']:
+            yield reduce_op, op, 'bool', axis
+
+
+def reduce_op(op, dtype, axis):
+    c, g = gen_gpuarray((20, 3), dtype=dtype, ctx=context)
+    if op == 'prod':
+        c, g = gen_gpuarray((4, 3), dtype=dtype, ctx=context)
+
+    rc = getattr(numpy, op)(c, axis=axis)
+    rg = reduce(g, op, axis=axis)
+
+    assert rc.shape == rg.shape
+    assert numpy.allclose(rc, numpy.asarray(rg), rtol=1e-4)
+
+
+def test_reduce_cached():
+    c, g = gen_gpuarray((20, 30), 'float32', ctx=context, cls=elemary)
+    g.sum(axis=0)
+    hits = _get_reduction_kernel.hits
+    misses = _get_reduction_kernel.misses
+    g.sum(axis=0)
+    reduce(g, '+', axis=0)
+    assert _get_reduction_kernel.hits == hits + 2
+    assert _get_reduction_kernel.misses == misses
+
+
+def test_reduce_cache_on_context():
+    def count():
+        return len([o for o in gc.get_objects()
+                    if isinstance(o, gpuarray.GpuContext)])
+    gc.collect()
+    n = count()
+    nctx = gpuarray.init('null')
+    g = gpuarray.zeros((20, 30), dtype='float32', context=nctx)
+    reduce(g, '+', axis=0)
+    assert _get_reduction_kernel in nctx.kernel_cache
+    # The cached kernels don't keep the context alive
+    del g, nctx
+    gc.collect()
+    assert count() == n
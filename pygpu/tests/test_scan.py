@@ -0,0 +1,87 @@
+import numpy
+
+from pygpu import gpuarray, ndgpuarray as elemary
+from pygpu.scan import ScanKernel, scan, cumsum, cumprod
+
+from .support import (guard_devsup, check_meta_content, context,
+                      gen_gpuarray, dtypes_no_complex)
+
+
+def test_cumsum():
+    for dtype in dtypes_no_complex:
+        for shape, axis in [((10,), None),
+                            ((5000,), 0),
+                            ((20, 30), None),
+                            ((20, 30), 0),
+                            ((20, 30), 1),
+                            ((8, 5, 10), 1),
+                            ((3, 2000, 4), 1),
+                            ((8, 5, 10), -1)]:
+            yield cumsum_array, dtype, shape, axis
+
+
+@guard_devsup
+def cumsum_array(dtype, shape, axis):
+    c, g = gen_gpuarray(shape, dtype, ctx=context)
+
+    rg = cumsum(g, axis=axis)
+    rc = numpy.cumsum(c, axis=axis, dtype=rg.dtype)
+
+    assert rc.shape == rg.shape
+    assert numpy.allclose(rc, numpy.asarray(rg), rtol=1e-4)
+
+
+def test_scan_big():
+    # needs more than one level of tile sums
+    c = numpy.ones((1000000,), dtype='int32')
+    g = gpuarray.array(c, context=context)
+
+    rg = cumsum(g)
+    assert numpy.all(numpy.asarray(rg) == numpy.cumsum(c))
+
+
+def test_scan_exclusive():
+    c, g = gen_gpuarray((20, 3000), 'int32', ctx=context)
+
+    rg = cumsum(g, axis=1, exclusive=True)
+    rc = numpy.zeros_like(c)
+    rc[:, 1:] = numpy.cumsum(c, axis=1)[:, :-1]
+    assert numpy.all(numpy.asarray(rg) == rc)
+
+
+def test_scan_strided():
+    c, g = gen_gpuarray((40, 30), 'float32', ctx=context, sliced=2,
+                        offseted_outer=True)
+    out = gpuarray.empty((30, 40), dtype='float32', context=context).T
+
+    rg = cumsum(g, axis=0, out=out)
+    assert rg is out
+    assert numpy.allclose(numpy.cumsum(c, axis=0), numpy.asarray(rg))
+
+
+def test_scan_noncommutative():
+    # last non-zero value seen so far, depends on operand order
+    c = numpy.array([0, 3, 0, 0, 5, 0, 1, 0] * 500, dtype='int32')
+    g = gpuarray.array(c, context=context)
+
+    rg = scan(g, "b != 0 ? b : a", "0")
+    rc = numpy.maximum.accumulate(numpy.where(c != 0,
+                                              numpy.arange(c.size), 0))
+    assert numpy.all(numpy.asarray(rg) == c[rc])
+
+
+def test_cumprod_method():
+    c, g = gen_gpuarray((4, 6), 'float64', ctx=context, cls=elemary)
+
+    assert numpy.allclose(c.cumprod(axis=1), numpy.asarray(g.cumprod(axis=1)))
+
+
+def test_scan_wrong_type():
+    g = gpuarray.empty((2, 3), dtype='float32', context=context)
+    out = gpuarray.empty((3, 2), dtype='float32', context=context)
+
+    try:
+        cumsum(g, axis=0, out=out)
+        assert False, "Expected a TypeError out of cumsum"
+    except TypeError:
+        pass
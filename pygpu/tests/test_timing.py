@@ -0,0 +1,54 @@
+import numpy
+import pygpu
+from pygpu.elemwise import ElemwiseKernel
+from pygpu.gpuarray import GpuKernel
+from pygpu.timing import Timer, KernelStats, kernel_stats
+
+from .support import context
+
+
+def test_timed_call():
+    k = GpuKernel("KERNEL void k(GLOBAL_MEM float *a) { a[0] = 1; }",
+                  "k", [pygpu.gpuarray.GpuArray], context=context)
+    a = pygpu.empty((1,), dtype='float32', context=context)
+    assert k(a, n=1) is None
+    t = k(a, n=1, timed=True)
+    assert t >= 0
+    assert not context.timing
+    assert numpy.asarray(a)[0] == 1
+
+
+def test_timer():
+    nctx = pygpu.init('null')
+    nctx.cost_model = dict(launch_latency=1e-3)
+    k = ElemwiseKernel(nctx, "float *a", "a[i] = 0")
+    a = pygpu.empty((10,), dtype='float32', context=nctx)
+    kernel_stats.reset()
+    k(a)
+    with Timer(nctx) as t:
+        assert nctx.timing
+        k(a)
+        k(a)
+    assert not nctx.timing
+    k(a)
+    assert len(t.launches) == 2
+    numpy.testing.assert_allclose(t.elapsed, 2e-3)
+    tab = kernel_stats.table()
+    assert sum(st['count'] for st in tab.values()) == 2
+    for st in tab.values():
+        numpy.testing.assert_allclose(st['p50'], 1e-3)
+
+
+def test_kernel_stats():
+    st = KernelStats(window=10)
+    for i in range(100):
+        st.add('a', float(i))
+    st.add('b', 1.0)
+    tab = st.table()
+    assert tab['a']['count'] == 100
+    assert tab['a']['total'] == sum(range(100))
+    assert tab['a']['min'] == 0
+    # Percentiles only cover the window
+    assert tab['a']['p50'] == 94.5
+    assert tab['b']['p99'] == 1.0
+    assert 'a' in str(st)
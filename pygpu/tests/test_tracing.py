@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+
+import numpy
+import pygpu
+from pygpu.elemwise import ElemwiseKernel
+from pygpu.tracing import Tracer
+
+from .support import context
+
+
+def test_tracer():
+    a = numpy.random.rand(100).astype('float32')
+    k = ElemwiseKernel(context, "float *a, float *b", "b[i] = a[i] + 1")
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        with Tracer(path, sync=True) as t:
+            ga = pygpu.array(a, context=context)
+            gb = pygpu.empty((100,), dtype='float32', context=context)
+            k(ga, gb)
+            numpy.asarray(gb)
+        # Nothing is recorded once the tracer is gone
+        numpy.asarray(gb)
+        with open(path) as f:
+            trace = json.load(f)
+    finally:
+        os.remove(path)
+    events = trace['traceEvents']
+    assert events == t.events
+    cats = [ev['cat'] for ev in events]
+    assert cats.count('launch') == 1
+    assert cats.count('transfer') == 2
+    launch = [ev for ev in events if ev['cat'] == 'launch'][0]
+    assert launch['args']['arrays'].count('float32[100]') == 2
+    assert len(launch['args']['ls']) == 1
+    assert all(ev['ph'] == 'X' and ev['dur'] >= 0 for ev in events)
+    assert t.totals()['launch'][0] == 1
+
+
+def test_tracer_compile():
+    with Tracer() as t:
+        k = ElemwiseKernel(context, "float *a", "a[i] = 0")
+        k(pygpu.empty((10,), dtype='float32', context=context))
+    names = [ev['name'] for ev in t.events if ev['cat'] == 'compile']
+    assert len(names) >= 1
+    # Kernels can compile lazily on the first call
+    launches = [ev['name'] for ev in t.events if ev['cat'] == 'launch']
+    assert set(launches) <= set(names)
@@ -0,0 +1,125 @@
+import collections
+import threading
+
+import numpy
+
+from .gpuarray import get_default_context, _set_timing_listener
+
+
+class KernelStats(object):
+    """
+    KernelStats(window=1000)
+
+    Statistics of the device time of timed kernel launches, by kernel
+    name.
+
+    The count, total and minimum cover every launch since the last
+    :meth:`reset`.  The percentiles only cover the last `window`
+    launches of each kernel.
+    """
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        "Forget all the launches."
+        with self._lock:
+            self._stats = {}
+
+    def add(self, name, t):
+        "Add a launch of kernel `name` that took `t` seconds."
+        with self._lock:
+            st = self._stats.get(name)
+            if st is None:
+                st = [0, 0.0, t, collections.deque(maxlen=self.window)]
+                self._stats[name] = st
+            st[0] += 1
+            st[1] += t
+            st[2] = min(st[2], t)
+            st[3].append(t)
+
+    def table(self):
+        """
+        table()
+
+        Return a dict that maps each kernel name to a dict with the
+        `count`, `total`, `min`, `p50` and `p99` of its launch times in
+        seconds.
+        """
+        res = {}
+        with self._lock:
+            for name, (count, total, tmin, recent) in self._stats.items():
+                p50, p99 = numpy.percentile(list(recent), [50, 99])
+                res[name] = dict(count=count, total=total, min=tmin,
+                                 p50=float(p50), p99=float(p99))
+        return res
+
+    def __str__(self):
+        lines = ["%-32s %8s %12s %12s %12s %12s" %
+                 ("kernel", "count", "total (ms)", "min (ms)", "p50 (ms)",
+                  "p99 (ms)")]
+        tab = self.table()
+        for name in sorted(tab, key=lambda n: -tab[n]['total']):
+            st = tab[name]
+            lines.append("%-32s %8d %12.3f %12.3f %12.3f %12.3f" %
+                         (name, st['count'], st['total'] * 1e3,
+                          st['min'] * 1e3, st['p50'] * 1e3,
+                          st['p99'] * 1e3))
+        return "\n".join(lines)
+
+
+#: Statistics of all the timed launches
+kernel_stats = KernelStats()
+
+_timers = []
+
+
+class Timer(object):
+    """
+    Timer(context=None)
+
+    Time all the kernel launches on `context` (the default context if
+    None) on the device while active::
+
+        with Timer(ctx) as t:
+            ...
+        print(t.elapsed)
+
+    `elapsed` is the total device time of the launches in seconds and
+    `launches` the list of `(name, time)` of each launch.  As with
+    :attr:`GpuContext.timing`, the launches become synchronous.
+    """
+    def __init__(self, context=None):
+        if context is None:
+            context = get_default_context()
+        if context is None:
+            raise TypeError("No context specified.")
+        self.context = context
+        self.elapsed = 0.0
+        self.launches = []
+        self._prev = False
+
+    def __enter__(self):
+        self._prev = self.context.timing
+        self.context.timing = True
+        _timers.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _timers.remove(self)
+        self.context.timing = self._prev
+
+    def add(self, name, t):
+        "Add a launch of kernel `name` that took `t` seconds."
+        self.elapsed += t
+        self.launches.append((name, t))
+
+
+def _on_timed_launch(context, name, t):
+    kernel_stats.add(name, t)
+    for tm in _timers:
+        if tm.context is context:
+            tm.add(name, t)
+
+_set_timing_listener(_on_timed_launch)
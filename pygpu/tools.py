@@ -6,7 +6,7 @@ from operator import itemgetter, mul
 
 import numpy
 from dtypes import dtype_to_ctype, _fill_dtype_registry
-from gpuarray import GpuArray
+from gpuarray import GpuArray, GpuContext
 
 _fill_dtype_registry(respect_windows=False)
 
@@ -179,6 +179,10 @@ class Counter(dict):
     def __missing__(self, key):
         return 0
 
+# Every function wrapped by lfu_cache() or owned_lfu_cache(), for the
+# memory hits reported by pygpu.compilation
+_caches = []
+
 def lfu_cache(maxsize=20):
     def decorating_function(user_function):
         cache = {}
@@ -221,6 +225,60 @@ def lfu_cache(maxsize=20):
         wrapper.maxsize = maxsize
         wrapper.clear = clear
         wrapper.get = get
+        _caches.append(wrapper)
+        return wrapper
+    return decorating_function
+
+def _owner_caches(owner):
+    if isinstance(owner, GpuContext):
+        return owner.kernel_cache
+    return owner.__dict__.setdefault('_lfu_caches', {})
+
+def owned_lfu_cache(maxsize=20):
+    """
+    Like lfu_cache() but with a separate cache for each value of the
+    first argument, kept on it: in the `kernel_cache` of a GpuContext
+    or in the instance for methods.  The results usually reference the
+    context, so a module-level cache would keep it alive forever.
+    """
+    def decorating_function(user_function):
+        @functools.wraps(user_function)
+        def wrapper(owner, *key):
+            caches = _owner_caches(owner)
+            entry = caches.get(wrapper)
+            if entry is None or entry[0] != wrapper.generation:
+                entry = (wrapper.generation, {}, Counter())
+                caches[wrapper] = entry
+            _, cache, use_count = entry
+            use_count[key] += 1
+
+            try:
+                result = cache[key]
+                wrapper.hits += 1
+            except KeyError:
+                result = user_function(owner, *key)
+                cache[key] = result
+                wrapper.misses += 1
+
+                # purge least frequently used cache entry
+                if len(cache) > wrapper.maxsize:
+                    for key, _ in nsmallest(maxsize // 10,
+                                            use_count.iteritems(),
+                                            key=itemgetter(1)):
+                        del cache[key], use_count[key]
+
+            return result
+
+        def clear():
+            # The caches of the owners are dropped on their next use
+            wrapper.generation += 1
+            wrapper.hits = wrapper.misses = 0
+
+        wrapper.hits = wrapper.misses = 0
+        wrapper.generation = 0
+        wrapper.maxsize = maxsize
+        wrapper.clear = clear
+        _caches.append(wrapper)
         return wrapper
     return decorating_function
 
@@ -0,0 +1,125 @@
+import atexit
+import json
+import os
+import threading
+from timeit import default_timer
+
+from .gpuarray import GpuArray, _set_tracer
+
+
+def _describe(arg):
+    if isinstance(arg, GpuArray):
+        return "%s%s" % (arg.dtype, list(arg.shape))
+    return repr(arg)
+
+
+class Tracer(object):
+    """
+    Tracer(path=None, sync=False)
+
+    Record the kernel compilations, launches and the copies done by
+    pygpu while it is active.
+
+    Use it as a context manager::
+
+        with Tracer('trace.json') as t:
+            ...
+        print(t.totals())
+
+    The trace is saved to `path` (if not None) on exit in the Chrome
+    trace format, which can be loaded in chrome://tracing or
+    Perfetto.
+
+    The durations are measured with the host clock.  Launches and
+    most copies are asynchronous, so they only measure the time to
+    queue the operation unless `sync` is True.  In that case the
+    arrays involved are synchronized before taking the end time, which
+    gives the device time at the cost of serializing everything.
+    Launches timed on the device (see :attr:`GpuContext.timing`) also
+    have their device time in the `device_time` argument of the event.
+
+    Setting the GPUARRAY_TRACE environment variable to a file name
+    traces the whole program and saves the trace there at exit.
+    Setting GPUARRAY_TRACE_SYNC to 1 turns on `sync` for it.
+    """
+    def __init__(self, path=None, sync=False):
+        self.path = path
+        self.sync = sync
+        self.events = []
+        self._start = default_timer()
+        self._prev = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._prev = _set_tracer(self)
+        return self
+
+    def __exit__(self, *exc):
+        _set_tracer(self._prev)
+        self._prev = None
+        if self.path is not None:
+            self.save(self.path)
+
+    def start(self):
+        "Return the start time of an operation."
+        return default_timer()
+
+    def record(self, cat, name, start, arrays, args):
+        """
+        record(cat, name, start, arrays, args)
+
+        Add an event that started at `start` (from :meth:`start`) and
+        ends now.  `arrays` are the arguments of the operation, used
+        for synchronization and described in the event.  `args` is a
+        dict of extra information to show.
+        """
+        if self.sync:
+            for a in arrays:
+                if isinstance(a, GpuArray):
+                    a.sync()
+        end = default_timer()
+        if arrays:
+            args['arrays'] = [_describe(a) for a in arrays]
+        ev = dict(name=name, cat=cat, ph='X',
+                  ts=(start - self._start) * 1e6,
+                  dur=(end - start) * 1e6,
+                  pid=os.getpid(), tid=threading.current_thread().ident,
+                  args=args)
+        with self._lock:
+            self.events.append(ev)
+
+    def totals(self):
+        """
+        totals()
+
+        Return a dict that maps each category (`compile`, `launch`,
+        `transfer` and `copy`) to the number of events and their total
+        duration in seconds.
+        """
+        res = {}
+        for ev in self.events:
+            n, t = res.get(ev['cat'], (0, 0.0))
+            res[ev['cat']] = (n + 1, t + ev['dur'] * 1e-6)
+        return res
+
+    def to_chrome(self):
+        "Return the trace as a Chrome trace object."
+        with self._lock:
+            events = list(self.events)
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def save(self, path):
+        "Write the trace to `path` in the Chrome trace format."
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome(), f)
+
+
+def _trace_from_env():
+    path = os.environ.get('GPUARRAY_TRACE')
+    if not path:
+        return
+    t = Tracer(path, sync=os.environ.get('GPUARRAY_TRACE_SYNC') == '1')
+    t.__enter__()
+    atexit.register(t.__exit__)
+
+_trace_from_env()
@@ -474,6 +474,52 @@ GPUARRAY_PUBLIC int GpuArray_write(GpuArray *dst, const void *src,
 GPUARRAY_PUBLIC int GpuArray_read(void *dst, size_t dst_sz,
                                  const GpuArray *src);
 
+/**
+ * Start copying data from the host memory to the device memory.
+ *
+ * Returns as soon as the copy is queued, `src` must stay valid and
+ * unmodified until GpuArray_done() or GpuArray_sync() report that
+ * the copy is finished.
+ *
+ * \param dst destination array (must be contiguous)
+ * \param src source host memory (contiguous block)
+ * \param src_sz size of data to copy (in bytes)
+ *
+ * \return GA_NO_ERROR if the operation was succesful.
+ * \return an error code otherwise
+ */
+GPUARRAY_PUBLIC int GpuArray_write_async(GpuArray *dst, const void *src,
+                                        size_t src_sz);
+
+/**
+ * Start copying data from the device memory to the host memory.
+ *
+ * Returns as soon as the copy is queued, the contents of `dst` are
+ * undefined until GpuArray_done() or GpuArray_sync() report that the
+ * copy is finished.
+ *
+ * \param dst dstination host memory (contiguous block)
+ * \param dst_sz size of data to copy (in bytes)
+ * \param src source array (must be contiguous)
+ *
+ * \return GA_NO_ERROR if the operation was succesful.
+ * \return an error code otherwise
+ */
+GPUARRAY_PUBLIC int GpuArray_read_async(void *dst, size_t dst_sz,
+                                       const GpuArray *src);
+
+/**
+ * Checks if all operations involving `a` are finished, without
+ * blocking.
+ *
+ * \param a the array to check
+ * \param ret error return pointer
+ *
+ * \returns 1 if done, 0 if not and -1 on error (with the code in
+ * `ret` if not NULL).
+ */
+GPUARRAY_PUBLIC int GpuArray_done(const GpuArray *a, int *ret);
+
 /**
  * Set all of an array's data to a byte pattern.
  *
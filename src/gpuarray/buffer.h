@@ -84,6 +84,17 @@ typedef struct _gpuarray_buffer_ops {
  */
 #define GA_CTX_SINGLE_THREAD 0x2
 
+/**
+ * Keep released buffers in a per-context cache and reuse them for
+ * later allocations of a similar size instead of going back to the
+ * driver allocator.
+ *
+ * Buffers are grouped in size classes (4 per power of 2, so at most
+ * 25% is wasted) and the total size kept in the cache can be capped
+ * with #GA_CTX_PROP_POOL_LIMIT.
+ */
+#define GA_CTX_MEM_POOL      0x4
+
 /**
  * @}
  */
@@ -174,7 +185,17 @@ typedef struct _gpuarray_buffer_ops {
  */
 #define GA_BUFFER_HOST       0x08
 
-/*#define GA_BUFFER_USE_DATA   0x10*/
+/**
+ * Use the user-supplied host buffer (`data`) as the storage for the
+ * buffer instead of allocating device memory.  The host buffer must
+ * stay valid and at least `sz` large until the buffer is released.
+ *
+ * This avoids a copy on devices that share memory with the host.
+ * Backends that can't map host memory fail with GA_DEVSUP_ERROR.
+ * The host buffer contents may not reflect device writes until they
+ * are read back with buffer_read().
+ */
+#define GA_BUFFER_USE_DATA   0x10
 
 /**
  * @}
@@ -458,6 +479,83 @@ typedef struct _gpuarray_buffer_ops {
    * \returns string description of the last error
    */
   const char *(*ctx_error)(void *ctx);
+
+  /**
+   * Set a context property.
+   *
+   * Only the properties documented as settable in \ref props
+   * "Properties" can be used here.
+   *
+   * \param ctx context
+   * \param prop_id property id (from \ref props "Properties")
+   * \param val pointer to the new value of the appropriate type
+   *
+   * \returns GA_NO_ERROR or an error code if an error occurred.
+   */
+  int (*ctx_set_property)(void *ctx, int prop_id, const void *val);
+
+  /**
+   * Start a copy from host memory to a buffer.
+   *
+   * Same as buffer_write() except that this returns as soon as the
+   * copy is queued.  Later operations on the buffer are ordered after
+   * it.  The host memory must not be modified or freed until
+   * buffer_done() reports completion or buffer_sync() returns.
+   *
+   * \param dst destination buffer
+   * \param dstoff offset inside the destination buffer
+   * \param src source data in host memory
+   * \param sz size of data to copy (in bytes)
+   *
+   * \returns GA_NO_ERROR or an error code if an error occurred.
+   */
+  int (*buffer_write_async)(gpudata *dst, size_t dstoff, const void *src,
+                            size_t sz);
+
+  /**
+   * Start a copy from a buffer to host memory.
+   *
+   * Same as buffer_read() except that this returns as soon as the
+   * copy is queued.  The host memory contents are undefined until
+   * buffer_done() reports completion or buffer_sync() returns.
+   *
+   * \param dst destination host memory
+   * \param src source buffer
+   * \param srcoff offset inside the source buffer
+   * \param sz size of data to copy (in bytes)
+   *
+   * \returns GA_NO_ERROR or an error code if an error occurred.
+   */
+  int (*buffer_read_async)(void *dst, gpudata *src, size_t srcoff, size_t sz);
+
+  /**
+   * Check if the operations pending on a buffer are finished.
+   *
+   * This is the non-blocking version of buffer_sync().
+   *
+   * \param b buffer
+   * \param ret error return pointer
+   *
+   * \retval 1 All operations are done
+   * \retval 0 Some operations are still running
+   * \retval -1 An error was encoutered, `ret` contains a detailed
+   * error code if not NULL.
+   */
+  int (*buffer_done)(gpudata *b, int *ret);
+
+  /**
+   * Set a buffer property.
+   *
+   * Only the properties documented as settable in \ref props
+   * "Properties" can be used here.
+   *
+   * \param buf buffer
+   * \param prop_id property id (from \ref props "Properties")
+   * \param val pointer to the new value of the appropriate type
+   *
+   * \returns GA_NO_ERROR or an error code if an error occurred.
+   */
+  int (*buffer_set_property)(gpudata *buf, int prop_id, const void *val);
 } gpuarray_buffer_ops;
 
 /**
@@ -527,6 +625,296 @@ typedef struct _gpuarray_buffer_ops {
  */
 #define GA_CTX_PROP_BIN_ID    7
 
+/**
+ * Maximum number of bytes kept in the buffer cache of a context
+ * created with #GA_CTX_MEM_POOL.  Released buffers that would go over
+ * the limit are freed instead.  Defaults to no limit.
+ *
+ * Settable, lowering it releases cached buffers to fit.
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_POOL_LIMIT 8
+
+/**
+ * Number of bytes currently held in the buffer cache.
+ *
+ * Settable, the cache is trimmed down to the given size (so setting
+ * it to 0 empties the cache).  Setting a larger value has no effect.
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_POOL_CACHED 9
+
+/**
+ * Number of allocations served from the buffer cache.
+ *
+ * Settable (to reset the counter).
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_POOL_HITS 10
+
+/**
+ * Number of allocations that had to go to the driver allocator while
+ * the buffer cache was enabled.
+ *
+ * Settable (to reset the counter).
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_POOL_MISSES 11
+
+/**
+ * Number of bins in the allocation size histogram of
+ * ::gpuarray_mem_stats.
+ */
+#define GA_MEM_HIST_BINS 64
+
+/**
+ * Memory accounting for a context.
+ *
+ * Only the buffers allocated through buffer_alloc() are counted.
+ * Buffers kept in the cache of a #GA_CTX_MEM_POOL context are not
+ * live (see #GA_CTX_PROP_POOL_CACHED for those) and reusing one
+ * counts as an allocation.
+ */
+typedef struct _gpuarray_mem_stats {
+  /** Bytes held by live buffers */
+  size_t live_bytes;
+  /** Highest value of `live_bytes` since the last reset */
+  size_t peak_bytes;
+  /** Number of live buffers */
+  size_t live_buffers;
+  /** Number of allocations since the last reset */
+  size_t allocs;
+  /** Number of releases since the last reset */
+  size_t frees;
+  /**
+   * Allocations since the last reset by requested size, bin `i`
+   * counts sizes in [2**i, 2**(i+1)) (and bin 0 also has size 0).
+   */
+  size_t hist[GA_MEM_HIST_BINS];
+} gpuarray_mem_stats;
+
+/**
+ * Memory accounting for the context.
+ *
+ * Settable (the value is ignored), to reset the counters.  The peak
+ * goes back to the current live size.
+ *
+ * Type: `gpuarray_mem_stats`
+ */
+#define GA_CTX_PROP_MEM_STATS 12
+
+/**
+ * Function called when an allocation fails for lack of memory.  It
+ * should release whatever memory it can spare (caches, temporaries,
+ * ...).
+ *
+ * \param data the `data` member of the registration
+ */
+typedef void (*gpuarray_reclaim_fn)(void *data);
+
+/**
+ * Registration of a reclaim callback.
+ */
+typedef struct _gpuarray_reclaim {
+  /** Function to call */
+  gpuarray_reclaim_fn fn;
+  /** Argument for the function */
+  void *data;
+} gpuarray_reclaim;
+
+/**
+ * Add a reclaim callback to the context.
+ *
+ * When a device allocation fails for lack of memory, the context
+ * runs all of its callbacks in the order they were added, gives back
+ * its own cached memory to the driver and retries the allocation
+ * once.  The callbacks may release buffers of the context.
+ *
+ * Set only.  Fails with #GA_MEMORY_ERROR if there are too many
+ * callbacks.
+ *
+ * Type: `gpuarray_reclaim`
+ */
+#define GA_CTX_PROP_RECLAIM_ADD 13
+
+/**
+ * Remove a reclaim callback added with #GA_CTX_PROP_RECLAIM_ADD.
+ * Both `fn` and `data` must match.
+ *
+ * Set only.  Fails with #GA_VALUE_ERROR if there is no such callback.
+ *
+ * Type: `gpuarray_reclaim`
+ */
+#define GA_CTX_PROP_RECLAIM_DEL 14
+
+/**
+ * Number of times an allocation had to be retried after running the
+ * reclaim callbacks.
+ *
+ * Settable (to reset the counter).
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_OOM_RETRIES 15
+
+/**
+ * Maximum number of bytes of device memory the buffers of the
+ * context should use.  When an allocation (or bringing back a
+ * spilled buffer) would go over, the least recently used buffers
+ * marked with #GA_BUFFER_PROP_SPILLABLE are copied to host memory
+ * and their device memory is released.  They are copied back on
+ * their next use.  Buffers that are not spillable are allocated even
+ * if that goes over.
+ *
+ * Defaults to `(size_t)-1` which means no budget.  Settable, lowering
+ * it spills buffers to fit.  Only supported by CUDA.
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_MEM_BUDGET 16
+
+/**
+ * Number of bytes of the buffers that are currently spilled to host
+ * memory.
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_SPILLED 17
+
+/**
+ * Number of times a buffer was spilled to host memory.
+ *
+ * Settable (to reset the counter).
+ *
+ * Type: `size_t`
+ */
+#define GA_CTX_PROP_SPILLS 18
+
+/**
+ * Kinds of calls recorded by the "null" backend.
+ */
+typedef enum _gpuarray_call_kind {
+  /** buffer_alloc() */
+  GA_CALL_ALLOC = 0,
+  /** Last release of a buffer */
+  GA_CALL_FREE,
+  /** buffer_move() */
+  GA_CALL_MOVE,
+  /** buffer_read() and buffer_read_async() */
+  GA_CALL_READ,
+  /** buffer_write() and buffer_write_async() */
+  GA_CALL_WRITE,
+  /** buffer_memset() */
+  GA_CALL_MEMSET,
+  /** kernel_alloc() */
+  GA_CALL_COMPILE,
+  /** kernel_call() */
+  GA_CALL_LAUNCH,
+  /** buffer_sync() */
+  GA_CALL_SYNC,
+  /** buffer_extcopy() */
+  GA_CALL_EXTCOPY,
+  /** buffer_transfer() */
+  GA_CALL_TRANSFER,
+  /** Number of kinds */
+  GA_CALL_KINDS
+} gpuarray_call_kind;
+
+/**
+ * One call recorded by the "null" backend.
+ */
+typedef struct _gpuarray_call_record {
+  /** What was called (a gpuarray_call_kind) */
+  int kind;
+  /**
+   * Bytes allocated, copied or set.  Size of the source for
+   * compiles.
+   */
+  size_t bytes;
+  /** Work items of a launch, elements of an extcopy */
+  size_t items;
+  /** Simulated duration in seconds */
+  double time;
+} gpuarray_call_record;
+
+/**
+ * Calls recorded by the "null" backend since the last reset.
+ */
+typedef struct _gpuarray_call_stats {
+  /** Number of calls of each kind */
+  size_t calls[GA_CALL_KINDS];
+  /** Bytes of each kind of call (see gpuarray_call_record) */
+  size_t bytes[GA_CALL_KINDS];
+  /** Total simulated time in seconds */
+  double time;
+  /**
+   * The calls in order, only the first `log_max` (see
+   * gpuarray_null_config) are kept.  This is valid until the next
+   * call on the context.
+   */
+  const gpuarray_call_record *log;
+  /** Number of entries in `log` */
+  size_t nlog;
+} gpuarray_call_stats;
+
+/**
+ * Calls made on a context of the "null" backend.
+ *
+ * Settable (the value is ignored), to reset the counters and the
+ * log.  Only supported by the "null" backend.
+ *
+ * Type: `gpuarray_call_stats`
+ */
+#define GA_CTX_PROP_CALL_STATS 19
+
+/**
+ * Cost model of the "null" backend.  Times are in seconds and
+ * bandwidths in bytes per second, a bandwidth of 0 is infinite.
+ */
+typedef struct _gpuarray_null_config {
+  /** Time for a kernel launch or an extcopy */
+  double launch_latency;
+  /** Time per work item of a kernel launch */
+  double item_time;
+  /** Time for a transfer between the host and the device */
+  double transfer_latency;
+  /** Bandwidth between the host and the device */
+  double bandwidth;
+  /** Bandwidth of moves, memsets and extcopies on the device */
+  double device_bandwidth;
+  /** Maximum number of calls kept in the log */
+  size_t log_max;
+  /** If not 0, calls wait for their simulated time */
+  int realtime;
+} gpuarray_null_config;
+
+/**
+ * Cost model of a context of the "null" backend.  All the costs
+ * default to 0 and `log_max` to 4096.
+ *
+ * Settable.  Only supported by the "null" backend.
+ *
+ * Type: `gpuarray_null_config`
+ */
+#define GA_CTX_PROP_NULL_CONFIG 20
+
+/**
+ * If not 0, kernel launches are timed on the device (see
+ * #GA_KERNEL_PROP_ELAPSED).  This adds a little overhead to each
+ * launch.  Defaults to 0.
+ *
+ * Settable.  OpenCL needs a device that supports profiling and
+ * switches the context to a new queue with profiling enabled (after
+ * waiting for the queued commands) the first time it is turned on.
+ *
+ * Type: `int`
+ */
+#define GA_CTX_PROP_TIMING 21
+
 /* Start at 512 for GA_BUFFER_PROP_ */
 /**
  * Get the context in which this buffer was allocated.
@@ -552,6 +940,30 @@ typedef struct _gpuarray_buffer_ops {
  */
 #define GA_BUFFER_PROP_SIZE  514
 
+/**
+ * Host pointer to the contents of a buffer allocated with
+ * #GA_BUFFER_HOST.
+ *
+ * The memory is accessible from both the host and the device, make
+ * sure that pending operations on the buffer are done (with
+ * buffer_sync) before touching it from the host.
+ *
+ * Type: `void *`
+ */
+#define GA_BUFFER_PROP_HOSTPOINTER 515
+
+/**
+ * Whether the buffer can be moved to host memory to respect the
+ * #GA_CTX_PROP_MEM_BUDGET of its context.
+ *
+ * Settable.  Buffers that don't own their device memory can't be
+ * made spillable.  Getting a raw device pointer to a buffer (with
+ * cuda_get_ptr() for example) makes it not spillable.
+ *
+ * Type: `int`
+ */
+#define GA_BUFFER_PROP_SPILLABLE 516
+
 /* Start at 1024 for GA_KERNEL_PROP_ */
 /**
  * Get the context for which this kernel was compiled.
@@ -593,6 +1005,16 @@ typedef struct _gpuarray_buffer_ops {
  */
 #define GA_KERNEL_PROP_TYPES     1028
 
+/**
+ * Device time in seconds of the last launch of this kernel made while
+ * #GA_CTX_PROP_TIMING was on.  Waits for that launch to finish.
+ *
+ * Returns GA_VALUE_ERROR if there is no such launch.
+ *
+ * Type: `double`
+ */
+#define GA_KERNEL_PROP_ELAPSED   1029
+
 /**
  * @}
  */
@@ -30,6 +30,18 @@ typedef struct _GpuKernel {
    * Argument buffer.
    */
   void **args;
+  /**
+   * Maximum local size of the kernel, fetched once at init.
+   */
+  size_t maxlsize;
+  /**
+   * Preferred local size multiple of the kernel, fetched once at init.
+   */
+  size_t preflsize;
+  /**
+   * Maximum group size of the context, fetched once at init.
+   */
+  size_t maxgsize;
 } GpuKernel;
 
 /**
@@ -651,6 +651,24 @@ int GpuArray_read(void *dst, size_t dst_sz, const GpuArray *src) {
   return src->ops->buffer_read(dst, src->data, src->offset, dst_sz);
 }
 
+int GpuArray_write_async(GpuArray *dst, const void *src, size_t src_sz) {
+  if (!GpuArray_ISWRITEABLE(dst))
+    return GA_VALUE_ERROR;
+  if (!GpuArray_ISONESEGMENT(dst))
+    return GA_UNSUPPORTED_ERROR;
+  return dst->ops->buffer_write_async(dst->data, dst->offset, src, src_sz);
+}
+
+int GpuArray_read_async(void *dst, size_t dst_sz, const GpuArray *src) {
+  if (!GpuArray_ISONESEGMENT(src))
+    return GA_UNSUPPORTED_ERROR;
+  return src->ops->buffer_read_async(dst, src->data, src->offset, dst_sz);
+}
+
+int GpuArray_done(const GpuArray *a, int *ret) {
+  return a->ops->buffer_done(a->data, ret);
+}
+
 int GpuArray_memset(GpuArray *a, int data) {
   if (!GpuArray_ISONESEGMENT(a))
     return GA_UNSUPPORTED_ERROR;
@@ -136,7 +136,8 @@ static void teardown(void *c) {
 #define FUNC_INIT		\
   cuda_enter(ctx);		\
   if (ctx->err != CUDA_SUCCESS) \
-    return GA_IMPL_ERROR
+    return GA_IMPL_ERROR;	\
+  cuda_new_op(ctx)
 
 #define FUNC_FINI cuda_exit(ctx)
 
@@ -146,7 +147,12 @@ static void teardown(void *c) {
     cuda_exit(ctx);				  \
     return GA_IMPL_ERROR;			  \
     }*/
-#define ARRAY_INIT(A)
+/* Bring back spilled buffers */
+#define ARRAY_INIT(A)				  \
+  if (cuda_use(ctx, (A)) != GA_NO_ERROR) {	  \
+    cuda_exit(ctx);				  \
+    return GA_IMPL_ERROR;			  \
+  }
 
 /*#define ARRAY_FINI(A) cuEventRecord((A)->ev, ctx->s)*/
 #define ARRAY_FINI(A)
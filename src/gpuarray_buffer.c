@@ -18,6 +18,10 @@ extern const gpuarray_buffer_ops cuda_ops;
 #ifdef WITH_OPENCL
 extern const gpuarray_buffer_ops opencl_ops;
 #endif
+#ifdef WITH_HOST
+extern const gpuarray_buffer_ops host_ops;
+#endif
+extern const gpuarray_buffer_ops null_ops;
 
 const gpuarray_buffer_ops *gpuarray_get_ops(const char *name) {
 #ifdef WITH_CUDA
@@ -26,6 +30,10 @@ const gpuarray_buffer_ops *gpuarray_get_ops(const char *name) {
 #ifdef WITH_OPENCL
   if (strcmp("opencl", name) == 0) return &opencl_ops;
 #endif
+#ifdef WITH_HOST
+  if (strcmp("host", name) == 0) return &host_ops;
+#endif
+  if (strcmp("null", name) == 0) return &null_ops;
   return NULL;
 }
 
@@ -52,6 +52,7 @@ static CUresult err;
 
 static void cuda_free(gpudata *);
 static void cuda_freekernel(gpukernel *);
+static void cuda_lru_remove(cuda_context *, gpudata *);
 static int cuda_property(void *, gpudata *, gpukernel *, int, void *);
 
 #define val_free(v) cuda_freekernel(*v);
@@ -69,6 +70,25 @@ void *cuda_make_ctx(CUcontext ctx, int flags) {
   res->blas_handle = NULL;
   res->refcnt = 1;
   res->flags = flags;
+  memset(res->pool, 0, sizeof(res->pool));
+  res->pool_cached = 0;
+  res->pool_limit = (size_t)-1;
+  res->pool_hits = 0;
+  res->pool_misses = 0;
+  res->stage = NULL;
+  memset(&res->mem, 0, sizeof(res->mem));
+  res->reclaim.n = 0;
+  res->oom_retries = 0;
+  res->deferred = NULL;
+  res->deferred_last = NULL;
+  res->budget = (size_t)-1;
+  res->resident = 0;
+  res->spilled = 0;
+  res->spills = 0;
+  res->lru_head = NULL;
+  res->lru_tail = NULL;
+  res->tick = 0;
+  res->timing = 0;
   if (detect_arch(res->bin_id)) {
     free(res);
     return NULL;
@@ -88,12 +108,74 @@ void *cuda_make_ctx(CUcontext ctx, int flags) {
   return res;
 }
 
+/*
+ * Release cached pool buffers, biggest first, until no more than
+ * `keep` bytes remain.  The context must be active.
+ */
+static void cuda_pool_trim(cuda_context *ctx, size_t keep) {
+  gpudata *d;
+  unsigned int i;
+
+  for (i = POOL_NBINS; i > 0 && ctx->pool_cached > keep; i--) {
+    while (ctx->pool[i-1] != NULL && ctx->pool_cached > keep) {
+      d = ctx->pool[i-1];
+      ctx->pool[i-1] = d->next;
+      ctx->pool_cached -= d->cap;
+      cuEventSynchronize(d->ev);
+      cuMemFree(d->ptr);
+      cuEventDestroy(d->ev);
+      CLEAR(d);
+      free(d);
+    }
+  }
+}
+
+/*
+ * Really free the released buffers whose last use on the device is
+ * done.  With `wait` block until all of them can be freed.  The
+ * events are all on the context stream so they complete in order and
+ * we can stop at the first one that isn't done.  The context must be
+ * active.
+ */
+static void cuda_reclaim(cuda_context *ctx, int wait) {
+  gpudata *d;
+
+  while ((d = ctx->deferred) != NULL) {
+    if (wait)
+      cuEventSynchronize(d->ev);
+    else if (cuEventQuery(d->ev) != CUDA_SUCCESS)
+      break;
+    ctx->deferred = d->next;
+    if (d->hostp != NULL)
+      cuMemFreeHost(d->hostp);
+    else
+      cuMemFree(d->ptr);
+    cuEventDestroy(d->ev);
+    CLEAR(d);
+    free(d);
+  }
+  if (ctx->deferred == NULL)
+    ctx->deferred_last = NULL;
+}
+
 static void cuda_free_ctx(cuda_context *ctx) {
   gpuarray_blas_ops *blas_ops;
 
   ASSERT_CTX(ctx);
   ctx->refcnt--;
   if (ctx->refcnt == 0) {
+    if (ctx->pool_cached != 0 || ctx->stage != NULL ||
+        ctx->deferred != NULL) {
+      cuda_enter(ctx);
+      cuda_reclaim(ctx, 1);
+      cuda_pool_trim(ctx, 0);
+      if (ctx->stage != NULL) {
+        cuEventDestroy(ctx->stage_ev[0]);
+        cuEventDestroy(ctx->stage_ev[1]);
+        cuMemFreeHost(ctx->stage);
+      }
+      cuda_exit(ctx);
+    }
     if (ctx->blas_handle != NULL) {
       ctx->err = cuda_property(ctx, NULL, NULL, GA_CTX_PROP_BLAS_OPS, &blas_ops);
       blas_ops->teardown(ctx);
@@ -157,8 +239,15 @@ gpudata *cuda_make_buf(void *c, CUdeviceptr p, size_t sz) {
       return NULL;
     }
     res->sz = sz;
+    res->cap = sz;
+    res->hostp = NULL;
     res->flags = DONTFREE;
     res->ctx = ctx;
+    res->next = NULL;
+    res->spill = NULL;
+    res->lru_prev = NULL;
+    res->lru_next = NULL;
+    res->tick = 0;
     ctx->refcnt++;
 
     cuda_exit(ctx);
@@ -166,7 +255,21 @@ gpudata *cuda_make_buf(void *c, CUdeviceptr p, size_t sz) {
     return res;
 }
 
-CUdeviceptr cuda_get_ptr(gpudata *g) { ASSERT_BUF(g); return g->ptr; }
+CUdeviceptr cuda_get_ptr(gpudata *g) {
+  ASSERT_BUF(g);
+  if (g->flags & SPILLABLE || g->spill != NULL) {
+    /* The pointer could be kept around, so it must not change */
+    cuda_enter(g->ctx);
+    cuda_new_op(g->ctx);
+    cuda_use(g->ctx, g);
+    cuda_exit(g->ctx);
+    if (g->spill == NULL) {
+      g->flags &= ~SPILLABLE;
+      cuda_lru_remove(g->ctx, g);
+    }
+  }
+  return g->ptr;
+}
 size_t cuda_get_sz(gpudata *g) { ASSERT_BUF(g); return g->sz; }
 
 #define FAIL(v, e) { if (ret) *ret = e; return v; }
@@ -305,6 +408,8 @@ static void *cuda_init(int ord, int flags, int *ret) {
       fl = CU_CTX_SCHED_SPIN;
     if (flags & GA_CTX_MULTI_THREAD)
       fl = CU_CTX_SCHED_YIELD;
+    /* Needed to map GA_BUFFER_HOST buffers on the device */
+    fl |= CU_CTX_MAP_HOST;
     err = cuCtxCreate(&ctx, fl, dev);
     CHKFAIL(NULL);
     res = cuda_make_ctx(ctx, 0);
@@ -322,64 +427,262 @@ static void cuda_deinit(void *c) {
   cuda_free_ctx((cuda_context *)c);
 }
 
+/*
+ * Give back as much memory as we can after a failed allocation.  Must
+ * be called with the context entered.
+ */
+static void cuda_oom_recover(cuda_context *ctx) {
+  ctx->oom_retries++;
+  /* Releasing buffers and kernels enters the context */
+  cuda_exit(ctx);
+  reclaim_run(&ctx->reclaim);
+  cache_clear(ctx->extcopy_cache);
+  cuda_enter(ctx);
+  /* This includes what the callbacks released */
+  cuda_reclaim(ctx, 1);
+  cuda_pool_trim(ctx, 0);
+}
+
+static void cuda_lru_remove(cuda_context *ctx, gpudata *b) {
+  if (b->lru_prev != NULL)
+    b->lru_prev->lru_next = b->lru_next;
+  else if (ctx->lru_head == b)
+    ctx->lru_head = b->lru_next;
+  if (b->lru_next != NULL)
+    b->lru_next->lru_prev = b->lru_prev;
+  else if (ctx->lru_tail == b)
+    ctx->lru_tail = b->lru_prev;
+  b->lru_prev = NULL;
+  b->lru_next = NULL;
+}
+
+static void cuda_lru_append(cuda_context *ctx, gpudata *b) {
+  b->lru_prev = ctx->lru_tail;
+  b->lru_next = NULL;
+  if (ctx->lru_tail != NULL)
+    ctx->lru_tail->lru_next = b;
+  else
+    ctx->lru_head = b;
+  ctx->lru_tail = b;
+}
+
+/*
+ * Copy the contents of a buffer to host memory and release its device
+ * memory.  The context must be active.
+ */
+static int cuda_spill(cuda_context *ctx, gpudata *b) {
+  void *h;
+
+  ctx->err = cuMemHostAlloc(&h, b->sz ? b->sz : 1, CU_MEMHOSTALLOC_PORTABLE);
+  if (ctx->err != CUDA_SUCCESS)
+    return GA_IMPL_ERROR;
+  /* Everything is on the context stream, this waits for all the
+     pending uses */
+  ctx->err = cuMemcpyDtoHAsync(h, b->ptr, b->sz, ctx->s);
+  if (ctx->err == CUDA_SUCCESS)
+    ctx->err = cuStreamSynchronize(ctx->s);
+  if (ctx->err != CUDA_SUCCESS) {
+    cuMemFreeHost(h);
+    return GA_IMPL_ERROR;
+  }
+  cuMemFree(b->ptr);
+  b->ptr = 0;
+  b->spill = h;
+  cuda_lru_remove(ctx, b);
+  ctx->resident -= b->cap;
+  ctx->spilled += b->cap;
+  ctx->spills++;
+  return GA_NO_ERROR;
+}
+
+/*
+ * Spill the least recently used buffers until `sz` more bytes fit in
+ * the budget.  Buffers used by the current operation are kept.  The
+ * context must be active.
+ */
+static void cuda_make_room(cuda_context *ctx, size_t sz) {
+  gpudata *b, *next;
+
+  if (ctx->budget == (size_t)-1 ||
+      ctx->resident + ctx->pool_cached + sz <= ctx->budget)
+    return;
+  /* Cached memory is cheaper to give up */
+  cuda_reclaim(ctx, 0);
+  cuda_pool_trim(ctx, 0);
+  for (b = ctx->lru_head; b != NULL && ctx->resident + sz > ctx->budget;
+       b = next) {
+    next = b->lru_next;
+    if (b->tick != ctx->tick)
+      cuda_spill(ctx, b);
+  }
+}
+
+/* Bring a spilled buffer back on the device */
+static int cuda_unspill(cuda_context *ctx, gpudata *b) {
+  CUdeviceptr p;
+
+  cuda_make_room(ctx, b->cap);
+  ctx->err = cuMemAlloc(&p, b->cap);
+  if (ctx->err == CUDA_ERROR_OUT_OF_MEMORY) {
+    cuda_oom_recover(ctx);
+    ctx->err = cuMemAlloc(&p, b->cap);
+  }
+  if (ctx->err != CUDA_SUCCESS)
+    return GA_IMPL_ERROR;
+  if (b->sz != 0) {
+    ctx->err = cuMemcpyHtoD(p, b->spill, b->sz);
+    if (ctx->err != CUDA_SUCCESS) {
+      cuMemFree(p);
+      return GA_IMPL_ERROR;
+    }
+  }
+  cuMemFreeHost(b->spill);
+  b->spill = NULL;
+  b->ptr = p;
+  ctx->spilled -= b->cap;
+  ctx->resident += b->cap;
+  cuda_lru_append(ctx, b);
+  return GA_NO_ERROR;
+}
+
+int cuda_use(cuda_context *ctx, gpudata *b) {
+  b->tick = ctx->tick;
+  if (b->spill != NULL)
+    return cuda_unspill(ctx, b);
+  if (b->flags & SPILLABLE && ctx->lru_tail != b) {
+    cuda_lru_remove(ctx, b);
+    cuda_lru_append(ctx, b);
+  }
+  return GA_NO_ERROR;
+}
+
 static gpudata *cuda_alloc(void *c, size_t size, void *data, int flags,
 			   int *ret) {
-    gpudata *res;
+    gpudata *res = NULL;
     cuda_context *ctx = (cuda_context *)c;
     int fl = CU_EVENT_DISABLE_TIMING;
+    size_t asize = size;
+    unsigned int bin;
 
     if ((flags & GA_BUFFER_INIT) && data == NULL) FAIL(NULL, GA_VALUE_ERROR);
     if ((flags & (GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY)) ==
 	(GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY)) FAIL(NULL, GA_VALUE_ERROR);
+    if ((flags & GA_BUFFER_USE_DATA) &&
+        (data == NULL || size == 0 ||
+         (flags & (GA_BUFFER_INIT|GA_BUFFER_HOST))))
+      FAIL(NULL, GA_VALUE_ERROR);
 
-    /* TODO: figure out how to make this work */
-    if (flags & GA_BUFFER_HOST) FAIL(NULL, GA_DEVSUP_ERROR);
+    cuda_enter(ctx);
+    if (ctx->err != CUDA_SUCCESS)
+      FAIL(NULL, GA_IMPL_ERROR);
 
-    res = malloc(sizeof(*res));
-    if (res == NULL) FAIL(NULL, GA_SYS_ERROR);
-    res->refcnt = 1;
+    if (ctx->deferred != NULL)
+      cuda_reclaim(ctx, 0);
 
-    res->sz = size;
-    res->flags = flags & (GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY);
+    if (!(flags & (GA_BUFFER_HOST|GA_BUFFER_USE_DATA))) {
+      cuda_new_op(ctx);
+      cuda_make_room(ctx, size);
+    }
 
-    cuda_enter(ctx);
-    if (ctx->err != CUDA_SUCCESS) {
-      free(res);
-      FAIL(NULL, GA_IMPL_ERROR);
+    if ((ctx->flags & GA_CTX_MEM_POOL) &&
+        !(flags & (GA_BUFFER_HOST|GA_BUFFER_USE_DATA))) {
+      bin = pool_bin(size, &asize);
+      if (bin < POOL_NBINS && ctx->pool[bin] != NULL) {
+        /* The event recorded on release orders us after its last use */
+        res = ctx->pool[bin];
+        ctx->pool[bin] = res->next;
+        ctx->pool_cached -= res->cap;
+        ctx->pool_hits++;
+      } else {
+        ctx->pool_misses++;
+      }
     }
 
-    if (ctx->flags & GA_CTX_MULTI_THREAD)
-      fl |= CU_EVENT_BLOCKING_SYNC;
-    ctx->err = cuEventCreate(&res->ev, fl);
+    if (res == NULL) {
+      res = malloc(sizeof(*res));
+      if (res == NULL) {
+        cuda_exit(ctx);
+        FAIL(NULL, GA_SYS_ERROR);
+      }
 
-    if (ctx->err != CUDA_SUCCESS) {
-      free(res);
-      cuda_exit(ctx);
-      FAIL(NULL, GA_IMPL_ERROR);
-    }
+      if (ctx->flags & GA_CTX_MULTI_THREAD)
+        fl |= CU_EVENT_BLOCKING_SYNC;
+      ctx->err = cuEventCreate(&res->ev, fl);
 
-    if (size == 0) size = 1;
+      if (ctx->err != CUDA_SUCCESS) {
+        free(res);
+        cuda_exit(ctx);
+        FAIL(NULL, GA_IMPL_ERROR);
+      }
 
-    ctx->err = cuMemAlloc(&res->ptr, size);
-    if (ctx->err != CUDA_SUCCESS) {
+      if (asize == 0) asize = 1;
+
+      res->hostp = NULL;
+      if (flags & GA_BUFFER_HOST) {
+        /* Page-locked and mapped in the device address space */
+        ctx->err = cuMemHostAlloc(&res->hostp, asize,
+                                  CU_MEMHOSTALLOC_PORTABLE|
+                                  CU_MEMHOSTALLOC_DEVICEMAP);
+        if (ctx->err == CUDA_SUCCESS) {
+          ctx->err = cuMemHostGetDevicePointer(&res->ptr, res->hostp, 0);
+          if (ctx->err != CUDA_SUCCESS)
+            cuMemFreeHost(res->hostp);
+        }
+      } else if (flags & GA_BUFFER_USE_DATA) {
+        /* Pin the user memory and map it in the device address space */
+        ctx->err = cuMemHostRegister(data, size,
+                                     CU_MEMHOSTREGISTER_PORTABLE|
+                                     CU_MEMHOSTREGISTER_DEVICEMAP);
+        if (ctx->err == CUDA_SUCCESS) {
+          res->hostp = data;
+          ctx->err = cuMemHostGetDevicePointer(&res->ptr, data, 0);
+          if (ctx->err != CUDA_SUCCESS)
+            cuMemHostUnregister(data);
+        }
+      } else {
+        ctx->err = cuMemAlloc(&res->ptr, asize);
+        if (ctx->err == CUDA_ERROR_OUT_OF_MEMORY) {
+          cuda_oom_recover(ctx);
+          ctx->err = cuMemAlloc(&res->ptr, asize);
+        }
+      }
+      if (ctx->err != CUDA_SUCCESS) {
         cuEventDestroy(res->ev);
         free(res);
         cuda_exit(ctx);
         FAIL(NULL, GA_IMPL_ERROR);
+      }
+      res->cap = asize;
     }
+    res->refcnt = 1;
+    res->sz = size;
+    res->flags = flags & (GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY);
+    if (flags & GA_BUFFER_USE_DATA)
+      res->flags |= REGISTERED;
+    res->next = NULL;
+    res->spill = NULL;
+    res->lru_prev = NULL;
+    res->lru_next = NULL;
+    res->tick = ctx->tick;
     res->ctx = ctx;
     ctx->refcnt++;
+    if (res->hostp == NULL)
+      ctx->resident += res->cap;
+    mem_stats_alloc(&ctx->mem, size, res->cap);
+    TAG_BUF(res);
 
-    if (flags & GA_BUFFER_INIT) {
+    if ((flags & GA_BUFFER_INIT) && res->hostp != NULL) {
+      memcpy(res->hostp, data, size);
+    } else if (flags & GA_BUFFER_INIT) {
       ctx->err = cuMemcpyHtoD(res->ptr, data, size);
       if (ctx->err != CUDA_SUCCESS) {
+        cuda_exit(ctx);
 	cuda_free(res);
 	FAIL(NULL, GA_IMPL_ERROR)
       }
     }
 
     cuda_exit(ctx);
-    TAG_BUF(res);
     return res;
 }
 
@@ -389,22 +692,77 @@ static void cuda_retain(gpudata *d) {
 }
 
 static void cuda_free(gpudata *d) {
+  cuda_context *ctx;
+  size_t rounded;
+  unsigned int bin;
+
   /* We ignore errors on free */
   ASSERT_BUF(d);
   d->refcnt--;
   if (d->refcnt == 0) {
-    cuda_enter(d->ctx);
-    /*
-     * From testing, I have discovered that cuMemFree() will just
-     * block until nothing uses the region on the GPU.  Since this is
-     * not documented behavior, we will emulate that here.
-     */
-    cuEventSynchronize(d->ev);
+    ctx = d->ctx;
     if (!(d->flags & DONTFREE))
-      cuMemFree(d->ptr);
+      mem_stats_free(&ctx->mem, d->cap);
+    cuda_enter(ctx);
+    if (d->spill != NULL) {
+      /* No device memory to give back */
+      cuMemFreeHost(d->spill);
+      ctx->spilled -= d->cap;
+      cuEventDestroy(d->ev);
+      cuda_exit(ctx);
+      cuda_free_ctx(ctx);
+      CLEAR(d);
+      free(d);
+      return;
+    }
+    if (!(d->flags & DONTFREE) && d->hostp == NULL) {
+      ctx->resident -= d->cap;
+      cuda_lru_remove(ctx, d);
+    }
+    if ((ctx->flags & GA_CTX_MEM_POOL) && !(d->flags & DONTFREE) &&
+        d->hostp == NULL && d->cap <= ctx->pool_limit - ctx->pool_cached &&
+        (bin = pool_bin(d->cap, &rounded)) < POOL_NBINS &&
+        rounded == d->cap) {
+      /* Keep the buffer around, the event marks the end of its last use */
+      cuEventRecord(d->ev, ctx->s);
+      d->next = ctx->pool[bin];
+      ctx->pool[bin] = d;
+      ctx->pool_cached += d->cap;
+      cuda_exit(ctx);
+      /* Cached buffers don't keep the context alive */
+      cuda_free_ctx(ctx);
+      return;
+    }
+    if (!(d->flags & (DONTFREE|REGISTERED))) {
+      /*
+       * The region must not be freed while the device still uses it.
+       * Rather than waiting here, park the buffer until the work
+       * queued so far is done and free it on a later call.
+       */
+      cuEventRecord(d->ev, ctx->s);
+      d->next = NULL;
+      if (ctx->deferred_last != NULL)
+        ctx->deferred_last->next = d;
+      else
+        ctx->deferred = d;
+      ctx->deferred_last = d;
+      cuda_reclaim(ctx, 0);
+      cuda_exit(ctx);
+      /* Deferred buffers don't keep the context alive */
+      cuda_free_ctx(ctx);
+      return;
+    }
+    /* The memory isn't ours, so its owner may free it when we return */
+    if (d->flags & REGISTERED) {
+      cuEventRecord(d->ev, ctx->s);
+      cuEventSynchronize(d->ev);
+      cuMemHostUnregister(d->hostp);
+    } else {
+      cuEventSynchronize(d->ev);
+    }
     cuEventDestroy(d->ev);
-    cuda_exit(d->ctx);
-    cuda_free_ctx(d->ctx);
+    cuda_exit(ctx);
+    cuda_free_ctx(ctx);
     CLEAR(d);
     free(d);
   }
@@ -413,6 +771,9 @@ static void cuda_free(gpudata *d) {
 static int cuda_share(gpudata *a, gpudata *b, int *ret) {
   ASSERT_BUF(a);
   ASSERT_BUF(b);
+  /* Spilled buffers have no device address but never overlap */
+  if (a->spill != NULL || b->spill != NULL)
+    return a == b;
   return (a->ctx == b->ctx && a->sz != 0 && b->sz != 0 &&
           ((a->ptr <= b->ptr && a->ptr + a->sz > b->ptr) ||
            (b->ptr <= a->ptr && b->ptr + b->sz > a->ptr)));
@@ -435,6 +796,13 @@ static int cuda_move(gpudata *dst, size_t dstoff, gpudata *src,
     if (ctx->err != CUDA_SUCCESS)
       return GA_IMPL_ERROR;
 
+    cuda_new_op(ctx);
+    if (cuda_use(ctx, dst) != GA_NO_ERROR ||
+        cuda_use(ctx, src) != GA_NO_ERROR) {
+      cuda_exit(ctx);
+      return GA_IMPL_ERROR;
+    }
+
     ctx->err = cuMemcpyDtoDAsync(dst->ptr + dstoff, src->ptr + srcoff, sz,
                                  ctx->s);
     if (ctx->err != CUDA_SUCCESS) {
@@ -445,6 +813,102 @@ static int cuda_move(gpudata *dst, size_t dstoff, gpudata *src,
     return res;
 }
 
+/*
+ * Pageable host memory has to be copied to a pinned buffer by the
+ * driver before going over the bus.  For big transfers we do that
+ * ourselves in chunks, with two halves of a pinned buffer, so that
+ * the host copy of one chunk overlaps with the DMA of the next.
+ */
+static int cuda_stage_init(cuda_context *ctx) {
+  int fl = CU_EVENT_DISABLE_TIMING;
+
+  if (ctx->stage != NULL) return 0;
+
+  if (ctx->flags & GA_CTX_MULTI_THREAD)
+    fl |= CU_EVENT_BLOCKING_SYNC;
+  if (cuEventCreate(&ctx->stage_ev[0], fl) != CUDA_SUCCESS)
+    return -1;
+  if (cuEventCreate(&ctx->stage_ev[1], fl) != CUDA_SUCCESS) {
+    cuEventDestroy(ctx->stage_ev[0]);
+    return -1;
+  }
+  if (cuMemHostAlloc(&ctx->stage, 2 * STAGE_CHUNK, 0) != CUDA_SUCCESS) {
+    cuEventDestroy(ctx->stage_ev[0]);
+    cuEventDestroy(ctx->stage_ev[1]);
+    ctx->stage = NULL;
+    return -1;
+  }
+  return 0;
+}
+
+static int cuda_use_stage(cuda_context *ctx, const void *p, size_t sz) {
+  CUmemorytype t;
+
+  if (sz < STAGE_MIN)
+    return 0;
+  /* This fails for pageable memory */
+  if (cuPointerGetAttribute(&t, CU_POINTER_ATTRIBUTE_MEMORY_TYPE,
+                            (CUdeviceptr)p) == CUDA_SUCCESS)
+    return 0;
+  return cuda_stage_init(ctx) == 0;
+}
+
+static CUresult cuda_staged_read(cuda_context *ctx, char *dst,
+                                 CUdeviceptr src, size_t sz) {
+  char *stage = (char *)ctx->stage;
+  size_t off = 0, n, prev_n = 0;
+  unsigned int i;
+  CUresult r;
+
+  for (i = 0; off < sz; i++) {
+    n = sz - off < STAGE_CHUNK ? sz - off : STAGE_CHUNK;
+    r = cuMemcpyDtoHAsync(stage + (i & 1) * STAGE_CHUNK, src + off, n,
+                          ctx->s);
+    if (r != CUDA_SUCCESS) return r;
+    r = cuEventRecord(ctx->stage_ev[i & 1], ctx->s);
+    if (r != CUDA_SUCCESS) return r;
+    if (i > 0) {
+      /* Drain the previous chunk while this one is in flight */
+      r = cuEventSynchronize(ctx->stage_ev[(i - 1) & 1]);
+      if (r != CUDA_SUCCESS) return r;
+      memcpy(dst + off - prev_n, stage + ((i - 1) & 1) * STAGE_CHUNK,
+             prev_n);
+    }
+    prev_n = n;
+    off += n;
+  }
+  r = cuEventSynchronize(ctx->stage_ev[(i - 1) & 1]);
+  if (r != CUDA_SUCCESS) return r;
+  memcpy(dst + off - prev_n, stage + ((i - 1) & 1) * STAGE_CHUNK, prev_n);
+  return CUDA_SUCCESS;
+}
+
+static CUresult cuda_staged_write(cuda_context *ctx, CUdeviceptr dst,
+                                  const char *src, size_t sz) {
+  char *stage = (char *)ctx->stage;
+  size_t off = 0, n;
+  unsigned int i;
+  CUresult r;
+
+  for (i = 0; off < sz; i++) {
+    n = sz - off < STAGE_CHUNK ? sz - off : STAGE_CHUNK;
+    if (i > 1) {
+      /* Wait for the transfer that last used this half */
+      r = cuEventSynchronize(ctx->stage_ev[i & 1]);
+      if (r != CUDA_SUCCESS) return r;
+    }
+    memcpy(stage + (i & 1) * STAGE_CHUNK, src + off, n);
+    r = cuMemcpyHtoDAsync(dst + off, stage + (i & 1) * STAGE_CHUNK, n,
+                          ctx->s);
+    if (r != CUDA_SUCCESS) return r;
+    r = cuEventRecord(ctx->stage_ev[i & 1], ctx->s);
+    if (r != CUDA_SUCCESS) return r;
+    off += n;
+  }
+  /* The stream is in order so the last chunk completes everything */
+  return cuEventSynchronize(ctx->stage_ev[(i - 1) & 1]);
+}
+
 static int cuda_read(void *dst, gpudata *src, size_t srcoff, size_t sz) {
     cuda_context *ctx = src->ctx;
 
@@ -459,13 +923,22 @@ static int cuda_read(void *dst, gpudata *src, size_t srcoff, size_t sz) {
     if (ctx->err != CUDA_SUCCESS)
       return GA_IMPL_ERROR;
 
+    cuda_new_op(ctx);
+    if (cuda_use(ctx, src) != GA_NO_ERROR) {
+      cuda_exit(ctx);
+      return GA_IMPL_ERROR;
+    }
+
     ctx->err = cuEventSynchronize(src->ev);
     if (ctx->err != CUDA_SUCCESS) {
       cuda_exit(ctx);
       return GA_IMPL_ERROR;
     }
 
-    ctx->err = cuMemcpyDtoH(dst, src->ptr + srcoff, sz);
+    if (cuda_use_stage(ctx, dst, sz))
+      ctx->err = cuda_staged_read(ctx, (char *)dst, src->ptr + srcoff, sz);
+    else
+      ctx->err = cuMemcpyDtoH(dst, src->ptr + srcoff, sz);
     if (ctx->err != CUDA_SUCCESS) {
       cuda_exit(ctx);
       return GA_IMPL_ERROR;
@@ -489,13 +962,23 @@ static int cuda_write(gpudata *dst, size_t dstoff, const void *src,
     if (ctx->err != CUDA_SUCCESS)
       return GA_IMPL_ERROR;
 
+    cuda_new_op(ctx);
+    if (cuda_use(ctx, dst) != GA_NO_ERROR) {
+      cuda_exit(ctx);
+      return GA_IMPL_ERROR;
+    }
+
     ctx->err = cuEventSynchronize(dst->ev);
     if (ctx->err != CUDA_SUCCESS) {
       cuda_exit(ctx);
       return GA_IMPL_ERROR;
     }
 
-    ctx->err = cuMemcpyHtoD(dst->ptr + dstoff, src, sz);
+    if (cuda_use_stage(ctx, src, sz))
+      ctx->err = cuda_staged_write(ctx, dst->ptr + dstoff, (const char *)src,
+                                   sz);
+    else
+      ctx->err = cuMemcpyHtoD(dst->ptr + dstoff, src, sz);
     if (ctx->err != CUDA_SUCCESS) {
       cuda_exit(ctx);
       return GA_IMPL_ERROR;
@@ -504,6 +987,71 @@ static int cuda_write(gpudata *dst, size_t dstoff, const void *src,
     return GA_NO_ERROR;
 }
 
+static int cuda_read_async(void *dst, gpudata *src, size_t srcoff,
+                           size_t sz) {
+    cuda_context *ctx = src->ctx;
+
+    ASSERT_BUF(src);
+
+    if (sz == 0) return GA_NO_ERROR;
+
+    if ((src->sz - srcoff) < sz)
+        return GA_VALUE_ERROR;
+
+    cuda_enter(ctx);
+    if (ctx->err != CUDA_SUCCESS)
+      return GA_IMPL_ERROR;
+
+    cuda_new_op(ctx);
+    if (cuda_use(ctx, src) != GA_NO_ERROR) {
+      cuda_exit(ctx);
+      return GA_IMPL_ERROR;
+    }
+
+    /* In case the last operation was on another stream */
+    ctx->err = cuStreamWaitEvent(ctx->s, src->ev, 0);
+    if (ctx->err == CUDA_SUCCESS)
+      ctx->err = cuMemcpyDtoHAsync(dst, src->ptr + srcoff, sz, ctx->s);
+    if (ctx->err == CUDA_SUCCESS)
+      ctx->err = cuEventRecord(src->ev, ctx->s);
+    cuda_exit(ctx);
+    if (ctx->err != CUDA_SUCCESS)
+      return GA_IMPL_ERROR;
+    return GA_NO_ERROR;
+}
+
+static int cuda_write_async(gpudata *dst, size_t dstoff, const void *src,
+                            size_t sz) {
+    cuda_context *ctx = dst->ctx;
+
+    ASSERT_BUF(dst);
+
+    if (sz == 0) return GA_NO_ERROR;
+
+    if ((dst->sz - dstoff) < sz)
+        return GA_VALUE_ERROR;
+
+    cuda_enter(ctx);
+    if (ctx->err != CUDA_SUCCESS)
+      return GA_IMPL_ERROR;
+
+    cuda_new_op(ctx);
+    if (cuda_use(ctx, dst) != GA_NO_ERROR) {
+      cuda_exit(ctx);
+      return GA_IMPL_ERROR;
+    }
+
+    ctx->err = cuStreamWaitEvent(ctx->s, dst->ev, 0);
+    if (ctx->err == CUDA_SUCCESS)
+      ctx->err = cuMemcpyHtoDAsync(dst->ptr + dstoff, src, sz, ctx->s);
+    if (ctx->err == CUDA_SUCCESS)
+      ctx->err = cuEventRecord(dst->ev, ctx->s);
+    cuda_exit(ctx);
+    if (ctx->err != CUDA_SUCCESS)
+      return GA_IMPL_ERROR;
+    return GA_NO_ERROR;
+}
+
 static int cuda_memset(gpudata *dst, size_t dstoff, int data) {
     cuda_context *ctx = dst->ctx;
 
@@ -515,6 +1063,12 @@ static int cuda_memset(gpudata *dst, size_t dstoff, int data) {
     if (ctx->err != CUDA_SUCCESS)
       return GA_IMPL_ERROR;
 
+    cuda_new_op(ctx);
+    if (cuda_use(ctx, dst) != GA_NO_ERROR) {
+      cuda_exit(ctx);
+      return GA_IMPL_ERROR;
+    }
+
     ctx->err = cuMemsetD8Async(dst->ptr + dstoff, data, dst->sz - dstoff,
                                ctx->s);
     if (ctx->err != CUDA_SUCCESS) {
@@ -885,6 +1439,10 @@ static void cuda_freekernel(gpukernel *k) {
   if (k->refcnt == 0) {
     cuda_enter(k->ctx);
     cuModuleUnload(k->m);
+    if (k->t_start != NULL) {
+      cuEventDestroy(k->t_start);
+      cuEventDestroy(k->t_end);
+    }
     cuda_exit(k->ctx);
     cuda_free_ctx(k->ctx);
     CLEAR(k);
@@ -904,6 +1462,39 @@ static int cuda_callkernel(gpukernel *k, unsigned int n,
     if (ctx->err != CUDA_SUCCESS)
       return GA_IMPL_ERROR;
 
+    cuda_new_op(ctx);
+    for (i = 0; i < k->argcount; i++) {
+      if (k->types[i] == GA_BUFFER &&
+          cuda_use(ctx, (gpudata *)args[i]) != GA_NO_ERROR) {
+        cuda_exit(ctx);
+        return GA_IMPL_ERROR;
+      }
+    }
+
+    if (ctx->timing) {
+      /* The buffer events don't time, these do */
+      if (k->t_start == NULL) {
+        ctx->err = cuEventCreate(&k->t_start, CU_EVENT_DEFAULT);
+        if (ctx->err != CUDA_SUCCESS) {
+          k->t_start = NULL;
+          cuda_exit(ctx);
+          return GA_IMPL_ERROR;
+        }
+        ctx->err = cuEventCreate(&k->t_end, CU_EVENT_DEFAULT);
+        if (ctx->err != CUDA_SUCCESS) {
+          cuEventDestroy(k->t_start);
+          k->t_start = NULL;
+          cuda_exit(ctx);
+          return GA_IMPL_ERROR;
+        }
+      }
+      ctx->err = cuEventRecord(k->t_start, ctx->s);
+      if (ctx->err != CUDA_SUCCESS) {
+        cuda_exit(ctx);
+        return GA_IMPL_ERROR;
+      }
+    }
+
     switch (n) {
     case 1:
       ctx->err = cuLaunchKernel(k->k, gs[0], 1, 1, bs[0], 1, 1, shared,
@@ -923,6 +1514,12 @@ static int cuda_callkernel(gpukernel *k, unsigned int n,
     }
     if (ctx->err != CUDA_SUCCESS) {
       res = GA_IMPL_ERROR;
+    } else if (ctx->timing) {
+      ctx->err = cuEventRecord(k->t_end, ctx->s);
+      if (ctx->err != CUDA_SUCCESS)
+        res = GA_IMPL_ERROR;
+      else
+        k->timed = 1;
     }
 
     cuda_exit(ctx);
@@ -953,6 +1550,24 @@ static int cuda_sync(gpudata *b) {
   return GA_NO_ERROR;
 }
 
+static int cuda_done(gpudata *b, int *ret) {
+  cuda_context *ctx = (cuda_context *)b->ctx;
+  CUresult r;
+
+  ASSERT_BUF(b);
+  cuda_enter(ctx);
+  if (ctx->err != CUDA_SUCCESS)
+    FAIL(-1, GA_IMPL_ERROR);
+  r = cuEventQuery(b->ev);
+  cuda_exit(ctx);
+  if (r == CUDA_SUCCESS)
+    return 1;
+  if (r == CUDA_ERROR_NOT_READY)
+    return 0;
+  ctx->err = r;
+  FAIL(-1, GA_IMPL_ERROR);
+}
+
 static const char ELEM_HEADER_PTX[] = ".version 4.0\n.target %s\n\n"
     ".entry extcpy (\n"
     ".param .u%u a_data,\n"
@@ -1275,6 +1890,12 @@ static gpudata *cuda_transfer(gpudata *src, size_t offset, size_t sz,
       cuda_free(dst);
       return NULL;
     }
+    cuda_new_op(ctx);
+    if (cuda_use(ctx, src) != GA_NO_ERROR) {
+      cuda_exit(ctx);
+      cuda_free(dst);
+      return NULL;
+    }
     ctx->err = cuMemcpyDtoDAsync(dst->ptr, src->ptr+offset, sz, ctx->s);
     if (ctx->err != CUDA_SUCCESS) {
       cuda_exit(ctx);
@@ -1295,6 +1916,12 @@ static gpudata *cuda_transfer(gpudata *src, size_t offset, size_t sz,
     cuda_free(dst);
     return NULL;
   }
+  cuda_new_op(ctx);
+  if (cuda_use(ctx, src) != GA_NO_ERROR) {
+    cuda_exit(ctx);
+    cuda_free(dst);
+    return NULL;
+  }
   ctx->err = cuMemcpyPeerAsync(dst->ptr, dst->ctx->ctx, src->ptr+offset,
 			       src->ctx->ctx, sz, dst_ctx->s);
   cuEventRecord(dst->ev, dst_ctx->s);
@@ -1346,6 +1973,7 @@ static int cuda_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     char *s;
     CUdevice id;
     int i;
+    float ms;
 
   case GA_CTX_PROP_DEVNAME:
     cuda_enter(ctx);
@@ -1461,6 +2089,46 @@ static int cuda_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     *((const char **)res) = ctx->bin_id;
     return GA_NO_ERROR;
 
+  case GA_CTX_PROP_POOL_LIMIT:
+    *((size_t *)res) = ctx->pool_limit;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_CACHED:
+    *((size_t *)res) = ctx->pool_cached;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_HITS:
+    *((size_t *)res) = ctx->pool_hits;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_MISSES:
+    *((size_t *)res) = ctx->pool_misses;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    *((gpuarray_mem_stats *)res) = ctx->mem;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    *((size_t *)res) = ctx->oom_retries;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    *((size_t *)res) = ctx->budget;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_SPILLED:
+    *((size_t *)res) = ctx->spilled;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_SPILLS:
+    *((size_t *)res) = ctx->spills;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    *((int *)res) = ctx->timing;
+    return GA_NO_ERROR;
+
   case GA_BUFFER_PROP_REFCNT:
     *((unsigned int *)res) = buf->refcnt;
     return GA_NO_ERROR;
@@ -1469,6 +2137,16 @@ static int cuda_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     *((size_t *)res) = buf->sz;
     return GA_NO_ERROR;
 
+  case GA_BUFFER_PROP_HOSTPOINTER:
+    if (buf->hostp == NULL)
+      return GA_VALUE_ERROR;
+    *((void **)res) = buf->hostp;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_SPILLABLE:
+    *((int *)res) = (buf->flags & SPILLABLE) ? 1 : 0;
+    return GA_NO_ERROR;
+
   case GA_BUFFER_PROP_CTX:
   case GA_KERNEL_PROP_CTX:
     *((void **)res) = (void *)ctx;
@@ -1513,6 +2191,118 @@ static int cuda_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     *((const int **)res) = k->types;
     return GA_NO_ERROR;
 
+  case GA_KERNEL_PROP_ELAPSED:
+    if (!k->timed)
+      return GA_VALUE_ERROR;
+    cuda_enter(ctx);
+    ctx->err = cuEventSynchronize(k->t_end);
+    if (ctx->err == CUDA_SUCCESS)
+      ctx->err = cuEventElapsedTime(&ms, k->t_start, k->t_end);
+    cuda_exit(ctx);
+    if (ctx->err != CUDA_SUCCESS)
+      return GA_IMPL_ERROR;
+    *((double *)res) = ms * 1e-3;
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static int cuda_set_property(void *c, int prop_id, const void *val) {
+  cuda_context *ctx = (cuda_context *)c;
+
+  ASSERT_CTX(ctx);
+  switch (prop_id) {
+  case GA_CTX_PROP_POOL_LIMIT:
+    ctx->pool_limit = *((const size_t *)val);
+    if (ctx->pool_cached > ctx->pool_limit) {
+      cuda_enter(ctx);
+      cuda_pool_trim(ctx, ctx->pool_limit);
+      cuda_exit(ctx);
+    }
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_CACHED:
+    cuda_enter(ctx);
+    cuda_reclaim(ctx, 0);
+    cuda_pool_trim(ctx, *((const size_t *)val));
+    cuda_exit(ctx);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_HITS:
+    ctx->pool_hits = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_MISSES:
+    ctx->pool_misses = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    mem_stats_reset(&ctx->mem);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_RECLAIM_ADD:
+    return reclaim_add(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_RECLAIM_DEL:
+    return reclaim_del(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    ctx->oom_retries = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    ctx->budget = *((const size_t *)val);
+    cuda_enter(ctx);
+    cuda_new_op(ctx);
+    cuda_make_room(ctx, 0);
+    cuda_exit(ctx);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_SPILLS:
+    ctx->spills = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    ctx->timing = *((const int *)val);
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static int cuda_buffer_set_property(gpudata *buf, int prop_id,
+                                    const void *val) {
+  cuda_context *ctx;
+  int err;
+
+  ASSERT_BUF(buf);
+  ctx = buf->ctx;
+  switch (prop_id) {
+  case GA_BUFFER_PROP_SPILLABLE:
+    if (*((const int *)val)) {
+      if (buf->flags & (DONTFREE|REGISTERED) || buf->hostp != NULL)
+        return GA_VALUE_ERROR;
+      if (!(buf->flags & SPILLABLE)) {
+        buf->flags |= SPILLABLE;
+        cuda_lru_append(ctx, buf);
+      }
+    } else if (buf->flags & SPILLABLE) {
+      cuda_enter(ctx);
+      if (ctx->err != CUDA_SUCCESS)
+        return GA_IMPL_ERROR;
+      cuda_new_op(ctx);
+      err = cuda_use(ctx, buf);
+      cuda_exit(ctx);
+      if (err != GA_NO_ERROR)
+        return err;
+      buf->flags &= ~SPILLABLE;
+      cuda_lru_remove(ctx, buf);
+    }
+    return GA_NO_ERROR;
+
   default:
     return GA_INVALID_ERROR;
   }
@@ -1546,4 +2336,9 @@ const gpuarray_buffer_ops cuda_ops = {cuda_init,
                                      cuda_extcopy,
                                      cuda_transfer,
                                      cuda_property,
-                                     cuda_error};
+                                     cuda_error,
+                                     cuda_set_property,
+                                     cuda_write_async,
+                                     cuda_read_async,
+                                     cuda_done,
+                                     cuda_buffer_set_property};
@@ -0,0 +1,1460 @@
+#define _CRT_SECURE_NO_WARNINGS
+
+#include "private.h"
+#include "private_host.h"
+
+#include <sys/types.h>
+#include <sys/param.h>
+#include <sys/stat.h>
+#include <sys/wait.h>
+
+#include <dlfcn.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+#include <unistd.h>
+
+#include "util/strb.h"
+
+#include "gpuarray/buffer.h"
+#include "gpuarray/util.h"
+#include "gpuarray/error.h"
+
+#ifndef HOST_CC_BIN
+#define HOST_CC_BIN "cc"
+#endif
+
+/* Elements per task for buffer_extcopy() */
+#define COPY_CHUNK (16 << 10)
+
+static void host_free(gpudata *);
+static void host_freekernel(gpukernel *);
+
+#define FAIL(v, e) { if (ret) *ret = e; return v; }
+
+/*
+ * Kernels are compiled as C with the system compiler.  The work items
+ * of a block run one after the other on a thread of the pool, so
+ * LOCAL_MEM is thread-local storage and local_barrier() switches to
+ * the next item of the block.
+ */
+static const char HOST_PREAMBLE[] =
+    "#include <stddef.h>\n"
+    "#include <stdint.h>\n"
+    "#include <math.h>\n"
+    "#define GA_HOST 1\n"
+    "typedef struct _ga_host_item {\n"
+    "  unsigned int lid[3];\n"
+    "  unsigned int ldim[3];\n"
+    "  unsigned int gid[3];\n"
+    "  unsigned int gdim[3];\n"
+    "  void (*barrier)(void);\n"
+    "} ga_host_item;\n"
+    "static __thread const ga_host_item *ga_it;\n"
+    "#define local_barrier() do { \\\n"
+    "    const ga_host_item *ga_s = ga_it; ga_s->barrier(); ga_it = ga_s; \\\n"
+    "  } while (0)\n"
+    "#define WITHIN_KERNEL static\n"
+    "#define KERNEL /* empty */\n"
+    "#define GLOBAL_MEM /* empty */\n"
+    "#define LOCAL_MEM static __thread\n"
+    "#define LOCAL_MEM_ARG /* empty */\n"
+    "#define REQD_WG_SIZE(X,Y,Z) /* empty */\n"
+    "#define LID_0 (ga_it->lid[0])\n"
+    "#define LID_1 (ga_it->lid[1])\n"
+    "#define LID_2 (ga_it->lid[2])\n"
+    "#define LDIM_0 (ga_it->ldim[0])\n"
+    "#define LDIM_1 (ga_it->ldim[1])\n"
+    "#define LDIM_2 (ga_it->ldim[2])\n"
+    "#define GID_0 (ga_it->gid[0])\n"
+    "#define GID_1 (ga_it->gid[1])\n"
+    "#define GID_2 (ga_it->gid[2])\n"
+    "#define GDIM_0 (ga_it->gdim[0])\n"
+    "#define GDIM_1 (ga_it->gdim[1])\n"
+    "#define GDIM_2 (ga_it->gdim[2])\n"
+    "#define ga_bool uint8_t\n"
+    "#define ga_byte int8_t\n"
+    "#define ga_ubyte uint8_t\n"
+    "#define ga_short int16_t\n"
+    "#define ga_ushort uint16_t\n"
+    "#define ga_int int32_t\n"
+    "#define ga_uint uint32_t\n"
+    "#define ga_long int64_t\n"
+    "#define ga_ulong uint64_t\n"
+    "#define ga_float float\n"
+    "#define ga_double double\n"
+    "#define ga_half uint16_t\n"
+    "#define ga_size size_t\n"
+    /* Blocks run in parallel, so global atomics still need to be atomic */
+    "#define GA_ATOMIC_ADD_I(t, n) static inline t n(t *p, t v) { \\\n"
+    "    return __atomic_fetch_add(p, v, __ATOMIC_RELAXED); }\n"
+    "#define GA_ATOMIC_ADD_F(t, u, n) static inline t n(t *p, t v) { \\\n"
+    "    union { u i; t f; } o, r; \\\n"
+    "    o.i = __atomic_load_n((u *)p, __ATOMIC_RELAXED); \\\n"
+    "    do { r.f = o.f + v; } while (!__atomic_compare_exchange_n( \\\n"
+    "        (u *)p, &o.i, r.i, 0, __ATOMIC_RELAXED, __ATOMIC_RELAXED)); \\\n"
+    "    return o.f; }\n"
+    "GA_ATOMIC_ADD_I(int, ga_atomic_add_i)\n"
+    "GA_ATOMIC_ADD_I(unsigned int, ga_atomic_add_ui)\n"
+    "GA_ATOMIC_ADD_I(long, ga_atomic_add_l)\n"
+    "GA_ATOMIC_ADD_I(unsigned long, ga_atomic_add_ul)\n"
+    "GA_ATOMIC_ADD_I(long long, ga_atomic_add_ll)\n"
+    "GA_ATOMIC_ADD_I(unsigned long long, ga_atomic_add_ull)\n"
+    "GA_ATOMIC_ADD_F(float, uint32_t, ga_atomic_add_f)\n"
+    "GA_ATOMIC_ADD_F(double, uint64_t, ga_atomic_add_d)\n"
+    "#define atomicAdd(p, v) _Generic(*(p), \\\n"
+    "    int: ga_atomic_add_i, unsigned int: ga_atomic_add_ui, \\\n"
+    "    long: ga_atomic_add_l, unsigned long: ga_atomic_add_ul, \\\n"
+    "    long long: ga_atomic_add_ll, \\\n"
+    "    unsigned long long: ga_atomic_add_ull, \\\n"
+    "    float: ga_atomic_add_f, double: ga_atomic_add_d)((p), (v))\n";
+
+static const char *TMP_VAR_NAMES[] = {"GPUARRAY_TMPDIR", "TMPDIR", "TMP",
+                                      "TEMP"};
+
+/* Worker whose fibers run on the current thread */
+static __thread host_worker *cur_worker;
+
+#ifdef HOST_FAST_SWITCH
+/* Save the callee-saved registers on the stack and switch to `to` */
+GPUARRAY_LOCAL void ga_host_switch(host_fiber *from, host_fiber to);
+__asm__(".text\n"
+        ".globl ga_host_switch\n"
+        ".hidden ga_host_switch\n"
+        ".type ga_host_switch, @function\n"
+        "ga_host_switch:\n"
+        "  pushq %rbp\n"
+        "  pushq %rbx\n"
+        "  pushq %r12\n"
+        "  pushq %r13\n"
+        "  pushq %r14\n"
+        "  pushq %r15\n"
+        "  movq %rsp, (%rdi)\n"
+        "  movq %rsi, %rsp\n"
+        "  popq %r15\n"
+        "  popq %r14\n"
+        "  popq %r13\n"
+        "  popq %r12\n"
+        "  popq %rbx\n"
+        "  popq %rbp\n"
+        "  ret\n"
+        ".size ga_host_switch, .-ga_host_switch\n");
+#define host_switch(from, to) ga_host_switch((from), *(to))
+#else
+#define host_switch(from, to) swapcontext((from), (to))
+#endif
+
+static void host_barrier(void) {
+  host_worker *w = cur_worker;
+  host_switch(&w->fib[w->cur], &w->sched);
+}
+
+static void host_fiber_main(void) {
+  host_worker *w;
+  unsigned int i;
+
+  for (;;) {
+    w = cur_worker;
+    i = w->cur;
+    w->launch->k->entry(w->launch->args, &w->items[i]);
+    w->done[i] = 1;
+    w->left--;
+    /* Resumed for the same item of the next block */
+    host_switch(&w->fib[i], &w->sched);
+  }
+}
+
+static int host_fiber_init(host_worker *w, unsigned int i) {
+  char *stack = w->stacks + (size_t)i * HOST_STACK;
+#ifdef HOST_FAST_SWITCH
+  void **sp = (void **)(stack + HOST_STACK);
+
+  /* What ga_host_switch() pops, and a fake return address for the
+     entry of host_fiber_main() to see the usual stack alignment */
+  *--sp = NULL;
+  *--sp = (void *)host_fiber_main;
+  sp -= 6;
+  w->fib[i] = sp;
+#else
+  if (getcontext(&w->fib[i]) != 0)
+    return GA_SYS_ERROR;
+  w->fib[i].uc_stack.ss_sp = stack;
+  w->fib[i].uc_stack.ss_size = HOST_STACK;
+  w->fib[i].uc_link = NULL;
+  makecontext(&w->fib[i], host_fiber_main, 0);
+#endif
+  return GA_NO_ERROR;
+}
+
+static int host_worker_setup(host_worker *w) {
+  unsigned int i;
+
+  if (w->fib != NULL)
+    return GA_NO_ERROR;
+  w->fib = calloc(HOST_MAXLSIZE, sizeof(*w->fib));
+  w->items = calloc(HOST_MAXLSIZE, sizeof(*w->items));
+  w->done = calloc(HOST_MAXLSIZE, 1);
+  w->stacks = malloc((size_t)HOST_MAXLSIZE * HOST_STACK);
+  if (w->fib == NULL || w->items == NULL || w->done == NULL ||
+      w->stacks == NULL)
+    goto fail;
+  for (i = 0; i < HOST_MAXLSIZE; i++)
+    if (host_fiber_init(w, i) != GA_NO_ERROR)
+      goto fail;
+  return GA_NO_ERROR;
+ fail:
+  free(w->fib);
+  free(w->items);
+  free(w->done);
+  free(w->stacks);
+  w->fib = NULL;
+  return GA_MEMORY_ERROR;
+}
+
+static void host_worker_clear(host_worker *w) {
+  if (w->fib != NULL) {
+    free(w->fib);
+    free(w->items);
+    free(w->done);
+    free(w->stacks);
+  }
+}
+
+static void host_work(host_worker *w, const host_job *j) {
+  size_t i;
+  host_job *jj = (host_job *)j;
+
+  while ((i = __sync_fetch_and_add(&jj->next, 1)) < j->n)
+    j->run(w, j, i);
+}
+
+static void *host_thread(void *p) {
+  host_worker *w = (host_worker *)p;
+  host_context *ctx = w->ctx;
+  unsigned int gen = 0;
+  host_job *j;
+
+  pthread_mutex_lock(&ctx->lock);
+  for (;;) {
+    while (ctx->gen == gen && !ctx->quit)
+      pthread_cond_wait(&ctx->wake, &ctx->lock);
+    if (ctx->quit)
+      break;
+    gen = ctx->gen;
+    j = ctx->job;
+    pthread_mutex_unlock(&ctx->lock);
+    host_work(w, j);
+    pthread_mutex_lock(&ctx->lock);
+    if (--ctx->busy == 0)
+      pthread_cond_signal(&ctx->idle);
+  }
+  pthread_mutex_unlock(&ctx->lock);
+  return NULL;
+}
+
+/*
+ * Run a job on all the threads of the pool and wait for it to
+ * finish.  Must be called with ctx->run_lock held.
+ */
+static void host_run(host_context *ctx, host_job *j) {
+  j->next = 0;
+  if (ctx->nthreads == 1 || j->n == 1) {
+    host_work(&ctx->workers[0], j);
+    return;
+  }
+  pthread_mutex_lock(&ctx->lock);
+  ctx->job = j;
+  ctx->gen++;
+  ctx->busy = ctx->nthreads - 1;
+  pthread_cond_broadcast(&ctx->wake);
+  pthread_mutex_unlock(&ctx->lock);
+
+  host_work(&ctx->workers[0], j);
+
+  pthread_mutex_lock(&ctx->lock);
+  while (ctx->busy != 0)
+    pthread_cond_wait(&ctx->idle, &ctx->lock);
+  pthread_mutex_unlock(&ctx->lock);
+}
+
+static unsigned int host_nthreads(void) {
+  const char *s = getenv("GPUARRAY_HOST_THREADS");
+  long n = 0;
+
+  if (s != NULL)
+    n = strtol(s, NULL, 10);
+  if (n <= 0)
+    n = sysconf(_SC_NPROCESSORS_ONLN);
+  if (n <= 0)
+    n = 1;
+  return (unsigned int)n;
+}
+
+static void host_free_ctx(host_context *ctx) {
+  unsigned int i;
+
+  ASSERT_CTX(ctx);
+  ctx->refcnt--;
+  if (ctx->refcnt == 0) {
+    pthread_mutex_lock(&ctx->lock);
+    ctx->quit = 1;
+    pthread_cond_broadcast(&ctx->wake);
+    pthread_mutex_unlock(&ctx->lock);
+    for (i = 1; i < ctx->nthreads; i++)
+      pthread_join(ctx->threads[i-1], NULL);
+    for (i = 0; i < ctx->nthreads; i++)
+      host_worker_clear(&ctx->workers[i]);
+    pthread_cond_destroy(&ctx->idle);
+    pthread_cond_destroy(&ctx->wake);
+    pthread_mutex_destroy(&ctx->lock);
+    pthread_mutex_destroy(&ctx->run_lock);
+    free(ctx->threads);
+    free(ctx->workers);
+    CLEAR(ctx);
+    free(ctx);
+  }
+}
+
+static void *host_init(int devno, int flags, int *ret) {
+  host_context *res;
+  unsigned int i;
+
+  /* There is only one host */
+  if (devno != 0 && devno != -1)
+    FAIL(NULL, GA_VALUE_ERROR);
+
+  res = calloc(1, sizeof(*res));
+  if (res == NULL)
+    FAIL(NULL, GA_MEMORY_ERROR);
+  res->refcnt = 1;
+  res->flags = flags;
+  res->err = "No error";
+  strlcpy(res->bin_id, "host", sizeof(res->bin_id));
+  res->nthreads = host_nthreads();
+  res->workers = calloc(res->nthreads, sizeof(*res->workers));
+  res->threads = calloc(res->nthreads, sizeof(*res->threads));
+  if (res->workers == NULL || res->threads == NULL) {
+    free(res->workers);
+    free(res->threads);
+    free(res);
+    FAIL(NULL, GA_MEMORY_ERROR);
+  }
+  pthread_mutex_init(&res->run_lock, NULL);
+  pthread_mutex_init(&res->lock, NULL);
+  pthread_cond_init(&res->wake, NULL);
+  pthread_cond_init(&res->idle, NULL);
+  res->workers[0].ctx = res;
+  for (i = 1; i < res->nthreads; i++) {
+    res->workers[i].ctx = res;
+    if (pthread_create(&res->threads[i-1], NULL, host_thread,
+                       &res->workers[i]) != 0) {
+      /* Make do with the threads we have */
+      res->nthreads = i;
+      break;
+    }
+  }
+  TAG_CTX(res);
+  return res;
+}
+
+static void host_deinit(void *c) {
+  host_free_ctx((host_context *)c);
+}
+
+static gpudata *host_alloc(void *c, size_t size, void *data, int flags,
+                           int *ret) {
+  host_context *ctx = (host_context *)c;
+  gpudata *res;
+
+  ASSERT_CTX(ctx);
+  if ((flags & GA_BUFFER_INIT) && data == NULL) FAIL(NULL, GA_VALUE_ERROR);
+  if ((flags & (GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY)) ==
+      (GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY)) FAIL(NULL, GA_VALUE_ERROR);
+  if ((flags & GA_BUFFER_USE_DATA) &&
+      (data == NULL || size == 0 ||
+       (flags & (GA_BUFFER_INIT|GA_BUFFER_HOST))))
+    FAIL(NULL, GA_VALUE_ERROR);
+
+  res = malloc(sizeof(*res));
+  if (res == NULL) FAIL(NULL, GA_MEMORY_ERROR);
+  res->sz = size;
+  res->flags = flags & GA_BUFFER_USE_DATA ? DONTFREE : 0;
+  res->refcnt = 1;
+  res->ctx = ctx;
+
+  if (flags & GA_BUFFER_USE_DATA) {
+    /* The device memory is the host memory, nothing to copy */
+    res->ptr = data;
+  } else {
+    /* Zero-sized buffers still get a distinct pointer */
+    res->ptr = malloc(size ? size : 1);
+    if (res->ptr == NULL) {
+      ctx->oom_retries++;
+      reclaim_run(&ctx->reclaim);
+      res->ptr = malloc(size ? size : 1);
+    }
+    if (res->ptr == NULL) {
+      free(res);
+      FAIL(NULL, GA_MEMORY_ERROR);
+    }
+    mem_stats_alloc(&ctx->mem, size, size);
+    if (flags & GA_BUFFER_INIT)
+      memcpy(res->ptr, data, size);
+  }
+  ctx->refcnt++;
+  TAG_BUF(res);
+  return res;
+}
+
+static void host_retain(gpudata *b) {
+  ASSERT_BUF(b);
+  b->refcnt++;
+}
+
+static void host_free(gpudata *d) {
+  host_context *ctx;
+
+  ASSERT_BUF(d);
+  d->refcnt--;
+  if (d->refcnt == 0) {
+    ctx = d->ctx;
+    if (!(d->flags & DONTFREE)) {
+      mem_stats_free(&ctx->mem, d->sz);
+      free(d->ptr);
+    }
+    CLEAR(d);
+    free(d);
+    host_free_ctx(ctx);
+  }
+}
+
+static int host_share(gpudata *a, gpudata *b, int *ret) {
+  ASSERT_BUF(a);
+  ASSERT_BUF(b);
+  return (a->sz != 0 && b->sz != 0 &&
+          ((a->ptr <= b->ptr && a->ptr + a->sz > b->ptr) ||
+           (b->ptr <= a->ptr && b->ptr + b->sz > a->ptr)));
+}
+
+static int host_move(gpudata *dst, size_t dstoff, gpudata *src,
+                     size_t srcoff, size_t sz) {
+  ASSERT_BUF(dst);
+  ASSERT_BUF(src);
+  if (src->ctx != dst->ctx) return GA_VALUE_ERROR;
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if ((dst->sz - dstoff) < sz || (src->sz - srcoff) < sz)
+    return GA_VALUE_ERROR;
+
+  memmove(dst->ptr + dstoff, src->ptr + srcoff, sz);
+  return GA_NO_ERROR;
+}
+
+static int host_read(void *dst, gpudata *src, size_t srcoff, size_t sz) {
+  ASSERT_BUF(src);
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if ((src->sz - srcoff) < sz)
+    return GA_VALUE_ERROR;
+
+  memcpy(dst, src->ptr + srcoff, sz);
+  return GA_NO_ERROR;
+}
+
+static int host_write(gpudata *dst, size_t dstoff, const void *src,
+                      size_t sz) {
+  ASSERT_BUF(dst);
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if ((dst->sz - dstoff) < sz)
+    return GA_VALUE_ERROR;
+
+  memcpy(dst->ptr + dstoff, src, sz);
+  return GA_NO_ERROR;
+}
+
+static int host_memset(gpudata *dst, size_t dstoff, int data) {
+  ASSERT_BUF(dst);
+
+  if (dstoff > dst->sz)
+    return GA_VALUE_ERROR;
+
+  memset(dst->ptr + dstoff, data, dst->sz - dstoff);
+  return GA_NO_ERROR;
+}
+
+static uint64_t fnv1a(uint64_t h, const char *s, size_t len) {
+  size_t i;
+
+  for (i = 0; i < len; i++) {
+    h ^= (unsigned char)s[i];
+    h *= 1099511628211ULL;
+  }
+  return h;
+}
+
+/*
+ * Whether `st` is owned by us and can't be written by anyone else.
+ */
+static int owned_private(const struct stat *st) {
+  return st->st_uid == getuid() && (st->st_mode & (S_IWGRP | S_IWOTH)) == 0;
+}
+
+/*
+ * Make the per-user cache directory `<tmpdir>/gpuarray-<uid>` in
+ * `dir`.  The temporary directory is usually shared, so the cache
+ * directory must be ours and closed to others.  Otherwise anyone
+ * could put a shared object where we would load it.
+ */
+static int cache_dir(char *dir, size_t sz) {
+  const char *tmpdir = NULL;
+  struct stat st;
+  unsigned int i;
+
+  for (i = 0; i < sizeof(TMP_VAR_NAMES)/sizeof(TMP_VAR_NAMES[0]); i++) {
+    tmpdir = getenv(TMP_VAR_NAMES[i]);
+    if (tmpdir != NULL) break;
+  }
+  if (tmpdir == NULL)
+    tmpdir = "/tmp";
+
+  if (snprintf(dir, sz, "%s/gpuarray-%lu", tmpdir,
+               (unsigned long)getuid()) >= (int)sz)
+    return GA_SYS_ERROR;
+  if (mkdir(dir, 0700) != 0 && errno != EEXIST)
+    return GA_SYS_ERROR;
+  if (lstat(dir, &st) != 0 || !S_ISDIR(st.st_mode) || !owned_private(&st) ||
+      (st.st_mode & 077) != 0)
+    return GA_SYS_ERROR;
+  return GA_NO_ERROR;
+}
+
+/*
+ * Load the shared object at `path` if it is a regular file that we
+ * own and that only we can write.
+ */
+static void *load_private(const char *path) {
+  struct stat st;
+  struct stat st2;
+  void *so;
+  int fd;
+
+  fd = open(path, O_RDONLY | O_NOFOLLOW);
+  if (fd == -1)
+    return NULL;
+  if (fstat(fd, &st) != 0 || !S_ISREG(st.st_mode) || !owned_private(&st)) {
+    close(fd);
+    return NULL;
+  }
+  /*
+   * Make sure the loaded file is still the one we checked.  The open
+   * fd keeps its inode from being reused meanwhile.  Loading
+   * /proc/self/fd/N instead doesn't work since the loader would match
+   * it to the last object loaded under the same name.
+   */
+  so = dlopen(path, RTLD_NOW | RTLD_LOCAL);
+  if (so != NULL && (stat(path, &st2) != 0 || st2.st_dev != st.st_dev ||
+                     st2.st_ino != st.st_ino)) {
+    dlclose(so);
+    so = NULL;
+  }
+  close(fd);
+  return so;
+}
+
+/*
+ * Compile `src` to a shared object and load it.  Objects are kept in
+ * a per-user directory of the temporary directory under a name
+ * derived from the source, so the compiler only runs once for each
+ * kernel.
+ */
+static void *host_compile(host_context *ctx, const char *src, size_t len,
+                          int *ret) {
+  char dir[PATH_MAX];
+  char namebuf[PATH_MAX];
+  char outbuf[PATH_MAX];
+  char sopath[PATH_MAX];
+  const char *cc;
+  void *so;
+  uint64_t h;
+  ssize_t s;
+  pid_t p;
+  int sys_err;
+  int fd;
+
+  cc = getenv("GPUARRAY_HOST_CC");
+  if (cc == NULL)
+    cc = HOST_CC_BIN;
+
+  if (cache_dir(dir, sizeof(dir)) != GA_NO_ERROR) {
+    ctx->err = "The kernel cache directory is not private";
+    FAIL(NULL, GA_SYS_ERROR);
+  }
+
+  h = fnv1a(14695981039346656037ULL, cc, strlen(cc) + 1);
+  h = fnv1a(h, src, len);
+  snprintf(sopath, sizeof(sopath), "%s/gpuarray.host.%016llx.so", dir,
+           (unsigned long long)h);
+
+  so = load_private(sopath);
+  if (so != NULL)
+    return so;
+
+  strlcpy(namebuf, dir, sizeof(namebuf));
+  strlcat(namebuf, "/gpuarray.host.XXXXXXXX", sizeof(namebuf));
+
+  fd = mkstemp(namebuf);
+  if (fd == -1) FAIL(NULL, GA_SYS_ERROR);
+
+  strlcpy(outbuf, namebuf, sizeof(outbuf));
+  strlcat(outbuf, ".so", sizeof(outbuf));
+
+  s = write(fd, src, len);
+  close(fd);
+  if (s == -1) {
+    unlink(namebuf);
+    FAIL(NULL, GA_SYS_ERROR);
+  }
+
+#ifdef DEBUG
+#define CC_ARGS cc, "-g", "-fPIC", "-shared", "-x", "c", namebuf, \
+      "-o", outbuf, "-lm"
+#else
+#define CC_ARGS cc, "-O3", "-fPIC", "-shared", "-x", "c", namebuf, \
+      "-o", outbuf, "-lm"
+#endif
+  p = fork();
+  if (p == 0) {
+    execlp(cc, CC_ARGS, NULL);
+    exit(1);
+  }
+  if (p == -1) {
+    unlink(namebuf);
+    FAIL(NULL, GA_SYS_ERROR);
+  }
+
+  if (waitpid(p, &sys_err, 0) == -1) {
+    unlink(namebuf);
+    unlink(outbuf);
+    FAIL(NULL, GA_SYS_ERROR);
+  }
+  unlink(namebuf);
+
+  if (WIFSIGNALED(sys_err) || WEXITSTATUS(sys_err) != 0) {
+    unlink(outbuf);
+    FAIL(NULL, GA_RUN_ERROR);
+  }
+
+  /* Another process may have done the same, either copy is fine */
+  if (rename(outbuf, sopath) == 0) {
+    so = load_private(sopath);
+  } else {
+    so = load_private(outbuf);
+    unlink(outbuf);
+  }
+  if (so == NULL) {
+    ctx->err = "Could not load the compiled kernel";
+    FAIL(NULL, GA_IMPL_ERROR);
+  }
+  return so;
+}
+
+static int host_argtype_ok(int typecode) {
+  switch (typecode) {
+  case GA_BUFFER:
+  case GA_BOOL:
+  case GA_BYTE:
+  case GA_UBYTE:
+  case GA_SHORT:
+  case GA_USHORT:
+  case GA_INT:
+  case GA_UINT:
+  case GA_LONG:
+  case GA_ULONG:
+  case GA_FLOAT:
+  case GA_DOUBLE:
+  case GA_HALF:
+  case GA_SIZE:
+    return 1;
+  default:
+    return 0;
+  }
+}
+
+static gpukernel *host_newkernel(void *c, unsigned int count,
+                                 const char **strings, const size_t *lengths,
+                                 const char *fname, unsigned int argcount,
+                                 const int *types, int flags, int *ret,
+                                 char **err_str) {
+  host_context *ctx = (host_context *)c;
+  strb sb = STRB_STATIC_INIT;
+  gpukernel *res;
+  size_t start;
+  unsigned int i;
+  int *barriers;
+  int err = GA_NO_ERROR;
+
+  ASSERT_CTX(ctx);
+  if (count == 0) FAIL(NULL, GA_VALUE_ERROR);
+
+  if (flags & (GA_USE_PTX|GA_USE_CUDA|GA_USE_OPENCL))
+    FAIL(NULL, GA_DEVSUP_ERROR);
+
+  if (flags & GA_USE_BINARY) {
+    // GA_USE_BINARY is exclusive
+    if (flags & ~GA_USE_BINARY)
+      FAIL(NULL, GA_INVALID_ERROR);
+    // We need the length for binary data and there is only one blob.
+    if (count != 1 || lengths == NULL || lengths[0] == 0)
+      FAIL(NULL, GA_VALUE_ERROR);
+  }
+
+  // GA_USE_SMALL, GA_USE_DOUBLE and GA_USE_HALF always work
+  if (flags & GA_USE_COMPLEX)
+    FAIL(NULL, GA_DEVSUP_ERROR);
+
+  for (i = 0; i < argcount; i++)
+    if (!host_argtype_ok(types[i]))
+      FAIL(NULL, GA_DEVSUP_ERROR);
+
+  /*
+   * The "binary" is the complete C source, including the entry
+   * point, so that it can be compiled again with the same result.
+   */
+  if (flags & GA_USE_BINARY) {
+    strb_appendn(&sb, strings[0], lengths[0]);
+  } else {
+    /* The source is always C, so the preamble is always needed */
+    strb_appends(&sb, HOST_PREAMBLE);
+    start = sb.l;
+    if (lengths == NULL) {
+      for (i = 0; i < count; i++)
+        strb_appends(&sb, strings[i]);
+    } else {
+      for (i = 0; i < count; i++) {
+        if (lengths[i] == 0)
+          strb_appends(&sb, strings[i]);
+        else
+          strb_appendn(&sb, strings[i], lengths[i]);
+      }
+    }
+    if (strb_error(&sb)) {
+      strb_clear(&sb);
+      FAIL(NULL, GA_MEMORY_ERROR);
+    }
+
+    /* Blocks without barriers can skip the fibers */
+    strb_appendf(&sb, "\nint ga_host_barriers = %d;\n"
+                 "void ga_host_entry(void **ga_args, "
+                 "const ga_host_item *ga_item) {\n"
+                 "  ga_it = ga_item;\n"
+                 "  %s(", memmem(sb.s + start, sb.l - start, "local_barrier",
+                                 13) != NULL, fname);
+    for (i = 0; i < argcount; i++) {
+      if (i != 0)
+        strb_appends(&sb, ", ");
+      if (types[i] == GA_BUFFER)
+        strb_appendf(&sb, "*(void **)ga_args[%u]", i);
+      else
+        strb_appendf(&sb, "*(%s *)ga_args[%u]",
+                     gpuarray_get_type(types[i])->cluda_name, i);
+    }
+    strb_appends(&sb, ");\n}\n");
+  }
+
+  if (strb_error(&sb)) {
+    strb_clear(&sb);
+    FAIL(NULL, GA_MEMORY_ERROR);
+  }
+
+  res = calloc(1, sizeof(*res));
+  if (res == NULL) {
+    strb_clear(&sb);
+    FAIL(NULL, GA_SYS_ERROR);
+  }
+
+  res->so = host_compile(ctx, sb.s, sb.l, &err);
+  if (res->so == NULL) {
+    if (err_str != NULL && err == GA_RUN_ERROR) {
+      strb debug_msg = STRB_STATIC_INIT;
+
+      strb_appends(&debug_msg, "Host kernel build failure ::\n");
+      gpukernel_source_with_line_numbers(1, (const char **)&sb.s, &sb.l,
+                                         &debug_msg);
+      strb_append0(&debug_msg);
+      if (!strb_error(&debug_msg))
+        *err_str = strndup(debug_msg.s, debug_msg.l);
+      strb_clear(&debug_msg);
+    }
+    strb_clear(&sb);
+    free(res);
+    FAIL(NULL, err);
+  }
+
+  res->entry = (ga_host_entry)dlsym(res->so, "ga_host_entry");
+  barriers = (int *)dlsym(res->so, "ga_host_barriers");
+  if (res->entry == NULL || barriers == NULL) {
+    dlclose(res->so);
+    strb_clear(&sb);
+    free(res);
+    FAIL(NULL, GA_INVALID_ERROR);
+  }
+  res->barriers = *barriers;
+  res->bin = sb.s;
+  res->bin_sz = sb.l;
+
+  res->refcnt = 1;
+  res->argcount = argcount;
+  res->types = calloc(argcount, sizeof(int));
+  if (res->types == NULL) {
+    dlclose(res->so);
+    h_free(res->bin);
+    free(res);
+    FAIL(NULL, GA_MEMORY_ERROR);
+  }
+  memcpy(res->types, types, argcount*sizeof(int));
+
+  res->ctx = ctx;
+  ctx->refcnt++;
+  TAG_KER(res);
+  return res;
+}
+
+static void host_retainkernel(gpukernel *k) {
+  ASSERT_KER(k);
+  k->refcnt++;
+}
+
+static void host_freekernel(gpukernel *k) {
+  ASSERT_KER(k);
+  k->refcnt--;
+  if (k->refcnt == 0) {
+    dlclose(k->so);
+    host_free_ctx(k->ctx);
+    h_free(k->bin);
+    free(k->types);
+    CLEAR(k);
+    free(k);
+  }
+}
+
+static void host_item_lid(ga_host_item *it, unsigned int i) {
+  it->lid[0] = i % it->ldim[0];
+  i /= it->ldim[0];
+  it->lid[1] = i % it->ldim[1];
+  it->lid[2] = i / it->ldim[1];
+}
+
+static void host_run_block(host_worker *w, const host_job *j, size_t b) {
+  const host_launch *l = (const host_launch *)j->data;
+  ga_host_item it;
+  unsigned int i;
+
+  memcpy(it.ldim, l->ls, sizeof(it.ldim));
+  memcpy(it.gdim, l->gs, sizeof(it.gdim));
+  it.gid[0] = b % l->gs[0];
+  b /= l->gs[0];
+  it.gid[1] = b % l->gs[1];
+  it.gid[2] = b / l->gs[1];
+  it.barrier = host_barrier;
+
+  if (!l->k->barriers) {
+    for (i = 0; i < l->nitems; i++) {
+      host_item_lid(&it, i);
+      l->k->entry(l->args, &it);
+    }
+    return;
+  }
+
+  /*
+   * Run each item until its next barrier in turn, so that all the
+   * items of the block are at the same barrier before any of them
+   * continues.
+   */
+  for (i = 0; i < l->nitems; i++) {
+    w->items[i] = it;
+    host_item_lid(&w->items[i], i);
+    w->done[i] = 0;
+  }
+  w->launch = l;
+  w->left = l->nitems;
+  cur_worker = w;
+  while (w->left != 0) {
+    for (i = 0; i < l->nitems; i++) {
+      if (w->done[i])
+        continue;
+      w->cur = i;
+      host_switch(&w->sched, &w->fib[i]);
+    }
+  }
+}
+
+static double host_now(void) {
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (double)ts.tv_sec + (double)ts.tv_nsec * 1e-9;
+}
+
+static int host_callkernel(gpukernel *k, unsigned int n,
+                           const size_t *bs, const size_t *gs,
+                           size_t shared, void **args) {
+  host_context *ctx = k->ctx;
+  host_launch l;
+  host_job j;
+  size_t items = 1, blocks = 1;
+  double start = 0;
+  unsigned int i;
+  int res = GA_NO_ERROR;
+
+  ASSERT_KER(k);
+  if (n < 1 || n > 3)
+    return GA_VALUE_ERROR;
+  /* Local memory is static in the kernel source */
+  if (shared != 0)
+    return GA_DEVSUP_ERROR;
+
+  for (i = 0; i < 3; i++) {
+    l.ls[i] = i < n ? (unsigned int)bs[i] : 1;
+    l.gs[i] = i < n ? (unsigned int)gs[i] : 1;
+    if (i < n && (bs[i] != l.ls[i] || gs[i] != l.gs[i]))
+      return GA_VALUE_ERROR;
+    items *= l.ls[i];
+    blocks *= l.gs[i];
+  }
+  if (items > HOST_MAXLSIZE)
+    return GA_VALUE_ERROR;
+  if (items == 0 || blocks == 0) {
+    if (ctx->timing) {
+      k->elapsed = 0;
+      k->timed = 1;
+    }
+    return GA_NO_ERROR;
+  }
+  l.k = k;
+  l.args = args;
+  l.nitems = (unsigned int)items;
+
+  j.run = host_run_block;
+  j.data = &l;
+  j.n = blocks;
+
+  pthread_mutex_lock(&ctx->run_lock);
+  if (k->barriers) {
+    for (i = 0; i < ctx->nthreads && res == GA_NO_ERROR; i++)
+      res = host_worker_setup(&ctx->workers[i]);
+  }
+  if (res == GA_NO_ERROR) {
+    /* The launch is synchronous, the host clock is the device clock */
+    if (ctx->timing)
+      start = host_now();
+    host_run(ctx, &j);
+    if (ctx->timing) {
+      k->elapsed = host_now() - start;
+      k->timed = 1;
+    }
+  }
+  pthread_mutex_unlock(&ctx->run_lock);
+  return res;
+}
+
+static int host_kernelbin(gpukernel *k, size_t *sz, void **obj) {
+  void *res = malloc(k->bin_sz);
+  if (res == NULL)
+    return GA_MEMORY_ERROR;
+  memcpy(res, k->bin, k->bin_sz);
+  *sz = k->bin_sz;
+  *obj = res;
+  return GA_NO_ERROR;
+}
+
+static int host_sync(gpudata *b) {
+  /* Everything is done before returning */
+  ASSERT_BUF(b);
+  return GA_NO_ERROR;
+}
+
+static float half2float(uint16_t h) {
+  union { uint32_t u; float f; } r;
+  uint32_t s = ((uint32_t)h & 0x8000) << 16;
+  uint32_t e = (h >> 10) & 0x1f;
+  uint32_t m = h & 0x3ff;
+
+  if (e == 0) {
+    r.f = (float)m / 16777216.0f;
+    r.u |= s;
+  } else if (e == 31) {
+    r.u = s | 0x7f800000 | (m << 13);
+  } else {
+    r.u = s | ((e + 112) << 23) | (m << 13);
+  }
+  return r.f;
+}
+
+/* Rounds to nearest even like the device conversions */
+static uint16_t float2half(float f) {
+  union { uint32_t u; float f; } v;
+  uint32_t s, a, e, m, r, rem, half;
+
+  v.f = f;
+  s = (v.u >> 16) & 0x8000;
+  a = v.u & 0x7fffffff;
+  if (a >= 0x7f800000)
+    return s | 0x7c00 | (a > 0x7f800000 ? 0x200 : 0);
+  if (a >= 0x477ff000)
+    return s | 0x7c00;
+  if (a >= 0x38800000)
+    return s | ((a + 0xc8000fff + ((a >> 13) & 1)) >> 13);
+  /* Subnormal result */
+  e = a >> 23;
+  if (e < 102)
+    return s;
+  m = (a & 0x7fffff) | 0x800000;
+  r = m >> (126 - e);
+  rem = m & ((1u << (126 - e)) - 1);
+  half = 1u << (125 - e);
+  if (rem > half || (rem == half && (r & 1)))
+    r++;
+  return s | r;
+}
+
+static int host_is_float(int typecode) {
+  return typecode == GA_FLOAT || typecode == GA_DOUBLE ||
+    typecode == GA_HALF;
+}
+
+static int host_is_signed(int typecode) {
+  return typecode == GA_BYTE || typecode == GA_SHORT ||
+    typecode == GA_INT || typecode == GA_LONG;
+}
+
+/* Integers are sign extended */
+static uint64_t load_i(const char *p, int typecode) {
+  switch (typecode) {
+  case GA_BOOL:
+  case GA_UBYTE: return *(const uint8_t *)p;
+  case GA_BYTE: return (uint64_t)*(const int8_t *)p;
+  case GA_USHORT: return *(const uint16_t *)p;
+  case GA_SHORT: return (uint64_t)*(const int16_t *)p;
+  case GA_UINT: return *(const uint32_t *)p;
+  case GA_INT: return (uint64_t)*(const int32_t *)p;
+  case GA_ULONG: return *(const uint64_t *)p;
+  case GA_LONG: return (uint64_t)*(const int64_t *)p;
+  default: return 0;
+  }
+}
+
+static void store_i(char *p, int typecode, uint64_t v) {
+  switch (typecode) {
+  case GA_BOOL:
+  case GA_UBYTE:
+  case GA_BYTE: *(uint8_t *)p = (uint8_t)v; break;
+  case GA_USHORT:
+  case GA_SHORT: *(uint16_t *)p = (uint16_t)v; break;
+  case GA_UINT:
+  case GA_INT: *(uint32_t *)p = (uint32_t)v; break;
+  case GA_ULONG:
+  case GA_LONG: *(uint64_t *)p = v; break;
+  }
+}
+
+static double load_f(const char *p, int typecode) {
+  switch (typecode) {
+  case GA_HALF: return half2float(*(const uint16_t *)p);
+  case GA_FLOAT: return *(const float *)p;
+  case GA_DOUBLE: return *(const double *)p;
+  default:
+    if (host_is_signed(typecode))
+      return (double)(int64_t)load_i(p, typecode);
+    return (double)load_i(p, typecode);
+  }
+}
+
+static void store_f(char *p, int typecode, double v) {
+  uint64_t x;
+
+  switch (typecode) {
+  case GA_HALF: *(uint16_t *)p = float2half((float)v); break;
+  case GA_FLOAT: *(float *)p = (float)v; break;
+  case GA_DOUBLE: *(double *)p = v; break;
+  default:
+    /* Casting NaN or out of range values to integers is undefined */
+    if (v != v)
+      x = 0;
+    else if (v < -9223372036854775808.0)
+      x = (uint64_t)INT64_MIN;
+    else if (v < 0)
+      x = (uint64_t)(int64_t)v;
+    else if (host_is_signed(typecode) && v >= 9223372036854775808.0)
+      x = INT64_MAX;
+    else if (v >= 18446744073709551616.0)
+      x = UINT64_MAX;
+    else
+      x = (uint64_t)v;
+    store_i(p, typecode, x);
+  }
+}
+
+typedef struct _host_copy {
+  const char *in;
+  char *out;
+  int itype;
+  int otype;
+  size_t isz;
+  unsigned int ind;
+  unsigned int ond;
+  const size_t *idims;
+  const size_t *odims;
+  const ssize_t *istr;
+  const ssize_t *ostr;
+  size_t n;
+} host_copy;
+
+static ssize_t elem_off(size_t i, unsigned int nd, const size_t *dims,
+                        const ssize_t *str) {
+  ssize_t off = 0;
+  unsigned int d;
+
+  for (d = nd; d > 0; d--) {
+    off += (ssize_t)(i % dims[d-1]) * str[d-1];
+    i /= dims[d-1];
+  }
+  return off;
+}
+
+static void host_run_copy(host_worker *w, const host_job *j, size_t c) {
+  const host_copy *a = (const host_copy *)j->data;
+  const char *ip;
+  char *op;
+  size_t i, end;
+
+  end = (c + 1) * COPY_CHUNK;
+  if (end > a->n)
+    end = a->n;
+  for (i = c * COPY_CHUNK; i < end; i++) {
+    ip = a->in + elem_off(i, a->ind, a->idims, a->istr);
+    op = a->out + elem_off(i, a->ond, a->odims, a->ostr);
+    if (a->itype == a->otype)
+      memcpy(op, ip, a->isz);
+    else if (host_is_float(a->itype) || host_is_float(a->otype))
+      store_f(op, a->otype, load_f(ip, a->itype));
+    else
+      store_i(op, a->otype, load_i(ip, a->itype));
+  }
+}
+
+static int host_extcopy(gpudata *input, size_t ioff, gpudata *output,
+                        size_t ooff, int intype, int outtype,
+                        unsigned int a_nd, const size_t *a_dims,
+                        const ssize_t *a_str, unsigned int b_nd,
+                        const size_t *b_dims, const ssize_t *b_str) {
+  host_context *ctx = input->ctx;
+  host_copy a;
+  host_job j;
+  unsigned int i;
+
+  ASSERT_BUF(input);
+  ASSERT_BUF(output);
+  if (input->ctx != output->ctx)
+    return GA_INVALID_ERROR;
+
+  if (!host_argtype_ok(intype) || !host_argtype_ok(outtype) ||
+      intype == GA_SIZE || outtype == GA_SIZE)
+    return GA_DEVSUP_ERROR;
+
+  a.n = 1;
+  for (i = 0; i < a_nd; i++)
+    a.n *= a_dims[i];
+  if (a.n == 0) return GA_NO_ERROR;
+
+  a.in = input->ptr + ioff;
+  a.out = output->ptr + ooff;
+  a.itype = intype;
+  a.otype = outtype;
+  a.isz = gpuarray_get_elsize(intype);
+  a.ind = a_nd;
+  a.ond = b_nd;
+  a.idims = a_dims;
+  a.odims = b_dims;
+  a.istr = a_str;
+  a.ostr = b_str;
+
+  j.run = host_run_copy;
+  j.data = &a;
+  j.n = (a.n + COPY_CHUNK - 1) / COPY_CHUNK;
+
+  pthread_mutex_lock(&ctx->run_lock);
+  host_run(ctx, &j);
+  pthread_mutex_unlock(&ctx->run_lock);
+  return GA_NO_ERROR;
+}
+
+static gpudata *host_transfer(gpudata *src, size_t offset, size_t sz,
+                              void *dst_c, int may_share) {
+  host_context *dst_ctx = (host_context *)dst_c;
+  gpudata *dst;
+
+  ASSERT_BUF(src);
+  ASSERT_CTX(dst_ctx);
+
+  if (src->ctx == dst_ctx && may_share && offset == 0) {
+    host_retain(src);
+    return src;
+  }
+  if ((src->sz - offset) < sz)
+    return NULL;
+
+  /* Every host context sees the same memory */
+  dst = host_alloc(dst_ctx, sz, src->ptr + offset, GA_BUFFER_INIT, NULL);
+  return dst;
+}
+
+static int host_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
+                         void *res) {
+  host_context *ctx = NULL;
+  if (c != NULL) {
+    ctx = (host_context *)c;
+    ASSERT_CTX(ctx);
+  } else if (buf != NULL) {
+    ASSERT_BUF(buf);
+    ctx = buf->ctx;
+  } else if (k != NULL) {
+    ASSERT_KER(k);
+    ctx = k->ctx;
+  }
+  /* I know that 512 and 1024 are magic numbers.
+     There is an indication in buffer.h, though. */
+  if (prop_id < 512) {
+    if (ctx == NULL)
+      return GA_VALUE_ERROR;
+  } else if (prop_id < 1024) {
+    if (buf == NULL)
+      return GA_VALUE_ERROR;
+  } else {
+    if (k == NULL)
+      return GA_VALUE_ERROR;
+  }
+
+  switch (prop_id) {
+    char *s;
+
+  case GA_CTX_PROP_DEVNAME:
+    s = malloc(64);
+    if (s == NULL)
+      return GA_MEMORY_ERROR;
+    snprintf(s, 64, "Host CPU (%u threads)", ctx->nthreads);
+    *((char **)res) = s;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MAXLSIZE:
+  case GA_KERNEL_PROP_MAXLSIZE:
+    *((size_t *)res) = HOST_MAXLSIZE;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_LMEMSIZE:
+    /* Same as most GPUs, it's only a limit for the kernels */
+    *((size_t *)res) = 48 << 10;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_NUMPROCS:
+    *((unsigned int *)res) = ctx->nthreads;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MAXGSIZE:
+    *((size_t *)res) = INT_MAX;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_BLAS_OPS:
+    *((void **)res) = NULL;
+    return GA_DEVSUP_ERROR;
+
+  case GA_CTX_PROP_BIN_ID:
+    *((const char **)res) = ctx->bin_id;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_LIMIT:
+    /* malloc() has its own cache, there is no pool */
+    *((size_t *)res) = 0;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_CACHED:
+  case GA_CTX_PROP_POOL_HITS:
+  case GA_CTX_PROP_POOL_MISSES:
+  case GA_CTX_PROP_SPILLED:
+  case GA_CTX_PROP_SPILLS:
+    *((size_t *)res) = 0;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    *((gpuarray_mem_stats *)res) = ctx->mem;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    *((size_t *)res) = ctx->oom_retries;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    *((size_t *)res) = (size_t)-1;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    *((int *)res) = ctx->timing;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_REFCNT:
+    *((unsigned int *)res) = buf->refcnt;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_SIZE:
+    *((size_t *)res) = buf->sz;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_HOSTPOINTER:
+    /* Always valid since the device is the host */
+    *((void **)res) = buf->ptr;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_SPILLABLE:
+    *((int *)res) = 0;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_CTX:
+  case GA_KERNEL_PROP_CTX:
+    *((void **)res) = (void *)ctx;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_PREFLSIZE:
+    *((size_t *)res) = 16;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_NUMARGS:
+    *((unsigned int *)res) = k->argcount;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_TYPES:
+    *((const int **)res) = k->types;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_ELAPSED:
+    if (!k->timed)
+      return GA_VALUE_ERROR;
+    *((double *)res) = k->elapsed;
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static int host_set_property(void *c, int prop_id, const void *val) {
+  host_context *ctx = (host_context *)c;
+
+  ASSERT_CTX(ctx);
+  switch (prop_id) {
+  case GA_CTX_PROP_POOL_LIMIT:
+  case GA_CTX_PROP_POOL_CACHED:
+  case GA_CTX_PROP_POOL_HITS:
+  case GA_CTX_PROP_POOL_MISSES:
+    /* Nothing is cached */
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    mem_stats_reset(&ctx->mem);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_RECLAIM_ADD:
+    return reclaim_add(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_RECLAIM_DEL:
+    return reclaim_del(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    ctx->oom_retries = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_SPILLS:
+    /* Nothing is ever spilled */
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    if (*((const size_t *)val) != (size_t)-1)
+      return GA_DEVSUP_ERROR;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    ctx->timing = *((const int *)val);
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static int host_write_async(gpudata *dst, size_t dstoff, const void *src,
+                            size_t sz) {
+  return host_write(dst, dstoff, src, sz);
+}
+
+static int host_read_async(void *dst, gpudata *src, size_t srcoff,
+                           size_t sz) {
+  return host_read(dst, src, srcoff, sz);
+}
+
+static int host_done(gpudata *b, int *ret) {
+  ASSERT_BUF(b);
+  return 1;
+}
+
+static int host_buffer_set_property(gpudata *buf, int prop_id,
+                                    const void *val) {
+  ASSERT_BUF(buf);
+  switch (prop_id) {
+  case GA_BUFFER_PROP_SPILLABLE:
+    /* The buffers already are in host memory */
+    if (*((const int *)val))
+      return GA_DEVSUP_ERROR;
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static const char *host_error(void *c) {
+  host_context *ctx = (host_context *)c;
+  if (ctx == NULL)
+    return "Could not create the host context";
+  return ctx->err;
+}
+
+GPUARRAY_LOCAL
+const gpuarray_buffer_ops host_ops = {host_init,
+                                     host_deinit,
+                                     host_alloc,
+                                     host_retain,
+                                     host_free,
+                                     host_share,
+                                     host_move,
+                                     host_read,
+                                     host_write,
+                                     host_memset,
+                                     host_newkernel,
+                                     host_retainkernel,
+                                     host_freekernel,
+                                     host_callkernel,
+                                     host_kernelbin,
+                                     host_sync,
+                                     host_extcopy,
+                                     host_transfer,
+                                     host_property,
+                                     host_error,
+                                     host_set_property,
+                                     host_write_async,
+                                     host_read_async,
+                                     host_done,
+                                     host_buffer_set_property};
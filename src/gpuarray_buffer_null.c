@@ -0,0 +1,789 @@
+#define _CRT_SECURE_NO_WARNINGS
+
+#include "private.h"
+
+#include <limits.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+
+#include "util/strb.h"
+
+#include "gpuarray/buffer.h"
+#include "gpuarray/util.h"
+#include "gpuarray/error.h"
+
+#ifdef DEBUG
+#include <assert.h>
+
+#define CTX_TAG "null ctx"
+#define BUF_TAG "null buf"
+#define KER_TAG "nullkern"
+
+#define TAG_CTX(c) memcpy((c)->tag, CTX_TAG, 8)
+#define TAG_BUF(b) memcpy((b)->tag, BUF_TAG, 8)
+#define TAG_KER(k) memcpy((k)->tag, KER_TAG, 8)
+#define ASSERT_CTX(c) assert(memcmp((c)->tag, CTX_TAG, 8) == 0)
+#define ASSERT_BUF(b) assert(memcmp((b)->tag, BUF_TAG, 8) == 0)
+#define ASSERT_KER(k) assert(memcmp((k)->tag, KER_TAG, 8) == 0)
+#define CLEAR(o) memset((o)->tag, 0, 8);
+
+#else
+#define TAG_CTX(c)
+#define TAG_BUF(b)
+#define TAG_KER(k)
+#define ASSERT_CTX(c)
+#define ASSERT_BUF(b)
+#define ASSERT_KER(k)
+#define CLEAR(o)
+#endif
+
+/* the storage is user memory (GA_BUFFER_USE_DATA) */
+#define DONTFREE 0x10000000
+
+#define NULL_LOG_MAX 4096
+
+static void null_free(gpudata *);
+static void null_freekernel(gpukernel *);
+
+#define FAIL(v, e) { if (ret) *ret = e; return v; }
+
+/*
+ * The "null" backend runs nothing.  It only checks the arguments,
+ * records the calls and adds up their cost according to a simple
+ * model (GA_CTX_PROP_NULL_CONFIG).  This is meant to count the
+ * launches and transfers done by higher level code and to estimate
+ * its overheads without a device.
+ *
+ * Buffers have no storage, except those in host memory
+ * (GA_BUFFER_HOST and GA_BUFFER_USE_DATA).  Reads from the others
+ * return zeros.
+ */
+typedef struct _null_context {
+#ifdef DEBUG
+  char tag[8];
+#endif
+  unsigned int refcnt;
+  int flags;
+  char bin_id[8];
+  gpuarray_mem_stats mem;
+  reclaim_list reclaim;
+  size_t oom_retries;
+  int timing;
+  gpuarray_null_config conf;
+  gpuarray_call_stats stats;
+  gpuarray_call_record *log;
+  size_t log_alloc;
+} null_context;
+
+struct _gpudata {
+  char *ptr;
+  size_t sz;
+  null_context *ctx;
+  int flags;
+  unsigned int refcnt;
+#ifdef DEBUG
+  char tag[8];
+#endif
+};
+
+struct _gpukernel {
+#ifdef DEBUG
+  char tag[8];
+#endif
+  null_context *ctx;
+  size_t bin_sz;
+  void *bin;
+  int *types;
+  /* Simulated duration of the last timed launch, if `timed` */
+  double elapsed;
+  int timed;
+  unsigned int argcount;
+  unsigned int refcnt;
+};
+
+#ifdef _WIN32
+static double null_now(void) {
+  LARGE_INTEGER f, c;
+  QueryPerformanceFrequency(&f);
+  QueryPerformanceCounter(&c);
+  return (double)c.QuadPart / (double)f.QuadPart;
+}
+#else
+static double null_now(void) {
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (double)ts.tv_sec + (double)ts.tv_nsec * 1e-9;
+}
+#endif
+
+/* Time to move `sz` bytes at `bw` bytes per second, 0 is infinite */
+static double null_copy_time(double bw, size_t sz) {
+  return bw > 0 ? (double)sz / bw : 0.0;
+}
+
+static void null_record(null_context *ctx, int kind, size_t bytes,
+                        size_t items, double t) {
+  gpuarray_call_record *tmp;
+  double end;
+  size_t n;
+
+  ctx->stats.calls[kind]++;
+  ctx->stats.bytes[kind] += bytes;
+  ctx->stats.time += t;
+
+  if (ctx->stats.nlog < ctx->conf.log_max) {
+    if (ctx->stats.nlog == ctx->log_alloc) {
+      n = ctx->log_alloc ? ctx->log_alloc * 2 : 64;
+      if (n > ctx->conf.log_max)
+        n = ctx->conf.log_max;
+      tmp = realloc(ctx->log, n * sizeof(*tmp));
+      /* Losing records is better than failing the call */
+      if (tmp != NULL) {
+        ctx->log = tmp;
+        ctx->log_alloc = n;
+      }
+    }
+    if (ctx->stats.nlog < ctx->log_alloc) {
+      tmp = &ctx->log[ctx->stats.nlog++];
+      tmp->kind = kind;
+      tmp->bytes = bytes;
+      tmp->items = items;
+      tmp->time = t;
+    }
+  }
+
+  /* Spin since sleeping is much too coarse for launch latencies */
+  if (ctx->conf.realtime && t > 0) {
+    end = null_now() + t;
+    while (null_now() < end);
+  }
+}
+
+static void null_free_ctx(null_context *ctx) {
+  ASSERT_CTX(ctx);
+  ctx->refcnt--;
+  if (ctx->refcnt == 0) {
+    free(ctx->log);
+    CLEAR(ctx);
+    free(ctx);
+  }
+}
+
+static void *null_init(int devno, int flags, int *ret) {
+  null_context *res;
+
+  /* There is only one device */
+  if (devno != 0 && devno != -1)
+    FAIL(NULL, GA_VALUE_ERROR);
+
+  res = calloc(1, sizeof(*res));
+  if (res == NULL)
+    FAIL(NULL, GA_MEMORY_ERROR);
+  res->refcnt = 1;
+  res->flags = flags;
+  strlcpy(res->bin_id, "null", sizeof(res->bin_id));
+  res->conf.log_max = NULL_LOG_MAX;
+  TAG_CTX(res);
+  return res;
+}
+
+static void null_deinit(void *c) {
+  null_free_ctx((null_context *)c);
+}
+
+static gpudata *null_alloc(void *c, size_t size, void *data, int flags,
+                           int *ret) {
+  null_context *ctx = (null_context *)c;
+  gpudata *res;
+
+  ASSERT_CTX(ctx);
+  if ((flags & GA_BUFFER_INIT) && data == NULL) FAIL(NULL, GA_VALUE_ERROR);
+  if ((flags & (GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY)) ==
+      (GA_BUFFER_READ_ONLY|GA_BUFFER_WRITE_ONLY)) FAIL(NULL, GA_VALUE_ERROR);
+  if ((flags & GA_BUFFER_USE_DATA) &&
+      (data == NULL || size == 0 ||
+       (flags & (GA_BUFFER_INIT|GA_BUFFER_HOST))))
+    FAIL(NULL, GA_VALUE_ERROR);
+
+  res = calloc(1, sizeof(*res));
+  if (res == NULL) FAIL(NULL, GA_MEMORY_ERROR);
+  res->sz = size;
+  res->flags = flags & GA_BUFFER_USE_DATA ? DONTFREE : 0;
+  res->refcnt = 1;
+  res->ctx = ctx;
+
+  if (flags & GA_BUFFER_USE_DATA) {
+    res->ptr = data;
+  } else if (flags & GA_BUFFER_HOST) {
+    res->ptr = malloc(size ? size : 1);
+    if (res->ptr == NULL) {
+      ctx->oom_retries++;
+      reclaim_run(&ctx->reclaim);
+      res->ptr = malloc(size ? size : 1);
+    }
+    if (res->ptr == NULL) {
+      free(res);
+      FAIL(NULL, GA_MEMORY_ERROR);
+    }
+    if (flags & GA_BUFFER_INIT)
+      memcpy(res->ptr, data, size);
+  }
+  if (!(flags & GA_BUFFER_USE_DATA))
+    mem_stats_alloc(&ctx->mem, size, size);
+
+  null_record(ctx, GA_CALL_ALLOC, size, 0, 0.0);
+  if (flags & GA_BUFFER_INIT)
+    null_record(ctx, GA_CALL_WRITE, size, 0, ctx->conf.transfer_latency +
+                null_copy_time(ctx->conf.bandwidth, size));
+  ctx->refcnt++;
+  TAG_BUF(res);
+  return res;
+}
+
+static void null_retain(gpudata *b) {
+  ASSERT_BUF(b);
+  b->refcnt++;
+}
+
+static void null_free(gpudata *d) {
+  null_context *ctx;
+
+  ASSERT_BUF(d);
+  d->refcnt--;
+  if (d->refcnt == 0) {
+    ctx = d->ctx;
+    if (!(d->flags & DONTFREE)) {
+      mem_stats_free(&ctx->mem, d->sz);
+      free(d->ptr);
+    }
+    null_record(ctx, GA_CALL_FREE, d->sz, 0, 0.0);
+    CLEAR(d);
+    free(d);
+    null_free_ctx(ctx);
+  }
+}
+
+static int null_share(gpudata *a, gpudata *b, int *ret) {
+  ASSERT_BUF(a);
+  ASSERT_BUF(b);
+  /* Without storage, only the same buffer overlaps */
+  if (a->ptr == NULL || b->ptr == NULL)
+    return a == b && a->sz != 0;
+  return (a->sz != 0 && b->sz != 0 &&
+          ((a->ptr <= b->ptr && a->ptr + a->sz > b->ptr) ||
+           (b->ptr <= a->ptr && b->ptr + b->sz > a->ptr)));
+}
+
+static int null_move(gpudata *dst, size_t dstoff, gpudata *src,
+                     size_t srcoff, size_t sz) {
+  null_context *ctx = dst->ctx;
+
+  ASSERT_BUF(dst);
+  ASSERT_BUF(src);
+  if (src->ctx != dst->ctx) return GA_VALUE_ERROR;
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if ((dst->sz - dstoff) < sz || (src->sz - srcoff) < sz)
+    return GA_VALUE_ERROR;
+
+  if (dst->ptr != NULL && src->ptr != NULL)
+    memmove(dst->ptr + dstoff, src->ptr + srcoff, sz);
+  /* Read and write, like on the devices */
+  null_record(ctx, GA_CALL_MOVE, sz, 0,
+              null_copy_time(ctx->conf.device_bandwidth, 2 * sz));
+  return GA_NO_ERROR;
+}
+
+static int null_read(void *dst, gpudata *src, size_t srcoff, size_t sz) {
+  null_context *ctx = src->ctx;
+
+  ASSERT_BUF(src);
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if ((src->sz - srcoff) < sz)
+    return GA_VALUE_ERROR;
+
+  if (src->ptr != NULL)
+    memcpy(dst, src->ptr + srcoff, sz);
+  else
+    memset(dst, 0, sz);
+  null_record(ctx, GA_CALL_READ, sz, 0, ctx->conf.transfer_latency +
+              null_copy_time(ctx->conf.bandwidth, sz));
+  return GA_NO_ERROR;
+}
+
+static int null_write(gpudata *dst, size_t dstoff, const void *src,
+                      size_t sz) {
+  null_context *ctx = dst->ctx;
+
+  ASSERT_BUF(dst);
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if ((dst->sz - dstoff) < sz)
+    return GA_VALUE_ERROR;
+
+  if (dst->ptr != NULL)
+    memcpy(dst->ptr + dstoff, src, sz);
+  null_record(ctx, GA_CALL_WRITE, sz, 0, ctx->conf.transfer_latency +
+              null_copy_time(ctx->conf.bandwidth, sz));
+  return GA_NO_ERROR;
+}
+
+static int null_memset(gpudata *dst, size_t dstoff, int data) {
+  null_context *ctx = dst->ctx;
+
+  ASSERT_BUF(dst);
+
+  if (dstoff > dst->sz)
+    return GA_VALUE_ERROR;
+
+  if (dst->ptr != NULL)
+    memset(dst->ptr + dstoff, data, dst->sz - dstoff);
+  null_record(ctx, GA_CALL_MEMSET, dst->sz - dstoff, 0,
+              null_copy_time(ctx->conf.device_bandwidth,
+                             dst->sz - dstoff));
+  return GA_NO_ERROR;
+}
+
+static gpukernel *null_newkernel(void *c, unsigned int count,
+                                 const char **strings, const size_t *lengths,
+                                 const char *fname, unsigned int argcount,
+                                 const int *types, int flags, int *ret,
+                                 char **err_str) {
+  null_context *ctx = (null_context *)c;
+  strb sb = STRB_STATIC_INIT;
+  gpukernel *res;
+  unsigned int i;
+
+  ASSERT_CTX(ctx);
+  if (count == 0) FAIL(NULL, GA_VALUE_ERROR);
+
+  if (flags & GA_USE_BINARY) {
+    // GA_USE_BINARY is exclusive
+    if (flags & ~GA_USE_BINARY)
+      FAIL(NULL, GA_INVALID_ERROR);
+    // We need the length for binary data and there is only one blob.
+    if (count != 1 || lengths == NULL || lengths[0] == 0)
+      FAIL(NULL, GA_VALUE_ERROR);
+  }
+
+  /* Nothing is compiled, the "binary" is the source */
+  if (lengths == NULL) {
+    for (i = 0; i < count; i++)
+      strb_appends(&sb, strings[i]);
+  } else {
+    for (i = 0; i < count; i++) {
+      if (lengths[i] == 0)
+        strb_appends(&sb, strings[i]);
+      else
+        strb_appendn(&sb, strings[i], lengths[i]);
+    }
+  }
+  if (strb_error(&sb)) {
+    strb_clear(&sb);
+    FAIL(NULL, GA_MEMORY_ERROR);
+  }
+
+  res = calloc(1, sizeof(*res));
+  if (res == NULL) {
+    strb_clear(&sb);
+    FAIL(NULL, GA_SYS_ERROR);
+  }
+  res->bin = sb.s;
+  res->bin_sz = sb.l;
+
+  res->refcnt = 1;
+  res->argcount = argcount;
+  res->types = calloc(argcount, sizeof(int));
+  if (res->types == NULL) {
+    h_free(res->bin);
+    free(res);
+    FAIL(NULL, GA_MEMORY_ERROR);
+  }
+  memcpy(res->types, types, argcount*sizeof(int));
+
+  null_record(ctx, GA_CALL_COMPILE, res->bin_sz, 0, 0.0);
+  res->ctx = ctx;
+  ctx->refcnt++;
+  TAG_KER(res);
+  return res;
+}
+
+static void null_retainkernel(gpukernel *k) {
+  ASSERT_KER(k);
+  k->refcnt++;
+}
+
+static void null_freekernel(gpukernel *k) {
+  ASSERT_KER(k);
+  k->refcnt--;
+  if (k->refcnt == 0) {
+    null_free_ctx(k->ctx);
+    h_free(k->bin);
+    free(k->types);
+    CLEAR(k);
+    free(k);
+  }
+}
+
+static int null_callkernel(gpukernel *k, unsigned int n,
+                           const size_t *bs, const size_t *gs,
+                           size_t shared, void **args) {
+  null_context *ctx = k->ctx;
+  size_t items = 1;
+  double t;
+  unsigned int i;
+
+  ASSERT_KER(k);
+  if (n < 1 || n > 3)
+    return GA_VALUE_ERROR;
+
+  for (i = 0; i < n; i++)
+    items *= bs[i] * gs[i];
+  t = ctx->conf.launch_latency + items * ctx->conf.item_time;
+  null_record(ctx, GA_CALL_LAUNCH, shared, items, t);
+  if (ctx->timing) {
+    k->elapsed = t;
+    k->timed = 1;
+  }
+  return GA_NO_ERROR;
+}
+
+static int null_kernelbin(gpukernel *k, size_t *sz, void **obj) {
+  void *res = malloc(k->bin_sz);
+  if (res == NULL)
+    return GA_MEMORY_ERROR;
+  memcpy(res, k->bin, k->bin_sz);
+  *sz = k->bin_sz;
+  *obj = res;
+  return GA_NO_ERROR;
+}
+
+static int null_sync(gpudata *b) {
+  ASSERT_BUF(b);
+  null_record(b->ctx, GA_CALL_SYNC, 0, 0, 0.0);
+  return GA_NO_ERROR;
+}
+
+static int null_extcopy(gpudata *input, size_t ioff, gpudata *output,
+                        size_t ooff, int intype, int outtype,
+                        unsigned int a_nd, const size_t *a_dims,
+                        const ssize_t *a_str, unsigned int b_nd,
+                        const size_t *b_dims, const ssize_t *b_str) {
+  null_context *ctx = input->ctx;
+  size_t n = 1, sz;
+  unsigned int i;
+
+  ASSERT_BUF(input);
+  ASSERT_BUF(output);
+  if (input->ctx != output->ctx)
+    return GA_INVALID_ERROR;
+
+  for (i = 0; i < a_nd; i++)
+    n *= a_dims[i];
+  if (n == 0) return GA_NO_ERROR;
+
+  /* It is a kernel on the devices */
+  sz = n * (gpuarray_get_elsize(intype) + gpuarray_get_elsize(outtype));
+  null_record(ctx, GA_CALL_EXTCOPY, sz, n, ctx->conf.launch_latency +
+              null_copy_time(ctx->conf.device_bandwidth, sz));
+  return GA_NO_ERROR;
+}
+
+static gpudata *null_transfer(gpudata *src, size_t offset, size_t sz,
+                              void *dst_c, int may_share) {
+  null_context *dst_ctx = (null_context *)dst_c;
+  gpudata *dst;
+
+  ASSERT_BUF(src);
+  ASSERT_CTX(dst_ctx);
+
+  if (src->ctx == dst_ctx && may_share && offset == 0) {
+    null_retain(src);
+    return src;
+  }
+  if ((src->sz - offset) < sz)
+    return NULL;
+
+  dst = null_alloc(dst_ctx, sz, NULL, 0, NULL);
+  if (dst == NULL)
+    return NULL;
+  null_record(dst_ctx, GA_CALL_TRANSFER, sz, 0,
+              dst_ctx->conf.transfer_latency +
+              null_copy_time(dst_ctx->conf.bandwidth, sz));
+  return dst;
+}
+
+static int null_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
+                         void *res) {
+  null_context *ctx = NULL;
+  if (c != NULL) {
+    ctx = (null_context *)c;
+    ASSERT_CTX(ctx);
+  } else if (buf != NULL) {
+    ASSERT_BUF(buf);
+    ctx = buf->ctx;
+  } else if (k != NULL) {
+    ASSERT_KER(k);
+    ctx = k->ctx;
+  }
+  /* I know that 512 and 1024 are magic numbers.
+     There is an indication in buffer.h, though. */
+  if (prop_id < 512) {
+    if (ctx == NULL)
+      return GA_VALUE_ERROR;
+  } else if (prop_id < 1024) {
+    if (buf == NULL)
+      return GA_VALUE_ERROR;
+  } else {
+    if (k == NULL)
+      return GA_VALUE_ERROR;
+  }
+
+  switch (prop_id) {
+    char *s;
+
+  case GA_CTX_PROP_DEVNAME:
+    s = strdup("Null device");
+    if (s == NULL)
+      return GA_MEMORY_ERROR;
+    *((char **)res) = s;
+    return GA_NO_ERROR;
+
+  /* The limits are those of a common GPU */
+  case GA_CTX_PROP_MAXLSIZE:
+  case GA_KERNEL_PROP_MAXLSIZE:
+    *((size_t *)res) = 1024;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_LMEMSIZE:
+    *((size_t *)res) = 48 << 10;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_NUMPROCS:
+    *((unsigned int *)res) = 16;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MAXGSIZE:
+    *((size_t *)res) = INT_MAX;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_BLAS_OPS:
+    *((void **)res) = NULL;
+    return GA_DEVSUP_ERROR;
+
+  case GA_CTX_PROP_BIN_ID:
+    *((const char **)res) = ctx->bin_id;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_LIMIT:
+  case GA_CTX_PROP_POOL_CACHED:
+  case GA_CTX_PROP_POOL_HITS:
+  case GA_CTX_PROP_POOL_MISSES:
+  case GA_CTX_PROP_SPILLED:
+  case GA_CTX_PROP_SPILLS:
+    *((size_t *)res) = 0;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    *((gpuarray_mem_stats *)res) = ctx->mem;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    *((size_t *)res) = ctx->oom_retries;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    *((size_t *)res) = (size_t)-1;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    *((int *)res) = ctx->timing;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_CALL_STATS:
+    ctx->stats.log = ctx->log;
+    *((gpuarray_call_stats *)res) = ctx->stats;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_NULL_CONFIG:
+    *((gpuarray_null_config *)res) = ctx->conf;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_REFCNT:
+    *((unsigned int *)res) = buf->refcnt;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_SIZE:
+    *((size_t *)res) = buf->sz;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_HOSTPOINTER:
+    if (buf->ptr == NULL)
+      return GA_DEVSUP_ERROR;
+    *((void **)res) = buf->ptr;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_SPILLABLE:
+    *((int *)res) = 0;
+    return GA_NO_ERROR;
+
+  case GA_BUFFER_PROP_CTX:
+  case GA_KERNEL_PROP_CTX:
+    *((void **)res) = (void *)ctx;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_PREFLSIZE:
+    *((size_t *)res) = 32;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_NUMARGS:
+    *((unsigned int *)res) = k->argcount;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_TYPES:
+    *((const int **)res) = k->types;
+    return GA_NO_ERROR;
+
+  case GA_KERNEL_PROP_ELAPSED:
+    if (!k->timed)
+      return GA_VALUE_ERROR;
+    *((double *)res) = k->elapsed;
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static int null_set_property(void *c, int prop_id, const void *val) {
+  null_context *ctx = (null_context *)c;
+  const gpuarray_null_config *conf;
+
+  ASSERT_CTX(ctx);
+  switch (prop_id) {
+  case GA_CTX_PROP_POOL_LIMIT:
+  case GA_CTX_PROP_POOL_CACHED:
+  case GA_CTX_PROP_POOL_HITS:
+  case GA_CTX_PROP_POOL_MISSES:
+    /* Nothing is cached */
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    mem_stats_reset(&ctx->mem);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_RECLAIM_ADD:
+    return reclaim_add(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_RECLAIM_DEL:
+    return reclaim_del(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    ctx->oom_retries = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_SPILLS:
+    /* Nothing is ever spilled */
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    if (*((const size_t *)val) != (size_t)-1)
+      return GA_DEVSUP_ERROR;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    ctx->timing = *((const int *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_CALL_STATS:
+    memset(&ctx->stats, 0, sizeof(ctx->stats));
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_NULL_CONFIG:
+    conf = (const gpuarray_null_config *)val;
+    if (conf->launch_latency < 0 || conf->item_time < 0 ||
+        conf->transfer_latency < 0 || conf->bandwidth < 0 ||
+        conf->device_bandwidth < 0)
+      return GA_VALUE_ERROR;
+    ctx->conf = *conf;
+    if (ctx->stats.nlog > ctx->conf.log_max)
+      ctx->stats.nlog = ctx->conf.log_max;
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static int null_write_async(gpudata *dst, size_t dstoff, const void *src,
+                            size_t sz) {
+  return null_write(dst, dstoff, src, sz);
+}
+
+static int null_read_async(void *dst, gpudata *src, size_t srcoff,
+                           size_t sz) {
+  return null_read(dst, src, srcoff, sz);
+}
+
+static int null_done(gpudata *b, int *ret) {
+  ASSERT_BUF(b);
+  return 1;
+}
+
+static int null_buffer_set_property(gpudata *buf, int prop_id,
+                                    const void *val) {
+  ASSERT_BUF(buf);
+  switch (prop_id) {
+  case GA_BUFFER_PROP_SPILLABLE:
+    /* There is nothing to spill */
+    if (*((const int *)val))
+      return GA_DEVSUP_ERROR;
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static const char *null_error(void *c) {
+  if (c == NULL)
+    return "Could not create the null context";
+  return "No error";
+}
+
+GPUARRAY_LOCAL
+const gpuarray_buffer_ops null_ops = {null_init,
+                                     null_deinit,
+                                     null_alloc,
+                                     null_retain,
+                                     null_free,
+                                     null_share,
+                                     null_move,
+                                     null_read,
+                                     null_write,
+                                     null_memset,
+                                     null_newkernel,
+                                     null_retainkernel,
+                                     null_freekernel,
+                                     null_callkernel,
+                                     null_kernelbin,
+                                     null_sync,
+                                     null_extcopy,
+                                     null_transfer,
+                                     null_property,
+                                     null_error,
+                                     null_set_property,
+                                     null_write_async,
+                                     null_read_async,
+                                     null_done,
+                                     null_buffer_set_property};
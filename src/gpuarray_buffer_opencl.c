@@ -24,6 +24,8 @@ static cl_int err;
 #define CHKFAIL(v) if (err != CL_SUCCESS) FAIL(v, GA_IMPL_ERROR)
 
 static int cl_property(void *c, gpudata *b, gpukernel *k, int p, void *r);
+static void cl_release(gpudata *b);
+static int cl_write(gpudata *dst, size_t dstoff, const void *src, size_t sz);
 
 static cl_device_id get_dev(cl_context ctx, int *ret) {
   size_t sz;
@@ -77,8 +79,19 @@ cl_ctx *cl_make_ctx(cl_context ctx) {
   res->ctx = ctx;
   res->err = CL_SUCCESS;
   res->refcnt = 1;
+  res->flags = 0;
   res->exts = NULL;
   res->blas_handle = NULL;
+  memset(res->pool, 0, sizeof(res->pool));
+  res->pool_cached = 0;
+  res->pool_limit = (size_t)-1;
+  res->pool_hits = 0;
+  res->pool_misses = 0;
+  memset(&res->mem, 0, sizeof(res->mem));
+  res->reclaim.n = 0;
+  res->oom_retries = 0;
+  res->timing = 0;
+  /* Profiling is only turned on with GA_CTX_PROP_TIMING */
   res->q = clCreateCommandQueue(ctx, id,
 				qprop&CL_QUEUE_OUT_OF_ORDER_EXEC_MODE_ENABLE,
 				&err);
@@ -107,6 +120,29 @@ cl_command_queue cl_get_stream(void *ctx) {
   return ((cl_ctx *)ctx)->q;
 }
 
+/*
+ * Release cached pool buffers, biggest first, until no more than
+ * `keep` bytes remain.  OpenCL defers the actual release until
+ * pending commands are done so there is no need to wait.
+ */
+static void cl_pool_trim(cl_ctx *ctx, size_t keep) {
+  gpudata *b;
+  unsigned int i;
+
+  for (i = POOL_NBINS; i > 0 && ctx->pool_cached > keep; i--) {
+    while (ctx->pool[i-1] != NULL && ctx->pool_cached > keep) {
+      b = ctx->pool[i-1];
+      ctx->pool[i-1] = b->next;
+      ctx->pool_cached -= b->cap;
+      CLEAR(b);
+      clReleaseMemObject(b->buf);
+      if (b->ev != NULL)
+        clReleaseEvent(b->ev);
+      free(b);
+    }
+  }
+}
+
 static void cl_free_ctx(cl_ctx *ctx) {
   gpuarray_blas_ops *blas_ops;
 
@@ -114,6 +150,7 @@ static void cl_free_ctx(cl_ctx *ctx) {
   assert(ctx->refcnt != 0);
   ctx->refcnt--;
   if (ctx->refcnt == 0) {
+    cl_pool_trim(ctx, 0);
     CLEAR(ctx);
     if (ctx->blas_handle != NULL) {
       ctx->err = cl_property(ctx, NULL, NULL, GA_CTX_PROP_BLAS_OPS, &blas_ops);
@@ -141,6 +178,10 @@ gpudata *cl_make_buf(void *c, cl_mem buf) {
 
   res->buf = buf;
   res->ev = NULL;
+  res->sz = 0;
+  res->cap = 0;
+  res->next = NULL;
+  res->flags = 0;
   res->refcnt = 1;
   ctx->err = clRetainMemObject(buf);
   if (ctx->err != CL_SUCCESS) {
@@ -352,6 +393,7 @@ static void *cl_init(int devno, int flags, int *ret) {
   res = cl_make_ctx(ctx);
   clReleaseContext(ctx);
   if (res == NULL) FAIL(NULL, GA_IMPL_ERROR);  // can also be a sys_error
+  res->flags = flags;
   return res;
 }
 
@@ -363,16 +405,24 @@ static void cl_deinit(void *c) {
 static gpudata *cl_alloc(void *c, size_t size, void *data, int flags,
                          int *ret) {
   cl_ctx *ctx = (cl_ctx *)c;
-  gpudata *res;
+  gpudata *res = NULL;
   void *hostp = NULL;
   cl_mem_flags clflags = CL_MEM_READ_WRITE;
+  size_t asize = size;
+  unsigned int bin = POOL_NBINS;
+  int pooled;
 
   ASSERT_CTX(ctx);
 
   if (flags & GA_BUFFER_INIT) {
     if (data == NULL) FAIL(NULL, GA_VALUE_ERROR);
-    hostp = data;
-    clflags |= CL_MEM_COPY_HOST_PTR;
+  }
+
+  if (flags & GA_BUFFER_USE_DATA) {
+    if (data == NULL || size == 0 ||
+        (flags & (GA_BUFFER_INIT|GA_BUFFER_HOST)))
+      FAIL(NULL, GA_VALUE_ERROR);
+    clflags |= CL_MEM_USE_HOST_PTR;
   }
 
   if (flags & GA_BUFFER_HOST) {
@@ -389,26 +439,70 @@ static gpudata *cl_alloc(void *c, size_t size, void *data, int flags,
     clflags |= CL_MEM_WRITE_ONLY;
   }
 
-  res = malloc(sizeof(*res));
-  if (res == NULL) FAIL(NULL, GA_SYS_ERROR);
-  res->refcnt = 1;
-
-  if (size == 0) {
-    /* OpenCL doesn't like a zero-sized buffer */
-    size = 1;
+  /* Only plain device buffers are interchangeable */
+  pooled = ((ctx->flags & GA_CTX_MEM_POOL) &&
+            !(flags & (GA_BUFFER_HOST|GA_BUFFER_READ_ONLY|
+                       GA_BUFFER_WRITE_ONLY|GA_BUFFER_USE_DATA)));
+
+  if (pooled) {
+    bin = pool_bin(size, &asize);
+    if (bin < POOL_NBINS && ctx->pool[bin] != NULL) {
+      /* The kept event orders us after its last use */
+      res = ctx->pool[bin];
+      ctx->pool[bin] = res->next;
+      ctx->pool_cached -= res->cap;
+      ctx->pool_hits++;
+    } else {
+      ctx->pool_misses++;
+    }
+  } else if (flags & GA_BUFFER_INIT) {
+    hostp = data;
+    clflags |= CL_MEM_COPY_HOST_PTR;
+  } else if (flags & GA_BUFFER_USE_DATA) {
+    hostp = data;
   }
 
-  res->buf = clCreateBuffer(ctx->ctx, clflags, size, hostp, &ctx->err);
-  res->ev = NULL;
-  if (ctx->err != CL_SUCCESS) {
-    free(res);
-    FAIL(NULL, GA_IMPL_ERROR);
+  if (res == NULL) {
+    res = malloc(sizeof(*res));
+    if (res == NULL) FAIL(NULL, GA_SYS_ERROR);
+
+    if (asize == 0) {
+      /* OpenCL doesn't like a zero-sized buffer */
+      asize = 1;
+    }
+
+    res->buf = clCreateBuffer(ctx->ctx, clflags, asize, hostp, &ctx->err);
+    if (ctx->err == CL_MEM_OBJECT_ALLOCATION_FAILURE) {
+      /* Let go of everything we can spare and retry */
+      ctx->oom_retries++;
+      reclaim_run(&ctx->reclaim);
+      cl_pool_trim(ctx, 0);
+      res->buf = clCreateBuffer(ctx->ctx, clflags, asize, hostp, &ctx->err);
+    }
+    res->ev = NULL;
+    if (ctx->err != CL_SUCCESS) {
+      free(res);
+      FAIL(NULL, GA_IMPL_ERROR);
+    }
+    res->sz = asize;
+    res->cap = (pooled && bin < POOL_NBINS) ? asize : 0;
   }
 
+  res->refcnt = 1;
+  res->next = NULL;
+  res->flags = flags & GA_BUFFER_USE_DATA;
   res->ctx = ctx;
   ctx->refcnt++;
-
+  mem_stats_alloc(&ctx->mem, size, res->sz);
   TAG_BUF(res);
+
+  if (pooled && (flags & GA_BUFFER_INIT)) {
+    if (cl_write(res, 0, data, size) != GA_NO_ERROR) {
+      cl_release(res);
+      FAIL(NULL, GA_IMPL_ERROR);
+    }
+  }
+
   return res;
 }
 
@@ -418,10 +512,30 @@ static void cl_retain(gpudata *b) {
 }
 
 static void cl_release(gpudata *b) {
+  cl_ctx *ctx;
+  size_t rounded;
+  unsigned int bin;
+
   ASSERT_BUF(b);
   b->refcnt--;
   if (b->refcnt == 0) {
+    ctx = b->ctx;
+    if (b->sz != 0)
+      mem_stats_free(&ctx->mem, b->sz);
+    if (b->cap != 0 && b->cap <= ctx->pool_limit - ctx->pool_cached &&
+        (bin = pool_bin(b->cap, &rounded)) < POOL_NBINS) {
+      /* Keep the buffer and its last event for later */
+      b->next = ctx->pool[bin];
+      ctx->pool[bin] = b;
+      ctx->pool_cached += b->cap;
+      /* Cached buffers don't keep the context alive */
+      cl_free_ctx(ctx);
+      return;
+    }
     CLEAR(b);
+    /* The user memory may go away as soon as we return */
+    if ((b->flags & GA_BUFFER_USE_DATA) && b->ev != NULL)
+      clWaitForEvents(1, &b->ev);
     clReleaseMemObject(b->buf);
     if (b->ev != NULL)
       clReleaseEvent(b->ev);
@@ -550,6 +664,65 @@ static int cl_write(gpudata *dst, size_t dstoff, const void *src, size_t sz) {
   return GA_NO_ERROR;
 }
 
+static int cl_read_async(void *dst, gpudata *src, size_t srcoff,
+                         size_t sz) {
+  cl_ctx *ctx = src->ctx;
+  cl_event ev[1];
+  cl_event *evl = NULL;
+  cl_uint num_ev = 0;
+  cl_event res;
+
+  ASSERT_BUF(src);
+  ASSERT_CTX(ctx);
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if (src->ev != NULL) {
+    ev[0] = src->ev;
+    evl = ev;
+    num_ev = 1;
+  }
+
+  ctx->err = clEnqueueReadBuffer(ctx->q, src->buf, CL_FALSE, srcoff, sz, dst,
+                                 num_ev, evl, &res);
+  if (ctx->err != CL_SUCCESS) return GA_IMPL_ERROR;
+  if (src->ev != NULL) clReleaseEvent(src->ev);
+  src->ev = res;
+  /* Make sure it gets started */
+  clFlush(ctx->q);
+
+  return GA_NO_ERROR;
+}
+
+static int cl_write_async(gpudata *dst, size_t dstoff, const void *src,
+                          size_t sz) {
+  cl_ctx *ctx = dst->ctx;
+  cl_event ev[1];
+  cl_event *evl = NULL;
+  cl_uint num_ev = 0;
+  cl_event res;
+
+  ASSERT_BUF(dst);
+  ASSERT_CTX(ctx);
+
+  if (sz == 0) return GA_NO_ERROR;
+
+  if (dst->ev != NULL) {
+    ev[0] = dst->ev;
+    evl = ev;
+    num_ev = 1;
+  }
+
+  ctx->err = clEnqueueWriteBuffer(ctx->q, dst->buf, CL_FALSE, dstoff, sz, src,
+                                  num_ev, evl, &res);
+  if (ctx->err != CL_SUCCESS) return GA_IMPL_ERROR;
+  if (dst->ev != NULL) clReleaseEvent(dst->ev);
+  dst->ev = res;
+  clFlush(ctx->q);
+
+  return GA_NO_ERROR;
+}
+
 static int cl_memset(gpudata *dst, size_t offset, int data) {
   char local_kern[256];
   cl_ctx *ctx = dst->ctx;
@@ -795,6 +968,7 @@ static gpukernel *cl_newkernel(void *c, unsigned int count,
   if (res == NULL) FAIL(NULL, GA_MEMORY_ERROR);
   res->refcnt = 1;
   res->ev = NULL;
+  res->tev = NULL;
   res->argcount = argcount;
   res->k = clCreateKernel(p, fname, &ctx->err);
   res->types = NULL;  /* This avoids a crash in cl_releasekernel */
@@ -828,6 +1002,7 @@ static void cl_releasekernel(gpukernel *k) {
   if (k->refcnt == 0) {
     CLEAR(k);
     if (k->ev != NULL) clReleaseEvent(k->ev);
+    if (k->tev != NULL) clReleaseEvent(k->tev);
     if (k->k) clReleaseKernel(k->k);
     cl_free_ctx(k->ctx);
     free(k->types);
@@ -922,6 +1097,12 @@ static int cl_callkernel(gpukernel *k, unsigned int n,
   if (k->ev != NULL)
     clReleaseEvent(k->ev);
   k->ev = ev;
+  if (ctx->timing) {
+    if (k->tev != NULL)
+      clReleaseEvent(k->tev);
+    k->tev = ev;
+    clRetainEvent(ev);
+  }
 
   return GA_NO_ERROR;
 }
@@ -970,6 +1151,27 @@ static int cl_sync(gpudata *b) {
   return GA_NO_ERROR;
 }
 
+static int cl_done(gpudata *b, int *ret) {
+  cl_ctx *ctx = (cl_ctx *)b->ctx;
+  cl_int st;
+
+  ASSERT_BUF(b);
+  ASSERT_CTX(ctx);
+
+  if (b->ev == NULL)
+    return 1;
+  ctx->err = clGetEventInfo(b->ev, CL_EVENT_COMMAND_EXECUTION_STATUS,
+                            sizeof(st), &st, NULL);
+  if (ctx->err != CL_SUCCESS)
+    FAIL(-1, GA_IMPL_ERROR);
+  /* A negative status is the error code of a failed command */
+  if (st < 0) {
+    ctx->err = st;
+    FAIL(-1, GA_IMPL_ERROR);
+  }
+  return st == CL_COMPLETE;
+}
+
 static gpudata *cl_transfer(gpudata *buf, size_t offset, size_t sz,
                             void *dst_ctx, int may_share) {
   cl_ctx *ctx = buf->ctx;
@@ -1130,6 +1332,7 @@ static int cl_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     size_t *psz;
     cl_device_id id;
     cl_uint ui;
+    cl_ulong start, end;
 
   case GA_CTX_PROP_DEVNAME:
     ctx->err = clGetContextInfo(ctx->ctx, CL_CONTEXT_DEVICES, sizeof(id),
@@ -1231,6 +1434,44 @@ static int cl_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     *((const char **)res) = ctx->bin_id;
     return GA_NO_ERROR;
 
+  case GA_CTX_PROP_POOL_LIMIT:
+    *((size_t *)res) = ctx->pool_limit;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_CACHED:
+    *((size_t *)res) = ctx->pool_cached;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_HITS:
+    *((size_t *)res) = ctx->pool_hits;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_MISSES:
+    *((size_t *)res) = ctx->pool_misses;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    *((gpuarray_mem_stats *)res) = ctx->mem;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    *((size_t *)res) = ctx->oom_retries;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    *((size_t *)res) = (size_t)-1;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_SPILLED:
+  case GA_CTX_PROP_SPILLS:
+    /* Nothing is ever spilled */
+    *((size_t *)res) = 0;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    *((int *)res) = ctx->timing;
+    return GA_NO_ERROR;
+
   case GA_BUFFER_PROP_REFCNT:
     *((unsigned int *)res) = buf->refcnt;
     return GA_NO_ERROR;
@@ -1243,6 +1484,14 @@ static int cl_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     *((size_t *)res) = sz;
     return GA_NO_ERROR;
 
+  case GA_BUFFER_PROP_HOSTPOINTER:
+    /* Would need the buffer to stay mapped */
+    return GA_DEVSUP_ERROR;
+
+  case GA_BUFFER_PROP_SPILLABLE:
+    *((int *)res) = 0;
+    return GA_NO_ERROR;
+
   /* GA_BUFFER_PROP_CTX is not ordered to simplify code */
   case GA_BUFFER_PROP_CTX:
   case GA_KERNEL_PROP_CTX:
@@ -1298,6 +1547,38 @@ static int cl_property(void *c, gpudata *buf, gpukernel *k, int prop_id,
     *((const int **)res) = k->types;
     return GA_NO_ERROR;
 
+  case GA_KERNEL_PROP_ELAPSED:
+    if (k->tev == NULL)
+      return GA_VALUE_ERROR;
+    ctx->err = clWaitForEvents(1, &k->tev);
+    if (ctx->err != CL_SUCCESS)
+      return GA_IMPL_ERROR;
+    ctx->err = clGetEventProfilingInfo(k->tev, CL_PROFILING_COMMAND_START,
+                                       sizeof(start), &start, NULL);
+    if (ctx->err != CL_SUCCESS)
+      return GA_IMPL_ERROR;
+    ctx->err = clGetEventProfilingInfo(k->tev, CL_PROFILING_COMMAND_END,
+                                       sizeof(end), &end, NULL);
+    if (ctx->err != CL_SUCCESS)
+      return GA_IMPL_ERROR;
+    *((double *)res) = (end - start) * 1e-9;
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
+static int cl_buffer_set_property(gpudata *buf, int prop_id,
+                                  const void *val) {
+  ASSERT_BUF(buf);
+  switch (prop_id) {
+  case GA_BUFFER_PROP_SPILLABLE:
+    /* No memory budget, so no spilling */
+    if (*((const int *)val))
+      return GA_DEVSUP_ERROR;
+    return GA_NO_ERROR;
+
   default:
     return GA_INVALID_ERROR;
   }
@@ -1312,6 +1593,108 @@ static const char *cl_error(void *c) {
     return get_error_string(ctx->err);
 }
 
+/*
+ * Replace the queue of the context with one that has profiling
+ * enabled, after waiting for the commands already queued.  Profiling
+ * slows down every command so it is only done when the launches are
+ * first timed, and the queue stays that way afterwards.
+ */
+static int cl_profile_queue(cl_ctx *ctx) {
+  cl_device_id id;
+  cl_command_queue_properties qprop;
+  cl_command_queue_properties dprop;
+  cl_command_queue q;
+
+  ctx->err = clGetCommandQueueInfo(ctx->q, CL_QUEUE_PROPERTIES,
+                                   sizeof(qprop), &qprop, NULL);
+  if (ctx->err != CL_SUCCESS)
+    return GA_IMPL_ERROR;
+  if (qprop & CL_QUEUE_PROFILING_ENABLE)
+    return GA_NO_ERROR;
+  ctx->err = clGetCommandQueueInfo(ctx->q, CL_QUEUE_DEVICE, sizeof(id), &id,
+                                   NULL);
+  if (ctx->err != CL_SUCCESS)
+    return GA_IMPL_ERROR;
+  ctx->err = clGetDeviceInfo(id, CL_DEVICE_QUEUE_PROPERTIES, sizeof(dprop),
+                             &dprop, NULL);
+  if (ctx->err != CL_SUCCESS)
+    return GA_IMPL_ERROR;
+  if (!(dprop & CL_QUEUE_PROFILING_ENABLE))
+    return GA_DEVSUP_ERROR;
+
+  q = clCreateCommandQueue(ctx->ctx, id, qprop|CL_QUEUE_PROFILING_ENABLE,
+                           &ctx->err);
+  if (q == NULL)
+    return GA_IMPL_ERROR;
+  ctx->err = clFinish(ctx->q);
+  if (ctx->err != CL_SUCCESS) {
+    clReleaseCommandQueue(q);
+    return GA_IMPL_ERROR;
+  }
+  clReleaseCommandQueue(ctx->q);
+  ctx->q = q;
+  return GA_NO_ERROR;
+}
+
+static int cl_set_property(void *c, int prop_id, const void *val) {
+  cl_ctx *ctx = (cl_ctx *)c;
+  int e;
+
+  ASSERT_CTX(ctx);
+  switch (prop_id) {
+  case GA_CTX_PROP_POOL_LIMIT:
+    ctx->pool_limit = *((const size_t *)val);
+    cl_pool_trim(ctx, ctx->pool_limit);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_CACHED:
+    cl_pool_trim(ctx, *((const size_t *)val));
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_HITS:
+    ctx->pool_hits = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_POOL_MISSES:
+    ctx->pool_misses = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_STATS:
+    mem_stats_reset(&ctx->mem);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_RECLAIM_ADD:
+    return reclaim_add(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_RECLAIM_DEL:
+    return reclaim_del(&ctx->reclaim, (const gpuarray_reclaim *)val);
+
+  case GA_CTX_PROP_OOM_RETRIES:
+    ctx->oom_retries = *((const size_t *)val);
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_MEM_BUDGET:
+    if (*((const size_t *)val) != (size_t)-1)
+      return GA_DEVSUP_ERROR;
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_SPILLS:
+    return GA_NO_ERROR;
+
+  case GA_CTX_PROP_TIMING:
+    if (*((const int *)val)) {
+      e = cl_profile_queue(ctx);
+      if (e != GA_NO_ERROR)
+        return e;
+    }
+    ctx->timing = *((const int *)val);
+    return GA_NO_ERROR;
+
+  default:
+    return GA_INVALID_ERROR;
+  }
+}
+
 GPUARRAY_LOCAL
 const gpuarray_buffer_ops opencl_ops = {cl_init,
                                        cl_deinit,
@@ -1332,4 +1715,9 @@ const gpuarray_buffer_ops opencl_ops = {cl_init,
                                        cl_extcopy,
                                        cl_transfer,
                                        cl_property,
-                                       cl_error};
+                                       cl_error,
+                                       cl_set_property,
+                                       cl_write_async,
+                                       cl_read_async,
+                                       cl_done,
+                                       cl_buffer_set_property};
@@ -17,7 +17,22 @@ int GpuKernel_init(GpuKernel *k, const gpuarray_buffer_ops *ops, void *ctx,
   k->k = k->ops->kernel_alloc(ctx, count, strs, lens, name, argcount, types,
                               flags, &res, err_str);
   if (res != GA_NO_ERROR)
-    GpuKernel_clear(k);
+    goto fail;
+  /* These don't change, fetch them once instead of on each launch */
+  res = k->ops->property(NULL, NULL, k->k, GA_KERNEL_PROP_MAXLSIZE,
+                         &k->maxlsize);
+  if (res != GA_NO_ERROR)
+    goto fail;
+  res = k->ops->property(NULL, NULL, k->k, GA_KERNEL_PROP_PREFLSIZE,
+                         &k->preflsize);
+  if (res != GA_NO_ERROR)
+    goto fail;
+  res = k->ops->property(ctx, NULL, NULL, GA_CTX_PROP_MAXGSIZE, &k->maxgsize);
+  if (res != GA_NO_ERROR)
+    goto fail;
+  return GA_NO_ERROR;
+ fail:
+  GpuKernel_clear(k);
   return res;
 }
 
@@ -28,6 +43,9 @@ void GpuKernel_clear(GpuKernel *k) {
   k->k = NULL;
   k->ops = NULL;
   k->args = NULL;
+  k->maxlsize = 0;
+  k->preflsize = 0;
+  k->maxgsize = 0;
 }
 
 void *GpuKernel_context(GpuKernel *k) {
@@ -37,21 +55,10 @@ void *GpuKernel_context(GpuKernel *k) {
 }
 
 int GpuKernel_sched(GpuKernel *k, size_t n, size_t *ls, size_t *gs) {
-  size_t min_l;
-  size_t max_l;
-  size_t max_g;
-  int err;
+  size_t min_l = k->preflsize;
+  size_t max_l = k->maxlsize;
+  size_t max_g = k->maxgsize;
 
-  err = k->ops->property(NULL, NULL, k->k, GA_KERNEL_PROP_MAXLSIZE, &max_l);
-  if (err != GA_NO_ERROR)
-    return err;
-  err = k->ops->property(NULL, NULL, k->k, GA_KERNEL_PROP_PREFLSIZE, &min_l);
-  if (err != GA_NO_ERROR)
-    return err;
-  err = k->ops->property(GpuKernel_context(k), NULL, NULL,
-                         GA_CTX_PROP_MAXGSIZE, &max_g);
-  if (err != GA_NO_ERROR)
-    return err;
   if (*gs == 0) {
     if (*ls == 0) {
       if (n < max_l)
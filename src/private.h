@@ -11,6 +11,7 @@
 #include "private_config.h"
 
 #include "gpuarray/array.h"
+#include "gpuarray/error.h"
 #include "gpuarray/types.h"
 #include "util/strb.h"
 #include "util/halloc.h"
@@ -29,6 +30,108 @@ static inline void *memdup(const void *p, size_t s) {
   return res;
 }
 
+/*
+ * Size classes for the buffer pools (GA_CTX_MEM_POOL).  Everything up
+ * to POOL_MIN bytes goes in bin 0, above that there are 4 classes per
+ * power of 2.  Returns the bin and stores the class size in `rounded`.
+ * Sizes that can't be rounded up return POOL_NBINS.
+ */
+#define POOL_MIN_LG 9
+#define POOL_MIN (1 << POOL_MIN_LG)
+#define POOL_NBINS (4 * (sizeof(size_t) * 8 - POOL_MIN_LG) + 1)
+
+static inline unsigned int pool_bin(size_t sz, size_t *rounded) {
+  size_t step, tmp;
+  unsigned int lg = 0;
+
+  if (sz <= POOL_MIN) {
+    *rounded = POOL_MIN;
+    return 0;
+  }
+  tmp = sz - 1;
+  while (tmp >>= 1) lg++;
+  /* sz is in (2**lg, 2**(lg+1)] */
+  step = ((size_t)1) << (lg - 2);
+  *rounded = (sz + step - 1) & ~(step - 1);
+  /* Too big to round up, don't pool */
+  if (*rounded < sz) {
+    *rounded = sz;
+    return POOL_NBINS;
+  }
+  /* rounded / step is in [5, 8] */
+  return (lg - POOL_MIN_LG) * 4 + (unsigned int)(*rounded / step) - 4;
+}
+
+/*
+ * Helpers to maintain the GA_CTX_PROP_MEM_STATS counters.  `sz` is the
+ * requested size for the histogram and `real` what the buffer really
+ * uses.
+ */
+static inline void mem_stats_alloc(gpuarray_mem_stats *s, size_t sz,
+                                   size_t real) {
+  unsigned int lg = 0;
+
+  s->live_bytes += real;
+  if (s->live_bytes > s->peak_bytes)
+    s->peak_bytes = s->live_bytes;
+  s->live_buffers++;
+  s->allocs++;
+  while (sz >>= 1) lg++;
+  s->hist[lg]++;
+}
+
+static inline void mem_stats_free(gpuarray_mem_stats *s, size_t real) {
+  s->live_bytes -= real;
+  s->live_buffers--;
+  s->frees++;
+}
+
+static inline void mem_stats_reset(gpuarray_mem_stats *s) {
+  s->peak_bytes = s->live_bytes;
+  s->allocs = 0;
+  s->frees = 0;
+  memset(s->hist, 0, sizeof(s->hist));
+}
+
+/*
+ * Reclaim callbacks of a context (GA_CTX_PROP_RECLAIM_ADD).
+ */
+#define RECLAIM_MAX 16
+
+typedef struct _reclaim_list {
+  gpuarray_reclaim cb[RECLAIM_MAX];
+  unsigned int n;
+} reclaim_list;
+
+static inline int reclaim_add(reclaim_list *l, const gpuarray_reclaim *r) {
+  if (l->n == RECLAIM_MAX)
+    return GA_MEMORY_ERROR;
+  l->cb[l->n++] = *r;
+  return GA_NO_ERROR;
+}
+
+static inline int reclaim_del(reclaim_list *l, const gpuarray_reclaim *r) {
+  unsigned int i;
+
+  for (i = l->n; i > 0; i--) {
+    if (l->cb[i-1].fn == r->fn && l->cb[i-1].data == r->data) {
+      memmove(&l->cb[i-1], &l->cb[i], (l->n - i) * sizeof(l->cb[0]));
+      l->n--;
+      return GA_NO_ERROR;
+    }
+  }
+  return GA_VALUE_ERROR;
+}
+
+static inline void reclaim_run(const reclaim_list *l) {
+  /* Work on a copy since callbacks may (un)register others */
+  reclaim_list tmp = *l;
+  unsigned int i;
+
+  for (i = 0; i < tmp.n; i++)
+    tmp.cb[i].fn(tmp.cb[i].data);
+}
+
 GPUARRAY_LOCAL int GpuArray_is_c_contiguous(const GpuArray *a);
 GPUARRAY_LOCAL int GpuArray_is_f_contiguous(const GpuArray *a);
 GPUARRAY_LOCAL int GpuArray_is_aligned(const GpuArray *a);
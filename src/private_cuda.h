@@ -40,6 +40,15 @@
 
 
 #define DONTFREE 0x10000000
+/* hostp is user memory registered with cuMemHostRegister */
+#define REGISTERED 0x20000000
+/* can be moved to host memory to stay under the budget */
+#define SPILLABLE 0x40000000
+
+/* Size of each half of the pinned staging buffer */
+#define STAGE_CHUNK (2 << 20)
+/* Transfers from pageable memory at least this big are staged */
+#define STAGE_MIN (2 * STAGE_CHUNK)
 
 typedef struct _cuda_context {
 #ifdef DEBUG
@@ -54,6 +63,34 @@ typedef struct _cuda_context {
   int flags;
   cache *extcopy_cache;
   char bin_id[8];
+  /* Buffer cache for GA_CTX_MEM_POOL, one free list per size class */
+  gpudata *pool[POOL_NBINS];
+  size_t pool_cached;
+  size_t pool_limit;
+  size_t pool_hits;
+  size_t pool_misses;
+  gpuarray_mem_stats mem;
+  reclaim_list reclaim;
+  size_t oom_retries;
+  /* Device memory budget (GA_CTX_PROP_MEM_BUDGET) */
+  size_t budget;
+  /* Bytes of device memory held by live buffers */
+  size_t resident;
+  size_t spilled;
+  size_t spills;
+  /* Resident spillable buffers, least recently used first */
+  gpudata *lru_head;
+  gpudata *lru_tail;
+  /* Incremented for each operation, see cuda_use() */
+  unsigned int tick;
+  /* Released buffers waiting for the device, oldest first */
+  gpudata *deferred;
+  gpudata *deferred_last;
+  /* Pinned staging buffer (2 * STAGE_CHUNK) for large transfers */
+  void *stage;
+  CUevent stage_ev[2];
+  /* Time the kernel launches (GA_CTX_PROP_TIMING) */
+  int timing;
 } cuda_context;
 
 GPUARRAY_LOCAL void *cuda_make_ctx(CUcontext ctx, int flags);
@@ -62,11 +99,33 @@ GPUARRAY_LOCAL CUstream cuda_get_stream(void *ctx);
 GPUARRAY_LOCAL void cuda_enter(cuda_context *ctx);
 GPUARRAY_LOCAL void cuda_exit(cuda_context *ctx);
 
+/*
+ * Make sure a buffer is on the device before an operation uses it.
+ * Buffers passed to cuda_use() since the last increment of ctx->tick
+ * are not spilled to make room for the others, so increment it once
+ * at the start of each operation.  Must be called with the context
+ * entered.
+ */
+#define cuda_new_op(ctx) ((ctx)->tick++)
+GPUARRAY_LOCAL int cuda_use(cuda_context *ctx, gpudata *b);
+
 struct _gpudata {
   CUdeviceptr ptr;
   CUevent ev;
   size_t sz;
+  /* allocated size, can be larger than sz for pooled buffers */
+  size_t cap;
+  /* host pointer for GA_BUFFER_HOST buffers, NULL otherwise */
+  void *hostp;
   cuda_context *ctx;
+  /* next free buffer in the pool or in the deferred list */
+  gpudata *next;
+  /* host copy of the contents while spilled, NULL otherwise */
+  void *spill;
+  gpudata *lru_prev;
+  gpudata *lru_next;
+  /* value of ctx->tick when last used */
+  unsigned int tick;
   int flags;
   unsigned int refcnt;
 #ifdef DEBUG
@@ -89,6 +148,10 @@ struct _gpukernel {
   size_t bin_sz;
   void *bin;
   int *types;
+  /* Bracket the last timed launch, created on the first one */
+  CUevent t_start;
+  CUevent t_end;
+  int timed;
   unsigned int argcount;
   unsigned int refcnt;
 };
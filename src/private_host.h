@@ -0,0 +1,169 @@
+#ifndef _GPUARRAY_PRIVATE_HOST
+#define _GPUARRAY_PRIVATE_HOST
+
+#include "private.h"
+
+#include <pthread.h>
+
+/*
+ * Switching fibers with swapcontext() costs a system call to save the
+ * signal mask, which dominates kernels that use local_barrier().
+ * x86_64 has its own switch that only saves the registers.
+ */
+#if defined(__x86_64__) && defined(__GNUC__)
+#define HOST_FAST_SWITCH
+typedef void *host_fiber;
+#else
+#include <ucontext.h>
+typedef ucontext_t host_fiber;
+#endif
+
+#ifdef DEBUG
+#include <assert.h>
+
+#define CTX_TAG "host ctx"
+#define BUF_TAG "host buf"
+#define KER_TAG "hostkern"
+
+#define TAG_CTX(c) memcpy((c)->tag, CTX_TAG, 8)
+#define TAG_BUF(b) memcpy((b)->tag, BUF_TAG, 8)
+#define TAG_KER(k) memcpy((k)->tag, KER_TAG, 8)
+#define ASSERT_CTX(c) assert(memcmp((c)->tag, CTX_TAG, 8) == 0)
+#define ASSERT_BUF(b) assert(memcmp((b)->tag, BUF_TAG, 8) == 0)
+#define ASSERT_KER(k) assert(memcmp((k)->tag, KER_TAG, 8) == 0)
+#define CLEAR(o) memset((o)->tag, 0, 8);
+
+#else
+#define TAG_CTX(c)
+#define TAG_BUF(b)
+#define TAG_KER(k)
+#define ASSERT_CTX(c)
+#define ASSERT_BUF(b)
+#define ASSERT_KER(k)
+#define CLEAR(o)
+#endif
+
+/* the storage is user memory (GA_BUFFER_USE_DATA) */
+#define DONTFREE 0x10000000
+
+/* Largest block size, every item of a block has its own stack */
+#define HOST_MAXLSIZE 256
+#define HOST_STACK (64 << 10)
+
+/*
+ * Position of a work item, passed to the compiled kernels.  This must
+ * match the definition in HOST_PREAMBLE.
+ */
+typedef struct _ga_host_item {
+  unsigned int lid[3];
+  unsigned int ldim[3];
+  unsigned int gid[3];
+  unsigned int gdim[3];
+  void (*barrier)(void);
+} ga_host_item;
+
+typedef void (*ga_host_entry)(void **args, const ga_host_item *it);
+
+typedef struct _host_worker host_worker;
+typedef struct _host_job host_job;
+typedef struct _host_launch host_launch;
+
+/*
+ * A parallel loop over `n` tasks.  Each thread of the pool grabs the
+ * next task index until there are none left.
+ */
+struct _host_job {
+  void (*run)(host_worker *w, const host_job *j, size_t i);
+  const void *data;
+  size_t n;
+  size_t next;
+};
+
+/* Arguments of a kernel call, one task per block */
+struct _host_launch {
+  gpukernel *k;
+  void **args;
+  unsigned int ls[3];
+  unsigned int gs[3];
+  unsigned int nitems;
+};
+
+/*
+ * Per-thread state.  The items of a block that uses local_barrier()
+ * run as fibers (`fib`) that switch back to `sched` at each barrier
+ * and when the item is done.  The fibers are reused for every block.
+ */
+struct _host_worker {
+  struct _host_context *ctx;
+  host_fiber sched;
+  host_fiber *fib;
+  ga_host_item *items;
+  unsigned char *done;
+  char *stacks;
+  const host_launch *launch;
+  unsigned int cur;
+  unsigned int left;
+};
+
+typedef struct _host_context {
+#ifdef DEBUG
+  char tag[8];
+#endif
+  unsigned int refcnt;
+  int flags;
+  const char *err;
+  char bin_id[8];
+  gpuarray_mem_stats mem;
+  reclaim_list reclaim;
+  size_t oom_retries;
+  /* Time the kernel launches (GA_CTX_PROP_TIMING) */
+  int timing;
+  /*
+   * Thread pool.  The calling thread also works on the jobs with
+   * workers[0], threads[i] uses workers[i+1].
+   */
+  pthread_t *threads;
+  host_worker *workers;
+  unsigned int nthreads;
+  /* Held for the whole duration of a job */
+  pthread_mutex_t run_lock;
+  pthread_mutex_t lock;
+  pthread_cond_t wake;
+  pthread_cond_t idle;
+  host_job *job;
+  unsigned int gen;
+  unsigned int busy;
+  int quit;
+} host_context;
+
+struct _gpudata {
+  char *ptr;
+  size_t sz;
+  host_context *ctx;
+  int flags;
+  unsigned int refcnt;
+#ifdef DEBUG
+  char tag[8];
+#endif
+};
+
+struct _gpukernel {
+#ifdef DEBUG
+  char tag[8];
+#endif
+  host_context *ctx;
+  void *so;
+  ga_host_entry entry;
+  /* some items wait on local_barrier() */
+  int barriers;
+  size_t bin_sz;
+  void *bin;
+  int *types;
+  /* Duration of the last timed launch, if `timed` */
+  double elapsed;
+  int timed;
+  unsigned int argcount;
+  unsigned int refcnt;
+};
+
+#endif
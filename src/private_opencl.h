@@ -44,13 +44,33 @@ typedef struct _cl_ctx {
   void *blas_handle;
   cl_int err;
   unsigned int refcnt;
+  int flags;
   char bin_id[64];
+  /* Buffer cache for GA_CTX_MEM_POOL, one free list per size class */
+  gpudata *pool[POOL_NBINS];
+  size_t pool_cached;
+  size_t pool_limit;
+  size_t pool_hits;
+  size_t pool_misses;
+  gpuarray_mem_stats mem;
+  reclaim_list reclaim;
+  size_t oom_retries;
+  /* Time the kernel launches (GA_CTX_PROP_TIMING) */
+  int timing;
 } cl_ctx;
 
 struct _gpudata {
   cl_mem buf;
   cl_event ev;
   cl_ctx *ctx;
+  /* allocated size, 0 if we didn't allocate the buffer */
+  size_t sz;
+  /* pooled size, 0 if the buffer must not go to the pool */
+  size_t cap;
+  /* next free buffer in the pool */
+  gpudata *next;
+  /* GA_BUFFER_USE_DATA if the storage is user memory */
+  int flags;
   unsigned int refcnt;
 #ifdef DEBUG
   char tag[8];
@@ -63,6 +83,8 @@ struct _gpukernel {
 #endif
   cl_kernel k;
   cl_event ev;
+  /* Event of the last timed launch */
+  cl_event tev;
   unsigned int argcount;
   int *types;
   cl_ctx *ctx;